@@ -1,207 +1,1494 @@
 # ai_predictor.py
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import queue
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timedelta, timezone
 import numpy as np
-import pandas as pd # Pandas importunu ekledik
 import joblib
 
+import can_frames
+from can_frames import TelemetryBatch
+from predictor_metrics import LAG_BUCKETS, MetricsRegistry, ProfileHook, start_metrics_server
+
 # Modelinizin kaydedildiği dosya yolu
-MODEL_PATH = "battery_fault_predictor_models.pkl" # models.pkl olarak değiştirdik
+MODEL_PATH = "battery_fault_predictor_model.pkl" # train_model.py'deki MODEL_SAVE_PATH ile aynı olmalı
 
 # Next.js API'den veri çekecek URL
 NEXTJS_GET_DATA_URL = "http://localhost:3000/api/can-data"
 # Tahmin sonuçlarını Next.js API'ye gönderecek URL
 NEXTJS_POST_PREDICTION_URL = "http://localhost:3000/api/predictions"
 
+# --- Artımlı Veri Çekme Ayarları ---
+TICK_INTERVAL_SECONDS = 5 # Simülatör 5 saniyede bir veri gönderiyor
+FETCH_PAGE_SIZE = 1000 # can-data API'sinden tek istekte çekilecek kayıt sayısı
+MAX_PAGES_PER_TICK = 50 # Birikmiş veri çok fazlaysa kalan sayfalar bir sonraki döngüye kalır
+BOOTSTRAP_LOOKBACK = timedelta(minutes=10) # İlk açılışta pencereyi doldurmak için geriye bakılacak süre
+# Sunucudan istenecek telemetri biçimi: "auto" ikili CAN çerçevelerini (can_frames.py) tercih eder, sunucu
+# desteklemiyorsa JSON yanıtı kullanılır; "json" her zaman JSON ister.
+WIRE_FORMAT = "auto"
+
+# --- Tahmin Gönderim Ayarları ---
+PREDICTION_BATCH_SIZE = 200 # Tek istekte gönderilecek en fazla tahmin
+PREDICTION_FLUSH_SECONDS = 1.0 # Toplu gönderim için en fazla bekleme süresi
+PREDICTION_QUEUE_SIZE = 10000 # Kuyruk dolarsa en eski tahminler atılır, çıkarım beklemez
+PREDICTION_MAX_RETRIES = 3 # Başarısız toplu gönderim için tekrar deneme sayısı
+PREDICTION_RETRY_BACKOFF_SECONDS = 0.5 # Her denemede ikiye katlanan bekleme süresi
+PREDICTION_HEARTBEAT_SECONDS = 60.0 # Tahmin değişmese de bir otobüs için en az bu aralıkla kayıt yazılır
+PREDICTION_CACHE_SIZE = 50000 # Önbellekte tutulan en fazla otobüs (en uzun süredir görülmeyen atılır)
+
+# --- Ölçüm (Metrics) Ayarları ---
+METRICS_PORT = 9108 # /metrics uç noktasının yerel portu (0: kapalı)
+METRICS_HOST = "127.0.0.1" # Yalnızca yerel erişim
+
+# Döngü aşamalarının süreleri, sayaçlar ve gecikme histogramı (predictor_metrics.py)
+metrics = MetricsRegistry()
+rows_ingested_total = metrics.counter("predictor_rows_ingested_total", "API'den alınan toplam veri satırı")
+buses_scored_total = metrics.counter("predictor_buses_scored_total", "Tahmin yapılan toplam otobüs sayısı")
+ticks_total = metrics.counter("predictor_ticks_total", "Tamamlanan döngü sayısı")
+tick_errors_total = metrics.counter("predictor_tick_errors_total", "Hata ile biten döngü sayısı")
+tick_rows_ingested = metrics.gauge("predictor_tick_rows_ingested", "Son döngüde alınan veri satırı")
+tick_buses_scored = metrics.gauge("predictor_tick_buses_scored", "Son döngüde tahmin yapılan otobüs sayısı")
+predictions_sent_total = metrics.counter("predictor_predictions_sent_total", "Backend'e yazılan tahmin sayısı")
+predictions_suppressed_total = metrics.counter("predictor_predictions_suppressed_total", "Son gönderilenle aynı olduğu için yazılmayan tahmin sayısı")
+rule_alerts_total = metrics.counter("predictor_rule_alerts_total", "Birinci kademe dedektörün ürettiği anında alarm sayısı")
+model_skipped_total = metrics.counter("predictor_model_skipped_total", "Risk skoru düşük olduğu için model çalıştırılmayan otobüs sayısı")
+cache_hits_total = metrics.counter("predictor_cache_hits_total", "Pencere değişmediği için çıkarımı atlanan otobüs sayısı")
+predictions_dropped_total = metrics.counter("predictor_predictions_dropped_total", "Gönderilemeyen veya kuyruktan atılan tahmin sayısı")
+prediction_lag_seconds = metrics.histogram("predictor_prediction_lag_seconds", "timestamp_data_end ile predicted_at arasındaki gecikme (saniye)", buckets=LAG_BUCKETS)
+profile_hook = ProfileHook()
+
+# --- Derlenmiş Orman Değerlendirici ---
+COMPILED_FOREST_MAX_ROWS = 256 # Daha büyük gruplarda sklearn'in derlenmiş döngüsü daha hızlı
+
+
+class FlatForest:
+    # train_model.compile_forest çıktısını saf NumPy ile değerlendirir. Tüm (satır, ağaç) çiftleri aynı anda
+    # dolaşılır; yaprağa ulaşanlar her adımda aktif kümeden çıkarılır. Yaprak olasılıkları sklearn'deki
+    # sırayla (ağaç ağaç) toplanıp ağaç sayısına bölündüğünden sonuçlar predict_proba ile birebir aynıdır.
+    # sklearn API'sini (classes_, predict_proba, predict) taklit eder; büyük gruplar fallback modele devredilir.
+
+    def __init__(self, compiled, fallback=None, max_rows=COMPILED_FOREST_MAX_ROWS):
+        self.feature = compiled["feature"]
+        self.threshold = compiled["threshold"]
+        self.left = compiled["left"]
+        self.right = compiled["right"]
+        self.value = compiled["value"]
+        self.roots = compiled["roots"]
+        self.n_outputs = compiled["n_outputs"]
+        self.classes = compiled["classes"]
+        self.classes_ = self.classes[0] if self.n_outputs == 1 else self.classes
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.fallback = fallback
+        self.max_rows = max_rows
+
+    def _proba(self, X):
+        # Dönüş: (satır, çıktı, sınıf) boyutlu ortalama olasılıklar
+        X = np.asarray(X, dtype=np.float32) # sklearn ağaçları da float32 ile karşılaştırır
+        n_rows, n_trees = len(X), len(self.roots)
+        nodes = np.tile(self.roots, n_rows)
+        rows = np.repeat(np.arange(n_rows), n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            active_nodes = nodes[active]
+            goes_left = X[rows[active], self.feature[active_nodes]] <= self.threshold[active_nodes]
+            active_nodes = np.where(goes_left, self.left[active_nodes], self.right[active_nodes])
+            nodes[active] = active_nodes
+            active = active[~self.is_leaf[active_nodes]]
+
+        # (ağaç, satır, çıktı, sınıf): ilk eksen boyunca toplama ağaçları sırayla ekler
+        leaf_values = self.value[nodes].reshape(n_rows, n_trees, *self.value.shape[1:])
+        summed = np.add.reduce(np.ascontiguousarray(leaf_values.swapaxes(0, 1)), axis=0)
+        return summed / n_trees
+
+    def predict_proba(self, X):
+        if self.fallback is not None and len(X) > self.max_rows:
+            return self.fallback.predict_proba(X)
+        proba = self._proba(X)
+        outputs = [proba[:, k, :len(classes)] for k, classes in enumerate(self.classes)]
+        return outputs[0] if self.n_outputs == 1 else outputs
+
+    def predict(self, X):
+        if self.fallback is not None and len(X) > self.max_rows:
+            return self.fallback.predict(X)
+        proba = self._proba(X)
+        predictions = [classes.take(np.argmax(proba[:, k, :len(classes)], axis=1)) for k, classes in enumerate(self.classes)]
+        return predictions[0] if self.n_outputs == 1 else np.stack(predictions, axis=1)
+
+
 # --- Model Yükleme ---
-loaded_models = None
-model_5min = None
-model_30min = None
-model_fault_type = None
-features_cols = None
-fault_type_map_text = None # fault_type_map'i metin karşılıklarını almak için
-
-try:
-    loaded_models = joblib.load(MODEL_PATH)
-    model_5min = loaded_models.get('model_5min')
-    model_30min = loaded_models.get('model_30min')
-    model_fault_type = loaded_models.get('model_fault_type')
-    features_cols = loaded_models.get('features_cols')
-    fault_type_map_text = loaded_models.get('fault_type_map') # Metin karşılıklarını yüklüyoruz
-    print("Yapay Zeka Modelleri başarıyla yüklendi.")
-    if not model_5min or not model_30min or not model_fault_type or not features_cols:
-        print("Uyarı: Yüklenen model dosyasında bazı modeller/özellikler eksik.")
-except FileNotFoundError:
-    print(f"Hata: {MODEL_PATH} bulunamadı. Lütfen 'train_model.py' scriptini çalıştırın ve modeli eğitin.")
-except Exception as e:
-    print(f"Model yüklenirken bir hata oluştu: {e}")
-
-# --- Özellik Mühendisliği Fonksiyonu ---
+# Model dosyası içe aktarma sırasında değil, ilk tahminde tembel (lazy) olarak yüklenir. NumPy dizileri
+# mmap_mode='r' ile bellek eşlemeli açılır; böylece aynı dosyayı kullanan birden fazla tahmin süreci
+# derlenmiş ormanların salt okunur sayfalarını paylaşır. train_model.py yeni bir dosya yazdığında
+# ModelRegistry bunu döngüler arasında fark eder, doğrular ve otobüs durumlarına dokunmadan yerine koyar.
+ARTIFACT_SCHEMA_VERSION = 2 # train_model.py ile aynı olmalı; sürüm bilgisi olmayan eski dosyalar 1 kabul edilir
+MODEL_KEYS = ['model_5min', 'model_30min', 'model_fault_type', 'model_multi']
+# Eski model dosyalarında arıza tipi listesi bulunmayabilir (train_model.py'deki FAULT_TYPES ile aynı)
+DEFAULT_FAULT_TYPES = ["normal", "voltage_drop_fault", "overheat_fault", "efficiency_loss_fault", "cell_imbalance_fault", "capacity_loss_fault"]
+
+
+def validate_model_artifact(artifact):
+    # Model dosyasının beklenen şemaya uyduğunu kontrol eder; uymuyorsa ValueError fırlatır
+    if not isinstance(artifact, dict):
+        raise ValueError("Model dosyası bir sözlük (dict) içermiyor.")
+
+    schema_version = artifact.get('artifact_version', 1)
+    if schema_version > ARTIFACT_SCHEMA_VERSION:
+        raise ValueError(f"Desteklenmeyen model dosyası sürümü: {schema_version} (en fazla {ARTIFACT_SCHEMA_VERSION}).")
+
+    features = artifact.get('features_cols')
+    if not features or not all(isinstance(col, str) for col in features):
+        raise ValueError("'features_cols' eksik veya geçersiz.")
+
+    models = {key: artifact.get(key) for key in MODEL_KEYS if artifact.get(key) is not None}
+    if not models:
+        raise ValueError("Model dosyasında hiç model yok.")
+    if models.get('model_multi') is not None and not artifact.get('multi_output_targets'):
+        raise ValueError("Çok çıktılı model için 'multi_output_targets' eksik.")
+    for key, model in models.items():
+        if not hasattr(model, 'predict_proba') or not hasattr(model, 'classes_'):
+            raise ValueError(f"'{key}' geçerli bir sınıflandırıcı değil.")
+        n_features = getattr(model, 'n_features_in_', len(features))
+        if n_features != len(features):
+            raise ValueError(f"'{key}' {n_features} özellik bekliyor, 'features_cols' {len(features)} özellik içeriyor.")
+
+
+class ModelBundle:
+    # Tek bir model dosyasından yüklenen ve birlikte kullanılan modeller ile meta veriler
+
+    def __init__(self, artifact, version):
+        # Derlenmiş ormanlar varsa küçük gruplar onlarla, büyük gruplar sklearn modeliyle değerlendirilir
+        compiled_models = artifact.get('compiled_models') or {}
+        models = {}
+        for key in MODEL_KEYS:
+            model = artifact.get(key)
+            if model is not None and compiled_models.get(key) is not None:
+                model = FlatForest(compiled_models[key], fallback=model)
+            models[key] = model
+        self.model_5min = models['model_5min']
+        self.model_30min = models['model_30min']
+        self.model_fault_type = models['model_fault_type']
+        self.model_multi = models['model_multi'] # Üç hedefi tek geçişte tahmin eden çok çıktılı model (train_model.py --multi-output)
+        self.multi_output_targets = artifact.get('multi_output_targets')
+        self.features_cols = list(artifact['features_cols'])
+        # Metin karşılıkları; eski dosyalarda anahtar 'fault_type_map' olabilir veya hiç olmayabilir
+        self.fault_type_map_text = list(artifact.get('fault_type_map_text') or artifact.get('fault_type_map') or DEFAULT_FAULT_TYPES)
+        self.version = version
+
+
+def load_model_bundle(path):
+    artifact = joblib.load(path, mmap_mode='r')
+    validate_model_artifact(artifact)
+    # Sürüm bilgisi olmayan eski dosyalar için dosya zamanından bir sürüm üretilir
+    version = artifact.get('model_version') or f"legacy-{int(os.path.getmtime(path))}"
+    return ModelBundle(artifact, version)
+
+
+class ModelRegistry:
+    # Geçerli ModelBundle'ı tutar. maybe_reload() dosyanın (inode, değişiklik zamanı, boyut) imzasına bakar;
+    # değiştiyse yeni dosyayı yükleyip doğrular ve tek bir atama ile yerine koyar. Hatalı bir dosya eski
+    # modelin kullanılmasını engellemez.
+
+    def __init__(self, path=MODEL_PATH):
+        self.path = path
+        self.bundle = None
+        self.file_signature = None
+        self.load_attempted = False
+        self.missing_reported = False
+
+    def _file_signature(self):
+        stat = os.stat(self.path)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        if not self.load_attempted:
+            self.maybe_reload()
+        return self.bundle
+
+    def maybe_reload(self):
+        # Yeni bir model yerine konduysa True döner
+        self.load_attempted = True
+        try:
+            signature = self._file_signature()
+        except FileNotFoundError:
+            if not self.missing_reported:
+                print(f"Hata: {self.path} bulunamadı. Lütfen 'train_model.py' scriptini çalıştırın ve modeli eğitin.")
+                self.missing_reported = True
+            return False
+        if signature == self.file_signature:
+            return False
+
+        # Aynı hatalı dosyanın her döngüde tekrar denenmemesi için imza yükleme sonucundan bağımsız kaydedilir
+        self.file_signature = signature
+        self.missing_reported = False
+        try:
+            bundle = load_model_bundle(self.path)
+        except Exception as e:
+            print(f"Model yüklenirken bir hata oluştu: {e}")
+            return False
+
+        self.bundle = bundle
+        print(f"Yapay Zeka Modelleri başarıyla yüklendi (sürüm: {bundle.version}).")
+        return True
+
+
+model_registry = ModelRegistry()
+
+# --- Özellik Mühendisliği ---
+# train_model.py ile aynı pencere boyutu: 5 saniyede bir veri, 5 dakika = 60 veri noktası
+WINDOW_SIZE = 60
+
+# train_model.py'deki sürüş modları ve One-Hot sütunları ile aynı olmalı
+DRIVING_MODES = ['idle', 'accelerating', 'cruising', 'braking', 'uphill', 'downhill']
+MODE_COLUMNS = [f'mode_{mode}' for mode in DRIVING_MODES]
+
+# Kayan pencerede tutulan kanallar (sıra aşağıdaki ROLLING_FEATURES indeksleri ile uyumlu)
+WINDOW_CHANNELS = ['cell_voltage', 'cell_max_temp', 'cell_min_temp', 'temp_diff', 'energy_efficiency']
+
+# Özellik adı -> (kanal indeksi, istatistik)
+ROLLING_FEATURES = {
+    'voltage_mean': (0, 'mean'),
+    'voltage_std': (0, 'std'),
+    'max_temp_mean': (1, 'mean'),
+    'max_temp_std': (1, 'std'),
+    'min_temp_mean': (2, 'mean'),
+    'min_temp_std': (2, 'std'),
+    'temp_diff_mean': (3, 'mean'),
+    'efficiency_mean': (4, 'mean'),
+    'efficiency_std': (4, 'std'),
+}
+
+# Son veri noktasından doğrudan alınan ham değerler (eski DataFrame satırında da bulunuyorlardı)
+RAW_FEATURES = ['cell_voltage', 'cell_min_temp', 'cell_max_temp', 'energy_efficiency', 'battery_soh']
+
+
+class BusFeatureWindow:
+    # Bir otobüsün son WINDOW_SIZE veri noktasını halka tamponda tutar.
+    # Her kanal için kaydırılmış (x - referans) toplam ve kareler toplamı güncel tutulur,
+    # böylece yeni bir örnek eklemek ve özellik vektörü üretmek O(1) maliyetlidir.
+    # Kayan toplamlarda biriken yuvarlama hatasını sınırlamak için her WINDOW_SIZE
+    # eklemede bir toplamlar tampondan yeniden hesaplanır (amortize O(1)).
+
+    def __init__(self, window_size=WINDOW_SIZE):
+        self.window_size = window_size
+        self.buffer = np.zeros((window_size, len(WINDOW_CHANNELS)))
+        self.head = 0 # Bir sonraki yazılacak satır
+        self.count = 0 # Pencerede bulunan örnek sayısı (en fazla window_size)
+        self.pushes_since_resync = 0
+        self.reference = np.zeros(len(WINDOW_CHANNELS))
+        self.shifted_sums = np.zeros(len(WINDOW_CHANNELS))
+        self.shifted_sq_sums = np.zeros(len(WINDOW_CHANNELS))
+        self.last_values = {}
+        self.last_mode = None
+        self.last_timestamp = None # Pencereye eklenen son verinin zaman damgası (datetime)
+        self.risk = BusRiskDetector() # Birinci kademe dedektör; merge_new_data her veri noktasında günceller
+
+    def push(self, data_point):
+        cell_max_temp = float(data_point['cell_max_temp'])
+        cell_min_temp = float(data_point['cell_min_temp'])
+        values = np.array([
+            float(data_point['cell_voltage']),
+            cell_max_temp,
+            cell_min_temp,
+            cell_max_temp - cell_min_temp,
+            float(data_point['energy_efficiency']),
+        ])
+
+        if self.count == 0:
+            self.reference = values.copy()
+
+        shifted = values - self.reference
+        if self.count == self.window_size:
+            # Pencere dolu: en eski örneği toplamlardan çıkar
+            old_shifted = self.buffer[self.head] - self.reference
+            self.shifted_sums += shifted - old_shifted
+            self.shifted_sq_sums += shifted * shifted - old_shifted * old_shifted
+        else:
+            self.shifted_sums += shifted
+            self.shifted_sq_sums += shifted * shifted
+            self.count += 1
+
+        self.buffer[self.head] = values
+        self.head = (self.head + 1) % self.window_size
+
+        self.last_values = {col: float(data_point[col]) for col in RAW_FEATURES}
+        self.last_mode = data_point.get('current_driving_mode')
+        if 'timestamp_dt' in data_point:
+            self.last_timestamp = data_point['timestamp_dt']
+
+        self.pushes_since_resync += 1
+        if self.pushes_since_resync >= self.window_size:
+            self._resync()
+
+    def _resync(self):
+        # Referansı mevcut ortalamaya taşı ve toplamları tampondan yeniden hesapla
+        window = self.buffer if self.count == self.window_size else self.buffer[:self.count]
+        self.reference = window.mean(axis=0)
+        shifted = window - self.reference
+        self.shifted_sums = shifted.sum(axis=0)
+        self.shifted_sq_sums = (shifted * shifted).sum(axis=0)
+        self.pushes_since_resync = 0
+
+    def is_ready(self):
+        return self.count >= self.window_size
+
+    def to_state(self):
+        # Kontrol noktası için pencerenin tüm iç durumu (sayısal alanlar ve son veri noktası)
+        return {
+            "buffer": self.buffer,
+            "head": self.head,
+            "count": self.count,
+            "pushes_since_resync": self.pushes_since_resync,
+            "reference": self.reference,
+            "shifted_sums": self.shifted_sums,
+            "shifted_sq_sums": self.shifted_sq_sums,
+            "last_values": [self.last_values.get(col, np.nan) for col in RAW_FEATURES],
+            "last_mode": self.last_mode,
+            "last_timestamp": self.last_timestamp,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        # to_state çıktısından pencereyi aynı toplamlar ve tampon ile yeniden kurar (yeniden push gerekmez)
+        window = cls(window_size=len(state["buffer"]))
+        window.buffer = np.array(state["buffer"], dtype=float)
+        window.head = int(state["head"])
+        window.count = int(state["count"])
+        window.pushes_since_resync = int(state["pushes_since_resync"])
+        window.reference = np.array(state["reference"], dtype=float)
+        window.shifted_sums = np.array(state["shifted_sums"], dtype=float)
+        window.shifted_sq_sums = np.array(state["shifted_sq_sums"], dtype=float)
+        window.last_values = {col: float(value) for col, value in zip(RAW_FEATURES, state["last_values"]) if not np.isnan(value)}
+        window.last_mode = state["last_mode"]
+        window.last_timestamp = state["last_timestamp"]
+        return window
+
+    def feature_values(self):
+        # Modelin kullanabileceği tüm özellikleri isim -> değer sözlüğü olarak döndürür
+        n = self.count
+        shifted_mean = self.shifted_sums / n
+        means = self.reference + shifted_mean
+        # Örneklem varyansı (ddof=1), pandas rolling().std() ile aynı
+        variances = (self.shifted_sq_sums - n * shifted_mean * shifted_mean) / (n - 1)
+        stds = np.sqrt(np.maximum(variances, 0.0))
+
+        features = dict(self.last_values)
+        features['battery_soh_val'] = self.last_values['battery_soh'] # train_model.py'deki isim
+        for name, (channel, stat) in ROLLING_FEATURES.items():
+            features[name] = float(means[channel] if stat == 'mean' else stds[channel])
+        for mode, col in zip(DRIVING_MODES, MODE_COLUMNS):
+            features[col] = 1.0 if self.last_mode == mode else 0.0
+        return features
+
+    def features(self, feature_columns):
+        # Modellerin beklediği sıraya göre (1, N) boyutlu özellik vektörü; yeterli veri yoksa None
+        if not self.is_ready():
+            return None
+
+        feature_values = self.feature_values()
+        if feature_columns is None or not all(col in feature_values for col in feature_columns):
+            print("Uyarı: Özellik sütunları eksik veya modelin beklediği formatta değil.")
+            return None
+
+        return np.array([feature_values[col] for col in feature_columns]).reshape(1, -1)
+
+
+# --- Birinci Kademe: Akan Veri Kural/CUSUM Dedektörü ---
+# Her veri noktasında O(1) güncellenir; pencere dolmadan bile belirgin arızalar için anında alarm üretir ve
+# ağaç modellerinin yalnızca risk skoru eşiği geçen otobüsler için çalışmasını sağlar.
+# 1) Kurallar: simülatörün enjekte ettiği belirgin imzalar (ör. 3.0-3.3 V voltaj + düşük verim, 50 °C üstü
+#    sıcaklık). Normal sürüşte tek örnekte de görülebildikleri için RULE_CONFIRM_SAMPLES ardışık örnek aranır.
+# 2) CUSUM: voltaj, verim, hücre sıcaklık farkı ve en yüksek sıcaklık için otobüsün o sürüş modundaki sağlıklı
+#    EWMA ortalama/varyansına göre standartlaştırılmış sapmaların tek yönlü kümülatif toplamı.
+RISK_THRESHOLD = 0.5 # Bu risk skorunun üstündeki otobüsler için model çalıştırılır ve alarm üretilir
+RISK_CLEAR_THRESHOLD = 0.25 # Alarm, skor bu değerin altına inince yeniden kurulur (histerezis)
+RULE_CONFIRM_SAMPLES = 4 # Kuralın alarm sayılması için gereken ardışık örnek sayısı (5 sn aralıkla 20 sn)
+EWMA_ALPHA = 0.02 # Sağlıklı taban çizgisinin öğrenme hızı
+CUSUM_H = 8.0 # Standart sapma biriminde alarm sınırı; risk skoru = CUSUM / CUSUM_H
+CUSUM_MAX = 2 * CUSUM_H # Uzun arızalardan sonra toplamın sınırsız büyümemesi için üst sınır
+CUSUM_WARMUP_SAMPLES = 30 # Bir sürüş modunda taban çizgisi bu kadar örnekle öğrenilmeden CUSUM işlemez
+BASELINE_OUTLIER_Z = 5.0 # Bundan büyük sapmalı örnekler taban çizgisini güncellemez
+BASELINE_RESET_SAMPLES = 120 # Bir modda bu kadar ardışık örnek reddedilirse taban çizgisi yeniden öğrenilir (10 dk)
+ML_FALLBACK_INTERVAL = timedelta(seconds=60) # Sağlıklı otobüsler de en az bu veri aralığıyla modelden geçer
+
+# (kanal adı, arıza yönü: -1 düşüş/+1 artış, en küçük standart sapma, CUSUM toleransı k (σ), ilgili arıza tipi).
+# Enjekte edilen arızalar 3σ ve üzeri kayma üretir. Sıcaklık farkı |max - min| sağa çarpık dağıldığı için
+# daha geniş tolerans alır.
+RISK_CHANNELS = [
+    ('cell_voltage', -1.0, 0.02, 1.0, 'voltage_drop_fault'),
+    ('energy_efficiency', -1.0, 0.5, 1.5, 'efficiency_loss_fault'),
+    ('temp_spread', 1.0, 0.5, 2.0, 'cell_imbalance_fault'),
+    ('cell_max_temp', 1.0, 0.5, 1.5, 'overheat_fault'),
+]
+RISK_DIRECTIONS = np.array([direction for _, direction, _, _, _ in RISK_CHANNELS])
+RISK_MIN_VARIANCE = np.array([min_std * min_std for _, _, min_std, _, _ in RISK_CHANNELS])
+CUSUM_K = np.array([k for _, _, _, k, _ in RISK_CHANNELS])
+
+
+def match_fault_rule(cell_voltage, cell_min_temp, cell_max_temp, energy_efficiency):
+    # Belirgin arıza imzaları (öncelik sırasıyla); eşleşme yoksa None
+    if cell_min_temp >= 45.0 and cell_max_temp >= 50.0:
+        return 'overheat_fault'
+    if cell_voltage <= 3.3 and energy_efficiency <= 78.0:
+        return 'voltage_drop_fault'
+    if energy_efficiency <= 65.0:
+        return 'capacity_loss_fault'
+    if cell_max_temp - cell_min_temp >= 10.0 and cell_min_temp <= 30.0 and cell_max_temp >= 35.0:
+        return 'cell_imbalance_fault'
+    if energy_efficiency <= 75.0:
+        return 'efficiency_loss_fault'
+    return None
+
+
+class BusRiskDetector:
+    # Bir otobüsün birinci kademe risk durumu. Taban çizgileri sürüş moduna göre ayrı tutulur
+    # (son satır bilinmeyen mod içindir), CUSUM toplamları modlar arasında süreklidir.
+
+    def __init__(self):
+        mode_count = len(DRIVING_MODES) + 1
+        self.baseline_mean = np.zeros((mode_count, len(RISK_CHANNELS)))
+        self.baseline_var = np.tile(RISK_MIN_VARIANCE, (mode_count, 1))
+        self.baseline_count = np.zeros(mode_count, dtype=int)
+        self.rejected_streak = np.zeros(mode_count, dtype=int)
+        self.cusum = np.zeros(len(RISK_CHANNELS))
+        self.rule_streak = 0
+        self.rule_fault_type = None
+        self.risk_score = 0.0
+        self.alert_active = False
+        self.pending_alert = None # Henüz yayınlanmamış alarmın arıza tipi
+        self.last_model_timestamp = None # Bu otobüs için modelin son çalıştığı verinin zamanı
+
+    def update(self, data_point):
+        cell_voltage = float(data_point['cell_voltage'])
+        cell_min_temp = float(data_point['cell_min_temp'])
+        cell_max_temp = float(data_point['cell_max_temp'])
+        energy_efficiency = float(data_point['energy_efficiency'])
+        values = np.array([cell_voltage, energy_efficiency, cell_max_temp - cell_min_temp, cell_max_temp])
+
+        rule_fault_type = match_fault_rule(cell_voltage, cell_min_temp, cell_max_temp, energy_efficiency)
+        self.rule_streak = self.rule_streak + 1 if rule_fault_type else 0
+        self.rule_fault_type = rule_fault_type
+        rule_score = 1.0 if self.rule_streak >= RULE_CONFIRM_SAMPLES else 0.0
+
+        mode = data_point.get('current_driving_mode')
+        mode_index = DRIVING_MODES.index(mode) if mode in DRIVING_MODES else len(DRIVING_MODES)
+        count = self.baseline_count[mode_index]
+        deviation = values - self.baseline_mean[mode_index]
+        z = deviation / np.sqrt(self.baseline_var[mode_index])
+        if count >= CUSUM_WARMUP_SAMPLES:
+            self.cusum = np.minimum(np.maximum(0.0, self.cusum + RISK_DIRECTIONS * z - CUSUM_K), CUSUM_MAX)
+        cusum_score = float(self.cusum.max()) / CUSUM_H
+        self.risk_score = max(rule_score, cusum_score)
+
+        # Taban çizgisi aykırı olmayan ve kurala uymayan örneklerle güncellenir (ani arızalar karışmasın).
+        # Uzun süre tüm örnekler reddedilirse (ör. taban çizgisi arıza sırasında öğrenilmişse) baştan öğrenilir.
+        if count >= CUSUM_WARMUP_SAMPLES and (rule_fault_type or np.abs(z).max() > BASELINE_OUTLIER_Z):
+            self.rejected_streak[mode_index] += 1
+            if self.rejected_streak[mode_index] >= BASELINE_RESET_SAMPLES:
+                self.baseline_count[mode_index] = 0
+                self.baseline_var[mode_index] = RISK_MIN_VARIANCE
+                self.rejected_streak[mode_index] = 0
+                self.cusum[:] = 0.0
+        elif not rule_fault_type:
+            self.rejected_streak[mode_index] = 0
+            if count == 0:
+                self.baseline_mean[mode_index] = values
+            else:
+                alpha = max(EWMA_ALPHA, 1.0 / (count + 1)) # İlk örneklerde basit ortalama gibi davranır
+                self.baseline_mean[mode_index] += alpha * deviation
+                self.baseline_var[mode_index] = np.maximum(
+                    (1 - alpha) * (self.baseline_var[mode_index] + alpha * deviation * deviation), RISK_MIN_VARIANCE)
+            self.baseline_count[mode_index] = count + 1
+
+        if self.risk_score >= RISK_THRESHOLD and not self.alert_active:
+            self.alert_active = True
+            self.pending_alert = self.rule_fault_type if rule_score else RISK_CHANNELS[int(self.cusum.argmax())][4]
+        elif self.risk_score < RISK_CLEAR_THRESHOLD and self.alert_active:
+            self.alert_active = False
+
+    def take_alert(self):
+        alert, self.pending_alert = self.pending_alert, None
+        return alert
+
+    def needs_model(self, timestamp):
+        # Risk yüksekse veya son model çalışmasından bu yana ML_FALLBACK_INTERVAL geçtiyse True
+        if self.risk_score >= RISK_THRESHOLD or self.last_model_timestamp is None or timestamp is None:
+            return True
+        return timestamp - self.last_model_timestamp >= ML_FALLBACK_INTERVAL
+
+
 def create_features(data_points_df):
-    # Bu fonksiyon, pandas DataFrame olarak gelen son N veri noktasından anlamlı özellikler çıkarır.
-    # train_model.py ile tamamen aynı olmalı.
+    # Bu fonksiyon, pandas DataFrame olarak gelen veri noktalarından son pencerenin özelliklerini çıkarır.
+    # Rolling istatistikler yalnızca son WINDOW_SIZE noktaya bağlı olduğundan geçmişin tamamı işlenmez.
+    # Sürekli çalışan döngü her otobüs için kalıcı bir BusFeatureWindow kullanır; bu fonksiyon tek seferlik çağrılar içindir.
 
-    if data_points_df.empty or len(data_points_df) < 60: # En az 5 dakikalık (60 veri noktası) geçmiş veri
+    if data_points_df.empty or len(data_points_df) < WINDOW_SIZE: # En az 5 dakikalık (60 veri noktası) geçmiş veri
         return None
 
-    window_size = 60 # train_model.py ile aynı
-
-    # Özellik Mühendisliği
-    data_points_df['voltage_mean'] = data_points_df['cell_voltage'].rolling(window=window_size).mean()
-    data_points_df['voltage_std'] = data_points_df['cell_voltage'].rolling(window=window_size).std()
-    data_points_df['max_temp_mean'] = data_points_df['cell_max_temp'].rolling(window=window_size).mean()
-    data_points_df['max_temp_std'] = data_points_df['cell_max_temp'].rolling(window=window_size).std()
-    data_points_df['min_temp_mean'] = data_points_df['cell_min_temp'].rolling(window=window_size).mean()
-    data_points_df['min_temp_std'] = data_points_df['cell_min_temp'].rolling(window=window_size).std()
-    data_points_df['temp_diff_mean'] = (data_points_df['cell_max_temp'] - data_points_df['cell_min_temp']).rolling(window=window_size).mean()
-    data_points_df['efficiency_mean'] = data_points_df['energy_efficiency'].rolling(window=window_size).mean()
-    data_points_df['efficiency_std'] = data_points_df['energy_efficiency'].rolling(window=window_size).std()
-    
-    # SOH doğrudan özellik olarak
-    # battery_soh zaten df'de mevcut. Son değeri alacağız.
-
-    # Kategorik sürüş modunu One-Hot Encoding yap (train_model.py ile aynı sütunlar oluşmalı)
-    # df.columns'daki mevcut mod sütunlarını yakalamak ve eksik olanları eklemek önemli
-    # train_model.py'deki tüm mod_dummy sütunlarını bilmeliyiz.
-    all_possible_modes = ['mode_idle', 'mode_accelerating', 'mode_cruising', 'mode_braking', 'mode_uphill', 'mode_downhill']
-    mode_dummies = pd.get_dummies(data_points_df['current_driving_mode'], prefix='mode', dummy_na=False)
-    
-    # Eksik sütunları ekle ve NaN'ları 0 ile doldur
-    for col in all_possible_modes:
-        if col not in mode_dummies.columns:
-            mode_dummies[col] = 0
-    mode_dummies = mode_dummies[all_possible_modes] # Sırayı koru
-
-    data_points_df = pd.concat([data_points_df, mode_dummies], axis=1)
-
-    # Son satırdaki özellikler kullanılacak
-    latest_features_row = data_points_df.iloc[-1]
-
-    # Eğitilen modelin beklediği özellik sütunlarının sırasını ve adlarını kullan
-    if features_cols is None or not all(col in latest_features_row for col in features_cols):
-        print("Uyarı: Özellik sütunları eksik veya modelin beklediği formatta değil.")
+    bundle = model_registry.get()
+    if bundle is None:
         return None
 
-    # Modellerin beklediği sıraya göre numpy array oluştur
-    # latest_features_row[features_cols] kullanarak sadece ilgili sütunları ve doğru sırayı alırız
-    return np.array(latest_features_row[features_cols]).reshape(1, -1)
+    window = BusFeatureWindow()
+    for data_point in data_points_df.tail(WINDOW_SIZE).to_dict('records'):
+        window.push(data_point)
+    return window.features(bundle.features_cols)
 
 
-# --- Tahmin Yapma Fonksiyonu ---
-def make_prediction(features):
-    predictions_output = {
-        "fault_type": "Bilinmiyor",
-        "fault_reason": "Model yüklenemedi veya yeterli veri yok.",
-        "prob_5min": 0.0,
-        "prob_30min": 0.0,
-        "is_fault_imminent_5min": False,
-        "is_fault_imminent_30min": False
-    }
+# --- Tahmin Yapma Fonksiyonları ---
+# Arıza tipine göre açıklama metinleri; listede olmayan tipler (normal) için NORMAL_FAULT_REASON kullanılır
+FAULT_REASONS = {
+    "voltage_drop_fault": "Hücre voltajında kritik düşüş eğilimi.",
+    "overheat_fault": "Pil paketi sıcaklığı tehlikeli seviyede.",
+    "efficiency_loss_fault": "Enerji verimliliğinde belirgin düşüş.",
+    "cell_imbalance_fault": "Hücreler arası denge bozukluğu tespit edildi.",
+    "capacity_loss_fault": "Batarya kapasitesinde ciddi bir kayıp var.",
+}
+NORMAL_FAULT_REASON = "Sistem normal çalışıyor veya belirgin bir arıza riski yok."
+NO_MODEL_REASON = "Model yüklenemedi veya yeterli veri yok."
+FAULT_THRESHOLD = 0.5 # Olasılık eşik değeri
+
+
+def fault_reason(fault_type):
+    # Canlı tahminle aynı açıklama: model sonucu olmayan "Bilinmiyor" kayıtları NO_MODEL_REASON ile gönderilir
+    if fault_type == "Bilinmiyor":
+        return NO_MODEL_REASON
+    return FAULT_REASONS.get(fault_type, NORMAL_FAULT_REASON)
+
+
+def _fault_column(probabilities, classes):
+    # Arıza sınıfının (1) olasılık sütunu; eğitim verisinde hiç arıza yoksa model bu sınıfı bilmez
+    fault_columns = np.flatnonzero(classes == 1)
+    if fault_columns.size == 0:
+        return np.zeros(len(probabilities))
+    return probabilities[:, fault_columns[0]]
+
+
+def _fault_probability(model, features_matrix):
+    return _fault_column(model.predict_proba(features_matrix), model.classes_)
+
+
+def predict_arrays(features_matrix, bundle):
+    # Tüm satırlar için (5 dk olasılığı, 30 dk olasılığı, arıza tipi indeksi veya None) dizilerini döndürür.
+    # Çok çıktılı model yüklüyse üç hedef tek ağaç geçişiyle bulunur. backtest.py büyük matrisleri doğrudan
+    # bununla skorlar; satır başına sözlük üretilmez.
+    n_rows = len(features_matrix)
+    prob_5min = np.zeros(n_rows)
+    prob_30min = np.zeros(n_rows)
+    fault_type_pred_idx = None
+
+    if bundle is None:
+        pass # Model yüklenemedi; varsayılan değerler döner
+    elif bundle.model_multi:
+        outputs = dict(zip(bundle.multi_output_targets, bundle.model_multi.predict_proba(features_matrix)))
+        output_classes = dict(zip(bundle.multi_output_targets, bundle.model_multi.classes_))
+        prob_5min = _fault_column(outputs['y_5min'], output_classes['y_5min'])
+        prob_30min = _fault_column(outputs['y_30min'], output_classes['y_30min'])
+        fault_type_pred_idx = output_classes['y_fault_type'].take(np.argmax(outputs['y_fault_type'], axis=1))
+    else:
+        if bundle.model_5min:
+            prob_5min = _fault_probability(bundle.model_5min, features_matrix)
+        if bundle.model_30min:
+            prob_30min = _fault_probability(bundle.model_30min, features_matrix)
+        if bundle.model_fault_type:
+            fault_type_pred_idx = bundle.model_fault_type.predict(features_matrix)
+    if fault_type_pred_idx is not None:
+        fault_type_pred_idx = fault_type_pred_idx.astype(int)
+    return prob_5min, prob_30min, fault_type_pred_idx
+
+
+def make_predictions_batch(features_matrix, bundle=None):
+    # (otobüs sayısı x özellik sayısı) matrisindeki tüm satırları her model için tek çağrıyla tahmin eder.
+    # bundle verilmezse geçerli model kullanılır. Dönen liste, matrisin satır sırasıyla eşleşen tahmin
+    # sözlüklerinden oluşur.
+    bundle = bundle or model_registry.get()
+    n_rows = len(features_matrix)
+    if n_rows == 0:
+        return []
+
+    fault_types = np.full(n_rows, "Bilinmiyor", dtype=object)
+    fault_reasons = np.full(n_rows, NO_MODEL_REASON, dtype=object)
+    prob_5min, prob_30min, fault_type_pred_idx = predict_arrays(features_matrix, bundle)
 
+    if fault_type_pred_idx is not None:
+        # Tip metinleri ve açıklamalar, sınıf indeksleriyle hizalı dizilerden tek seferde seçilir
+        fault_type_texts = np.array(bundle.fault_type_map_text, dtype=object)
+        reason_texts = np.array([fault_reason(text) for text in bundle.fault_type_map_text], dtype=object)
+        fault_types = fault_type_texts[fault_type_pred_idx]
+        fault_reasons = reason_texts[fault_type_pred_idx]
+
+    is_imminent_5min = prob_5min > FAULT_THRESHOLD
+    is_imminent_30min = prob_30min > FAULT_THRESHOLD
+
+    return [
+        {
+            "fault_type": fault_types[i],
+            "fault_reason": fault_reasons[i],
+            "prob_5min": round(float(prob_5min[i]), 4),
+            "prob_30min": round(float(prob_30min[i]), 4),
+            "is_fault_imminent_5min": bool(is_imminent_5min[i]),
+            "is_fault_imminent_30min": bool(is_imminent_30min[i])
+        }
+        for i in range(n_rows)
+    ]
+
+
+def make_prediction(features, bundle=None):
+    # Tek bir (1, N) özellik satırı için tahmin; make_predictions_batch'in ince sarmalayıcısı
     if features is None:
-        return predictions_output # Özellik çıkarılamadıysa boş dön
-
-    # 5 dakikalık tahmin
-    if model_5min:
-        prob_5min = model_5min.predict_proba(features)[0][1] # Genellikle 1. sınıf (arıza) olasılığı
-        predictions_output["prob_5min"] = round(prob_5min, 4)
-        predictions_output["is_fault_imminent_5min"] = prob_5min > 0.5 # Eşik değeri
-
-    # 30 dakikalık tahmin
-    if model_30min:
-        prob_30min = model_30min.predict_proba(features)[0][1] # Genellikle 1. sınıf (arıza) olasılığı
-        predictions_output["prob_30min"] = round(prob_30min, 4)
-        predictions_output["is_fault_imminent_30min"] = prob_30min > 0.5 # Eşik değeri
-
-    # Arıza tipi tahmini
-    if model_fault_type and fault_type_map_text:
-        fault_type_pred_idx = model_fault_type.predict(features)[0]
-        predictions_output["fault_type"] = fault_type_map_text[fault_type_pred_idx]
-
-        # Arıza nedenini tahmin edilen türe göre güncelleyin
-        if predictions_output["fault_type"] == "voltage_drop_fault":
-            predictions_output["fault_reason"] = "Hücre voltajında kritik düşüş eğilimi."
-        elif predictions_output["fault_type"] == "overheat_fault":
-            predictions_output["fault_reason"] = "Pil paketi sıcaklığı tehlikeli seviyede."
-        elif predictions_output["fault_type"] == "efficiency_loss_fault":
-            predictions_output["fault_reason"] = "Enerji verimliliğinde belirgin düşüş."
-        elif predictions_output["fault_type"] == "cell_imbalance_fault":
-            predictions_output["fault_reason"] = "Hücreler arası denge bozukluğu tespit edildi."
-        elif predictions_output["fault_type"] == "capacity_loss_fault":
-            predictions_output["fault_reason"] = "Batarya kapasitesinde ciddi bir kayıp var."
-        else: # Normal
-            predictions_output["fault_reason"] = "Sistem normal çalışıyor veya belirgin bir arıza riski yok."
-    
-    return predictions_output
-
-
-# --- Tahmin Sonuçlarını Kaydetme Fonksiyonu ---
+        return {
+            "fault_type": "Bilinmiyor",
+            "fault_reason": NO_MODEL_REASON,
+            "prob_5min": 0.0,
+            "prob_30min": 0.0,
+            "is_fault_imminent_5min": False,
+            "is_fault_imminent_30min": False
+        } # Özellik çıkarılamadıysa boş dön
+    return make_predictions_batch(features, bundle)[0]
+
+
+# --- Artımlı Veri Çekme Fonksiyonları ---
+def parse_timestamp(timestamp):
+    # API'den gelen ISO zaman damgasını datetime objesine çevir
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+
+
+def fetch_new_data(cursor, since=None, wire_format=None, max_pages=MAX_PAGES_PER_TICK):
+    # can-data API'sinden `cursor` (son işlenen kaydın _id'si) sonrasındaki kayıtları sayfa sayfa çeker.
+    # İlk açılışta cursor yoksa `since` zaman damgasından sonraki kayıtlar istenir.
+    # Kayıtlar eklenme sırasıyla döner; (yeni kayıtlar, yeni cursor) döndürülür. Sunucu ikili çerçeve
+    # döndürdüyse kayıtlar tek bir TelemetryBatch'tir, aksi halde JSON sözlüklerinin listesidir.
+    # En fazla max_pages sayfa çekilir; kalan kayıtlar bir sonraki çağrıya kalır.
+    wire_format = wire_format or WIRE_FORMAT
+    headers = {"Accept": f"{can_frames.CONTENT_TYPE}, application/json;q=0.5"} if wire_format != "json" else {}
+    json_records = []
+    batches = []
+    for _ in range(max_pages):
+        params = {"limit": FETCH_PAGE_SIZE}
+        if cursor:
+            params["after_id"] = cursor
+        elif since:
+            params["since"] = since.isoformat()
+
+        with metrics.timer("fetch"):
+            response = http_session.get(NEXTJS_GET_DATA_URL, params=params, headers=headers)
+            response.raise_for_status()
+        if can_frames.accepts_can_frames(response.headers.get("Content-Type")):
+            with metrics.timer("frame_decode"):
+                batch, next_cursor, has_more = can_frames.decode_frames(response.content)
+            batches.append(batch)
+        else:
+            with metrics.timer("json_decode"):
+                page = response.json()
+            json_records.extend(page["data"])
+            next_cursor, has_more = page.get("next_cursor"), page.get("has_more")
+
+        cursor = next_cursor or cursor
+        if not has_more:
+            break
+    if batches and json_records:
+        # Sunucu sayfalar arasında biçim değiştirdiyse (ör. yeniden dağıtım) JSON sayfaları da çerçeveye çevrilir
+        batches.insert(0, TelemetryBatch.from_records(json_records))
+    if batches:
+        return (batches[0] if len(batches) == 1 else TelemetryBatch.concatenate(batches)), cursor
+    return json_records, cursor
+
+
+def merge_new_data(records, bus_windows):
+    # Yeni kayıtları her otobüsün kalıcı penceresine ekler. records JSON sözlüklerinin listesi veya ikili
+    # çerçevelerden çözülmüş bir TelemetryBatch olabilir.
+    # Pencerenin son zaman damgası o otobüsün yüksek su işaretidir; daha eski veya tekrar gelen kayıtlar atlanır.
+    # Yeni veri alan otobüsler için {bus_id: son kaydın zaman damgası (metin)} döndürülür.
+    last_points = {}
+    with metrics.timer("parse_timestamps"):
+        if isinstance(records, TelemetryBatch):
+            records = records.data_points() # Epoch ms zaman damgaları doğrudan datetime'a çevrilir
+        else:
+            for data_point in records:
+                data_point['timestamp_dt'] = parse_timestamp(data_point['timestamp'])
+    with metrics.timer("merge"):
+        for data_point in records:
+            bus_id = data_point.get("bus_id")
+            window = bus_windows.get(bus_id)
+            if window is None:
+                window = bus_windows[bus_id] = BusFeatureWindow()
+            if window.last_timestamp is None or data_point['timestamp_dt'] > window.last_timestamp:
+                window.push(data_point)
+                window.risk.update(data_point)
+                last_points[bus_id] = data_point
+    # Metin zaman damgası yalnızca otobüs başına son kayıt için üretilir (ikili çerçevede metin gelmez)
+    return {bus_id: data_point.get('timestamp') or can_frames.format_timestamp(data_point['timestamp_dt'])
+            for bus_id, data_point in last_points.items()}
+
+
+# --- Tahmin Önbelleği ---
+# Tahmin kaydının içerik alanları; aynı içerikli kayıt heartbeat süresi dolmadan tekrar yazılmaz
+PREDICTION_CONTENT_FIELDS = ("fault_type", "fault_reason", "prob_5min", "prob_30min",
+                             "is_fault_imminent_5min", "is_fault_imminent_30min", "model_version")
+
+
+class PredictionCache:
+    # Otobüs başına son skorlanan pencere anahtarı (bus_id, son zaman damgası, model sürümü) ile son tahmin ve
+    # son gönderilen kaydın içeriği/zamanı. Boyutu sınırlıdır; yer kalmayınca en uzun süredir görülmeyen
+    # (artık veri göndermeyen) otobüs atılır (LRU).
+
+    def __init__(self, max_size=PREDICTION_CACHE_SIZE, heartbeat_seconds=PREDICTION_HEARTBEAT_SECONDS):
+        self.max_size = max_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.entries = OrderedDict() # bus_id -> {"key", "prediction", "posted_content", "posted_at"}
+
+    def _entry(self, bus_id):
+        entry = self.entries.get(bus_id)
+        if entry is None:
+            entry = self.entries[bus_id] = {"key": None, "prediction": None, "posted_content": None, "posted_at": None}
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(bus_id)
+        return entry
+
+    def lookup(self, bus_id, timestamp_data_end, model_version):
+        # Pencere ve model değişmediyse önceki tahmin kaydı, aksi halde None
+        entry = self.entries.get(bus_id)
+        if entry is not None and entry["key"] == (bus_id, timestamp_data_end, model_version):
+            self.entries.move_to_end(bus_id)
+            return entry["prediction"]
+        return None
+
+    def store(self, prediction_record):
+        entry = self._entry(prediction_record["bus_id"])
+        entry["key"] = (prediction_record["bus_id"], prediction_record["timestamp_data_end"], prediction_record["model_version"])
+        entry["prediction"] = prediction_record
+
+    def should_post(self, prediction_record, now=None):
+        # Son gönderilenle aynı içerikteki kayıt, heartbeat süresi dolmadıysa yazılmaz
+        now = time.monotonic() if now is None else now
+        entry = self._entry(prediction_record["bus_id"])
+        content = tuple(prediction_record.get(field) for field in PREDICTION_CONTENT_FIELDS)
+        if content == entry["posted_content"] and now - entry["posted_at"] < self.heartbeat_seconds:
+            return False
+        entry["posted_content"] = content
+        entry["posted_at"] = now
+        return True
+
+
+# --- Kontrol Noktası (Warm-Start Checkpoint) ---
+# Otobüs pencereleri, yüksek su işaretleri ve son tahminler düzenli aralıklarla yerel diske yazılır.
+# Veri, otobüs başına bir satırlık yapılandırılmış bir NumPy dizisidir (.npy, np.lib.format.open_memmap ile
+# doğrudan diske yazılır ve açılışta mmap_mode='r' ile okunur). Küçük bir JSON dosyası geçerli .npy
+# dosyasını ve API cursor'ını gösterir; önce .npy, en son JSON os.replace ile yerine konur, böylece
+# yarım yazılmış bir kontrol noktası asla okunmaz.
+CHECKPOINT_PATH = "predictor_checkpoint.json"
+CHECKPOINT_INTERVAL_SECONDS = 30 # Kontrol noktası yazma aralığı
+CHECKPOINT_MAX_AGE = timedelta(minutes=30) # Daha eski kontrol noktası kullanılmaz, normal açılış yapılır
+CHECKPOINT_VERSION = 1
+NO_TIMESTAMP = np.iinfo(np.int64).min # Zaman damgası olmayan alanlar için
+
+
+def _checkpoint_dtype(window_size):
+    return np.dtype([
+        ("bus_id", "U64"),
+        ("buffer", "f8", (window_size, len(WINDOW_CHANNELS))),
+        ("head", "i4"),
+        ("count", "i4"),
+        ("pushes_since_resync", "i4"),
+        ("reference", "f8", len(WINDOW_CHANNELS)),
+        ("shifted_sums", "f8", len(WINDOW_CHANNELS)),
+        ("shifted_sq_sums", "f8", len(WINDOW_CHANNELS)),
+        ("last_values", "f8", len(RAW_FEATURES)),
+        ("last_mode", "i1"), # DRIVING_MODES indeksi, bilinmiyorsa -1
+        ("last_timestamp_us", "i8"), # Yüksek su işareti (UTC epoch mikrosaniye)
+        # Son tahmin (yeniden başlatmadan sonra aynı tahminin tekrar yazılmaması için)
+        ("prediction_timestamp_data_end", "U40"),
+        ("prediction_fault_type", "U40"),
+        ("prediction_prob_5min", "f8"),
+        ("prediction_prob_30min", "f8"),
+        ("prediction_model_version", "U40"),
+    ])
+
+
+def _datetime_to_us(value):
+    if value is None:
+        return NO_TIMESTAMP
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+def _us_to_datetime(value):
+    if value == NO_TIMESTAMP:
+        return None
+    return datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(microseconds=int(value))
+
+
+def save_checkpoint(bus_windows, cursor, prediction_cache=None, path=CHECKPOINT_PATH):
+    directory = os.path.dirname(os.path.abspath(path))
+    generation = time.time_ns()
+    data_name = f"{os.path.splitext(os.path.basename(path))[0]}.{generation}.npy"
+    data_path = os.path.join(directory, data_name)
+
+    bus_ids = [bus_id for bus_id, window in bus_windows.items() if window.count > 0]
+    rows = np.lib.format.open_memmap(data_path, mode="w+", dtype=_checkpoint_dtype(WINDOW_SIZE), shape=(len(bus_ids),))
+    for i, bus_id in enumerate(bus_ids):
+        state = bus_windows[bus_id].to_state()
+        row = rows[i]
+        row["bus_id"] = bus_id
+        for field in ("buffer", "head", "count", "pushes_since_resync", "reference", "shifted_sums", "shifted_sq_sums", "last_values"):
+            row[field] = state[field]
+        row["last_mode"] = DRIVING_MODES.index(state["last_mode"]) if state["last_mode"] in DRIVING_MODES else -1
+        row["last_timestamp_us"] = _datetime_to_us(state["last_timestamp"])
+        entry = prediction_cache.entries.get(bus_id) if prediction_cache is not None else None
+        prediction = entry["prediction"] if entry is not None else None
+        if prediction is not None:
+            row["prediction_timestamp_data_end"] = prediction["timestamp_data_end"]
+            row["prediction_fault_type"] = prediction["fault_type"]
+            row["prediction_prob_5min"] = prediction["prob_5min"]
+            row["prediction_prob_30min"] = prediction["prob_30min"]
+            row["prediction_model_version"] = prediction["model_version"]
+    rows.flush()
+    del rows
+
+    manifest = {
+        "version": CHECKPOINT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "window_size": WINDOW_SIZE,
+        "data_file": data_name,
+        "bus_count": len(bus_ids),
+        "cursor": cursor,
+    }
+    previous = _read_checkpoint_manifest(path)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{path}.tmp", path)
+    # Önceki kontrol noktasının veri dosyası artık kullanılmıyor
+    if previous and previous.get("data_file") != data_name:
+        try:
+            os.remove(os.path.join(directory, previous["data_file"]))
+        except OSError:
+            pass
+
+
+def _read_checkpoint_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_checkpoint(path=CHECKPOINT_PATH, prediction_cache=None, max_age=CHECKPOINT_MAX_AGE):
+    # (bus_windows, cursor, oluşturulma zamanı) döndürür; kontrol noktası yoksa, çok eskiyse veya
+    # uyumsuzsa None döner ve servis normal açılış yapar.
+    manifest = _read_checkpoint_manifest(path)
+    if manifest is None:
+        return None
+    created_at = datetime.fromisoformat(manifest["created_at"])
+    if manifest.get("version") != CHECKPOINT_VERSION or manifest.get("window_size") != WINDOW_SIZE:
+        print("Kontrol noktası bu sürümle uyumlu değil, kullanılmayacak.")
+        return None
+    if datetime.now(timezone.utc) - created_at > max_age:
+        print(f"Kontrol noktası çok eski ({created_at.isoformat()}), kullanılmayacak.")
+        return None
+
+    rows = np.load(os.path.join(os.path.dirname(os.path.abspath(path)), manifest["data_file"]), mmap_mode="r")
+    bus_windows = {}
+    for row in rows:
+        bus_id = str(row["bus_id"])
+        mode_code = int(row["last_mode"])
+        bus_windows[bus_id] = BusFeatureWindow.from_state({
+            "buffer": row["buffer"],
+            "head": row["head"],
+            "count": row["count"],
+            "pushes_since_resync": row["pushes_since_resync"],
+            "reference": row["reference"],
+            "shifted_sums": row["shifted_sums"],
+            "shifted_sq_sums": row["shifted_sq_sums"],
+            "last_values": row["last_values"],
+            "last_mode": DRIVING_MODES[mode_code] if mode_code >= 0 else None,
+            "last_timestamp": _us_to_datetime(row["last_timestamp_us"]),
+        })
+        if prediction_cache is not None and row["prediction_model_version"]:
+            # Son tahmin gönderilmiş kabul edilir; aynı sonuç heartbeat süresi dolmadan tekrar yazılmaz
+            fault_type = str(row["prediction_fault_type"])
+            prob_5min = float(row["prediction_prob_5min"])
+            prob_30min = float(row["prediction_prob_30min"])
+            prediction_record = {
+                "bus_id": bus_id,
+                "timestamp_data_end": str(row["prediction_timestamp_data_end"]),
+                "fault_type": fault_type,
+                "fault_reason": fault_reason(fault_type),
+                "prob_5min": prob_5min,
+                "prob_30min": prob_30min,
+                "is_fault_imminent_5min": prob_5min > FAULT_THRESHOLD,
+                "is_fault_imminent_30min": prob_30min > FAULT_THRESHOLD,
+                "model_version": str(row["prediction_model_version"]),
+            }
+            prediction_cache.store(prediction_record)
+            prediction_cache.should_post(prediction_record)
+    return bus_windows, manifest.get("cursor"), created_at
+
+
+# --- Otobüs Skorlama ---
+def rule_alert_record(bus_id, timestamp_data_end, fault_type, risk_score):
+    # Birinci kademe alarmı, tahmin kayıtlarıyla aynı biçimde (detector alanı ile ayrılır)
+    risk_probability = round(min(1.0, risk_score), 2)
+    return {
+        "bus_id": bus_id,
+        "timestamp_data_end": timestamp_data_end,
+        "predicted_at": datetime.now().isoformat(),
+        "fault_type": fault_type,
+        "fault_reason": fault_reason(fault_type),
+        "prob_5min": risk_probability,
+        "prob_30min": risk_probability,
+        "is_fault_imminent_5min": True,
+        "is_fault_imminent_30min": True,
+        "model_version": "rules",
+        "detector": "rules",
+    }
+
+
+def score_buses(bus_windows, updated_buses, bundle, prediction_cache=None, tiered=False):
+    # Yeni veri alan ve penceresi hazır otobüsleri tek toplu çağrıyla skorlar; backend'e gönderilecek
+    # tahmin kayıtlarını döndürür. Tek süreçli döngü ve parçalı (sharded) işçiler aynı fonksiyonu kullanır.
+    # prediction_cache verilirse penceresi ve modeli son skorlamadan beri değişmeyen otobüsler için
+    # özellik çıkarımı ve çıkarım atlanır, önceki kayıt döner.
+    # tiered=True ise önce birinci kademe dedektörün yeni alarmları eklenir (pencere dolmamış olsa da),
+    # model yalnızca risk skoru eşiği geçen veya ML_FALLBACK_INTERVAL boyunca modelden geçmemiş otobüsler için çalışır.
+    alert_records = []
+    if tiered:
+        model_buses = {}
+        for bus_id, timestamp_data_end in updated_buses.items():
+            window = bus_windows[bus_id]
+            alert_fault_type = window.risk.take_alert()
+            if alert_fault_type is not None:
+                alert_records.append(rule_alert_record(bus_id, timestamp_data_end, alert_fault_type, window.risk.risk_score))
+            if window.risk.needs_model(window.last_timestamp):
+                model_buses[bus_id] = timestamp_data_end
+        rule_alerts_total.inc(len(alert_records))
+        model_skipped_total.inc(len(updated_buses) - len(model_buses))
+        updated_buses = model_buses
+
+    if bundle is None:
+        return alert_records # Model yoksa pencereler yine güncellenir ama tahmin yapılmaz
+
+    cached_records = []
+    if prediction_cache is not None:
+        pending_buses = {}
+        for bus_id, timestamp_data_end in updated_buses.items():
+            cached = prediction_cache.lookup(bus_id, timestamp_data_end, bundle.version)
+            if cached is None:
+                pending_buses[bus_id] = timestamp_data_end
+            else:
+                cached_records.append(cached)
+        cache_hits_total.inc(len(cached_records))
+        updated_buses = pending_buses
+
+    # Yeni veri alan ve penceresi hazır olan otobüslerin özelliklerini topla
+    ready_bus_ids = []
+    ready_features = []
+    with metrics.timer("features"):
+        for bus_id in updated_buses:
+            features = bus_windows[bus_id].features(bundle.features_cols)
+            if features is not None:
+                ready_bus_ids.append(bus_id)
+                ready_features.append(features)
+            else:
+                print(f"Otobüs {bus_id} için yeterli veri yok veya özellik çıkarılamadı, analiz atlandı.")
+    if not ready_features:
+        return alert_records + cached_records
+
+    # Tüm filo için her model tek çağrıyla çalışır
+    with metrics.timer("predict"):
+        prediction_results = make_predictions_batch(np.vstack(ready_features), bundle)
+    predicted_at = datetime.now().isoformat()
+    prediction_records = [
+        {
+            "bus_id": bus_id,
+            "timestamp_data_end": updated_buses[bus_id], # Analiz edilen son verinin zamanı
+            "predicted_at": predicted_at,
+            "fault_type": prediction_result["fault_type"],
+            "fault_reason": prediction_result["fault_reason"],
+            "prob_5min": prediction_result["prob_5min"],
+            "prob_30min": prediction_result["prob_30min"],
+            "is_fault_imminent_5min": prediction_result["is_fault_imminent_5min"],
+            "is_fault_imminent_30min": prediction_result["is_fault_imminent_30min"],
+            "model_version": bundle.version
+        }
+        for bus_id, prediction_result in zip(ready_bus_ids, prediction_results)
+    ]
+    if prediction_cache is not None:
+        for prediction_record in prediction_records:
+            prediction_cache.store(prediction_record)
+    for bus_id in ready_bus_ids:
+        bus_windows[bus_id].risk.last_model_timestamp = bus_windows[bus_id].last_timestamp
+    return alert_records + cached_records + prediction_records
+
+
+def observe_predictions(prediction_records, last_predicted_at):
+    # Tahmin sayacı, veri -> tahmin gecikmesi ve otobüs başına son tahmin anı (bayatlık ölçümü için)
+    now_utc = datetime.now(timezone.utc)
+    now_monotonic = time.monotonic()
+    tick_buses_scored.set(len(prediction_records))
+    buses_scored_total.inc(len(prediction_records))
+    for prediction_record in prediction_records:
+        data_end = parse_timestamp(prediction_record["timestamp_data_end"])
+        if data_end.tzinfo is None:
+            data_end = data_end.replace(tzinfo=timezone.utc)
+        prediction_lag_seconds.observe(max(0.0, (now_utc - data_end).total_seconds()))
+        last_predicted_at[prediction_record["bus_id"]] = now_monotonic
+
+
+# --- Tahmin Sonuçlarını Kaydetme ---
+# Tüm HTTP istekleri bağlantı havuzu kullanan ortak bir oturum üzerinden yapılır (her istekte yeni TCP bağlantısı açılmaz)
+http_session = requests.Session()
+http_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
 def post_prediction(prediction_data):
+    # Tek bir tahmin kaydını (veya tahmin listesini) senkron olarak gönderir
     try:
-        response = requests.post(NEXTJS_POST_PREDICTION_URL, json=prediction_data)
-        response.raise_for_status()
+        with metrics.timer("post"):
+            response = http_session.post(NEXTJS_POST_PREDICTION_URL, json=prediction_data)
+            response.raise_for_status()
         # print(f"Prediction sent for {prediction_data['bus_id']}: {response.status_code}") # Gürültüyü azaltmak için yorum satırı
     except requests.exceptions.RequestException as e:
         print(f"Error sending prediction to Next.js: {e}")
 
+
+class PredictionSink:
+    # Tahmin kayıtlarını sınırlı bir kuyrukta biriktirip arka plan iş parçacığında toplu olarak gönderir.
+    # Kayıtlar PREDICTION_BATCH_SIZE'a ulaşınca veya PREDICTION_FLUSH_SECONDS dolunca tek POST ile
+    # /api/predictions'a (insertMany) yazılır. Yavaş bir backend çıkarım döngüsünü durdurmaz:
+    # kuyruk dolduğunda en eski kayıtlar atılır.
+
+    def __init__(self, url=NEXTJS_POST_PREDICTION_URL, session=None, batch_size=PREDICTION_BATCH_SIZE,
+                 flush_seconds=PREDICTION_FLUSH_SECONDS, max_queue_size=PREDICTION_QUEUE_SIZE,
+                 max_retries=PREDICTION_MAX_RETRIES, retry_backoff=PREDICTION_RETRY_BACKOFF_SECONDS):
+        self.url = url
+        self.session = session or http_session
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="prediction-sink", daemon=True)
+        self.dropped_count = 0
+        self.sent_count = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, prediction_record):
+        # Bloklamadan kuyruğa ekle; kuyruk doluysa en eski kaydı at
+        while True:
+            try:
+                self.queue.put_nowait(prediction_record)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped_count += 1
+                    predictions_dropped_total.inc()
+                except queue.Empty:
+                    pass
+
+    def close(self, timeout=10.0):
+        # Kuyrukta kalan kayıtları gönderip iş parçacığını durdur
+        self.stop_event.set()
+        self.thread.join(timeout)
+
+    def _next_batch(self):
+        # İlk kayıt geldikten sonra en fazla flush_seconds kadar daha kayıt topla
+        try:
+            batch = [self.queue.get(timeout=self.flush_seconds)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_batch(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timer("post"):
+                    response = self.session.post(self.url, json=batch, timeout=10)
+                if response.status_code < 500:
+                    response.raise_for_status()
+                    self.sent_count += len(batch)
+                    predictions_sent_total.inc(len(batch))
+                    return
+                # 5xx yanıtları geçici kabul edilir ve tekrar denenir
+                error = f"HTTP {response.status_code}"
+            except requests.exceptions.HTTPError as e:
+                # 4xx: tekrar denemek sonucu değiştirmez
+                print(f"Error sending predictions to Next.js: {e}")
+                self.dropped_count += len(batch)
+                predictions_dropped_total.inc(len(batch))
+                return
+            except requests.exceptions.RequestException as e:
+                error = e
+            if attempt < self.max_retries and not self.stop_event.is_set():
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        print(f"Error sending {len(batch)} predictions to Next.js after {self.max_retries} retries: {error}")
+        self.dropped_count += len(batch)
+        predictions_dropped_total.inc(len(batch))
+
+    def _run(self):
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._send_batch(batch)
+
+
+# --- Asyncio Boru Hattı (Pipeline) Modu ---
+# Çekme, skorlama ve gönderme aşamaları asyncio görevleri olarak örtüşür: bir grup skorlanırken sonraki grup
+# çekilir, tahminler sınırlı sayıda eşzamanlı POST ile gönderilir. requests senkron olduğundan HTTP çağrıları
+# küçük bir G/Ç iş parçacığı havuzunda, pencere güncelleme ve çıkarım tek iş parçacıklı CPU havuzunda çalışır;
+# pencere durumuna yalnızca bu iş parçacığı dokunur ve gruplar geliş sırasıyla işlenir. Aşamalar arası
+# kuyruklar sınırlıdır: skorlama geride kalırsa çekme durur (kayıtlar API'de bekler, cursor ilerlemez),
+# gönderim geride kalırsa skorlama bekler.
+PIPELINE_FETCH_QUEUE_SIZE = 2 # Skorlanmayı bekleyen en fazla çekilmiş grup
+# Tek çekimdeki sayfa sayısı: birikmiş veride ilk sayfalar skorlanırken sonrakiler çekilir (skorlama geride
+# kalırsa kuyruktaki gruplar birleştirilir, otobüsler yine bir kez skorlanır)
+PIPELINE_PAGES_PER_FETCH = 5
+PIPELINE_MAX_INFLIGHT_POSTS = 4 # Aynı anda gönderilen en fazla tahmin grubu
+PIPELINE_RETRY_BASE_SECONDS = 1.0 # İşlenemeyen grubun ilk tekrar denemesinden önceki bekleme (her denemede iki katı)
+PIPELINE_RETRY_MAX_SECONDS = 60.0
+TICK_DEADLINE_SECONDS = TICK_INTERVAL_SECONDS # Çekmenin başlangıcından tahminlerin gönderim kuyruğuna girmesine kadar hedef süre
+
+deadline_misses_total = metrics.counter("predictor_deadline_misses_total", "Hedef süreyi (tick deadline) aşan grup sayısı")
+
+
+def _combine_records(parts):
+    # Kuyrukta biriken grupları tek gruba birleştirir (fetch_new_data'daki gibi karışık biçimler çerçeveye çevrilir)
+    batches = [part for part in parts if isinstance(part, TelemetryBatch)]
+    json_records = [record for part in parts if not isinstance(part, TelemetryBatch) for record in part]
+    if not batches:
+        return json_records
+    if json_records:
+        batches.insert(0, TelemetryBatch.from_records(json_records))
+    return batches[0] if len(batches) == 1 else TelemetryBatch.concatenate(batches)
+
+
+class PipelinedPredictor:
+    # process_records(kayıtlar) -> gönderilecek tahmin kayıtları; CPU havuzunda çağrılır (tek süreçli veya
+    # parçalı mod aynı fonksiyonu kullanır). Gönderim, sink'in (başlatılmamış bir PredictionSink) tekrar
+    # denemeli toplu POST'u ile yapılır. committed_cursor, başarıyla işlenmiş son grubun cursor'ıdır; kontrol
+    # noktası bu değeri yazmalıdır. Çekilmiş ama işlenmemiş gruplar yeniden açılışta tekrar çekilir. İşlenirken
+    # hata veren grup atlanmaz: yeni gruplar alınmadan artan beklemelerle tekrar denenir (çekme, kuyruk dolunca
+    # durur). Grup hata vermeden önce pencerelere kısmen eklenmiş olabilir; tekrar denemede eklenmiş kayıtlar
+    # pencerenin yüksek su işaretiyle atlanır. Bu sırada failed_batch True'dur ve kontrol noktası yazılmaz.
+
+    def __init__(self, process_records, sink, cursor=None, since=None, wire_format=None,
+                 tick_seconds=TICK_INTERVAL_SECONDS, deadline_seconds=TICK_DEADLINE_SECONDS,
+                 max_inflight_posts=PIPELINE_MAX_INFLIGHT_POSTS, fetch_queue_size=PIPELINE_FETCH_QUEUE_SIZE,
+                 checkpoint=None, checkpoint_interval=0):
+        self.process_records = process_records
+        self.sink = sink
+        self.cursor = cursor
+        self.committed_cursor = cursor
+        self.failed_batch = False
+        self.since = since
+        self.wire_format = wire_format
+        self.tick_seconds = tick_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_inflight_posts = max_inflight_posts
+        self.fetch_queue_size = fetch_queue_size
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.cpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline-cpu")
+        self.io_executor = ThreadPoolExecutor(max_workers=max_inflight_posts + 1, thread_name_prefix="pipeline-io")
+        self.fetch_queue = None
+        self.post_queue = None
+        self.post_tasks = set()
+
+    def queue_sizes(self):
+        # (çekilmiş grup kuyruğu, gönderim kuyruğu) uzunlukları; ölçüm sunucusu iş parçacığından okunur
+        return (self.fetch_queue.qsize() if self.fetch_queue else 0, self.post_queue.qsize() if self.post_queue else 0)
+
+    async def run(self):
+        self.fetch_queue = asyncio.Queue(maxsize=self.fetch_queue_size)
+        self.post_queue = asyncio.Queue(maxsize=self.sink.queue.maxsize)
+        stages = [asyncio.create_task(stage()) for stage in (self._fetch_stage, self._compute_stage, self._post_stage)]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            await asyncio.gather(*self.post_tasks, return_exceptions=True)
+            self.cpu_executor.shutdown(wait=True) # Yarıda kalan skorlama biter; pencereler tutarlı kalır
+            remaining = []
+            while not self.post_queue.empty():
+                remaining.append(self.post_queue.get_nowait())
+            for start in range(0, len(remaining), self.sink.batch_size):
+                self.sink._send_batch(remaining[start:start + self.sink.batch_size])
+            self.io_executor.shutdown(wait=True)
+
+    async def _fetch_stage(self):
+        loop = asyncio.get_running_loop()
+        full_fetch = PIPELINE_PAGES_PER_FETCH * FETCH_PAGE_SIZE
+        while True:
+            started = time.monotonic()
+            try:
+                records, self.cursor = await loop.run_in_executor(
+                    self.io_executor, fetch_new_data, self.cursor, self.since, self.wire_format, PIPELINE_PAGES_PER_FETCH)
+            except requests.exceptions.RequestException as e:
+                tick_errors_total.inc()
+                print(f"Next.js API'sinden veri çekilirken hata oluştu: {e}")
+                await asyncio.sleep(self.tick_seconds)
+                continue
+            except Exception as e:
+                # Eksik alanlı JSON veya bozuk çerçeve gibi hatalar aşamayı (ve servisi) durdurmaz; cursor ilerlemez
+                tick_errors_total.inc()
+                print(f"Genel bir hata oluştu: {e}")
+                await asyncio.sleep(self.tick_seconds)
+                continue
+            rows_ingested_total.inc(len(records))
+            tick_rows_ingested.set(len(records))
+            if len(records):
+                await self.fetch_queue.put((records, self.cursor, started)) # Kuyruk doluysa skorlama bekler
+            # Birikmiş veri varsa (tam dolu çekim) beklemeden devam edilir, yoksa periyot tamamlanır
+            if len(records) < full_fetch:
+                await asyncio.sleep(max(0.0, self.tick_seconds - (time.monotonic() - started)))
+
+    def _process(self, records):
+        profile_hook.apply() # cProfile çağrıldığı iş parçacığını ölçer; skorlama bu iş parçacığında
+        return self.process_records(records)
+
+    async def _compute_stage(self):
+        loop = asyncio.get_running_loop()
+        last_checkpoint_at = time.monotonic()
+        while True:
+            parts = [await self.fetch_queue.get()]
+            while not self.fetch_queue.empty():
+                parts.append(self.fetch_queue.get_nowait()) # Geride kalındıysa otobüsler bir kez skorlanır
+            records = _combine_records([part[0] for part in parts])
+            cursor, started = parts[-1][1], parts[0][2]
+            prediction_records = await self._process_with_retry(loop, records)
+            self.committed_cursor = cursor
+
+            elapsed = time.monotonic() - started
+            metrics.histogram("predictor_tick_seconds", "Bir döngünün toplam süresi (saniye)").observe(elapsed)
+            if elapsed > self.deadline_seconds:
+                deadline_misses_total.inc()
+                print(f"Uyarı: {len(records)} kayıtlık grup {elapsed:.2f} sn'de işlendi (hedef {self.deadline_seconds:.2f} sn).")
+            for prediction_record in prediction_records:
+                await self.post_queue.put(prediction_record) # Kuyruk doluysa gönderim bekler
+            ticks_total.inc()
+
+            if self.checkpoint and time.monotonic() - last_checkpoint_at >= self.checkpoint_interval:
+                await loop.run_in_executor(self.cpu_executor, self.checkpoint)
+                last_checkpoint_at = time.monotonic()
+
+    async def _process_with_retry(self, loop, records):
+        attempt = 0
+        while True:
+            try:
+                prediction_records = await loop.run_in_executor(self.cpu_executor, self._process, records)
+            except Exception as e:
+                tick_errors_total.inc()
+                self.failed_batch = True
+                delay = min(PIPELINE_RETRY_MAX_SECONDS, PIPELINE_RETRY_BASE_SECONDS * 2 ** attempt)
+                attempt += 1
+                print(f"Genel bir hata oluştu: {e} ({len(records)} kayıtlık grup {delay:.0f} sn sonra tekrar denenecek, "
+                      f"deneme {attempt}).")
+                await asyncio.sleep(delay)
+                continue
+            self.failed_batch = False
+            return prediction_records
+
+    async def _post_stage(self):
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(self.max_inflight_posts)
+        while True:
+            # İlk kayıt geldikten sonra en fazla flush_seconds kadar daha kayıt toplanır (PredictionSink ile aynı)
+            batch = [await self.post_queue.get()]
+            deadline = loop.time() + self.sink.flush_seconds
+            while len(batch) < self.sink.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self.post_queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            await in_flight.acquire()
+            task = asyncio.create_task(self._send(loop, batch, in_flight))
+            self.post_tasks.add(task)
+            task.add_done_callback(self.post_tasks.discard)
+
+    async def _send(self, loop, batch, in_flight):
+        try:
+            await loop.run_in_executor(self.io_executor, self.sink._send_batch, batch)
+        finally:
+            in_flight.release()
+
+
 # --- Ana Tahmin Döngüsü ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batarya arıza tahmin servisi")
+    parser.add_argument("--tick-seconds", type=float, default=TICK_INTERVAL_SECONDS, help="Tahmin döngüsünün periyodu (saniye)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Prometheus /metrics portu (0: kapalı)")
+    parser.add_argument("--heartbeat-seconds", type=float, default=PREDICTION_HEARTBEAT_SECONDS, help="Değişmeyen tahminin tekrar yazılma aralığı (saniye)")
+    parser.add_argument("--cache-size", type=int, default=PREDICTION_CACHE_SIZE, help="Tahmin önbelleğinde tutulan en fazla otobüs")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Pencere durumunun kaydedileceği kontrol noktası dosyası")
+    parser.add_argument("--checkpoint-interval", type=float, default=CHECKPOINT_INTERVAL_SECONDS, help="Kontrol noktası yazma aralığı (saniye, 0: kapalı)")
+    parser.add_argument("--no-tiered", action="store_true", help="Birinci kademe dedektörü kapat; her güncellenen otobüs modelden geçer")
+    parser.add_argument("--wire-format", choices=["auto", "json"], default=WIRE_FORMAT, help="can-data API'sinden istenecek telemetri biçimi (auto: ikili CAN çerçeveleri, desteklenmiyorsa JSON)")
+    parser.add_argument("--workers", type=int, default=0, help="Otobüsleri tutarlı özet (consistent hashing) ile bu kadar işçi sürece dağıt (0: tek süreç)")
+    parser.add_argument("--pipeline", action="store_true", help="Çekme, skorlama ve gönderimi asyncio ile örtüştür (sonraki grup, mevcut grup skorlanırken çekilir)")
+    parser.add_argument("--tick-deadline", type=float, default=None, help="Pipeline modunda çekmeden gönderim kuyruğuna hedef süre (saniye, varsayılan: --tick-seconds)")
+    parser.add_argument("--max-inflight-posts", type=int, default=PIPELINE_MAX_INFLIGHT_POSTS, help="Pipeline modunda aynı anda gönderilen en fazla tahmin grubu")
+    args = parser.parse_args()
+
     print("Yapay Zeka tahmin servisi başlatılıyor...")
-    
+
+    # Her otobüs için kalıcı kayan pencere durumu (parçalı modda pencereler işçi süreçlerde tutulur)
+    bus_windows = {}
+    # Değişmeyen pencerelerin tekrar skorlanmasını ve aynı tahminin tekrar yazılmasını önler
+    prediction_cache = PredictionCache(args.cache_size, args.heartbeat_seconds)
+    sharded_predictor = None
+    if args.workers > 0:
+        from predictor_shards import ShardedPredictor
+        sharded_predictor = ShardedPredictor(args.workers, MODEL_PATH, tiered=not args.no_tiered, metrics=metrics).start()
+        atexit.register(sharded_predictor.close)
+        print(f"Parçalı mod: {args.workers} işçi süreç.")
+
+    def tracked_bus_count():
+        return len(bus_windows) if sharded_predictor is None else len(sharded_predictor.assignment)
+    # Tahminler arka planda toplu olarak gönderilir. Pipeline modunda sink'in iş parçacığı başlatılmaz;
+    # gönderimi PipelinedPredictor'ın post aşaması sink'in toplu POST'u ile yapar.
+    prediction_sink = PredictionSink()
+    pipeline = None
+    if not args.pipeline:
+        prediction_sink.start()
+        atexit.register(prediction_sink.close) # Çıkışta kuyrukta kalan tahminleri gönder
+
+    # Son işlenen kaydın _id'si; ilk çağrıda yalnızca son BOOTSTRAP_LOOKBACK süresindeki veri çekilir
+    cursor = None
+    bootstrap_since = datetime.now(timezone.utc) - BOOTSTRAP_LOOKBACK
+
+    # Kontrol noktası varsa pencereler ve cursor oradan yüklenir; yalnızca daha yeni veriler çekilir.
+    # Parçalı modda pencereler işçi süreçlerde olduğundan kontrol noktası kullanılmaz.
+    checkpoint_enabled = args.checkpoint_interval > 0 and sharded_predictor is None
+    if checkpoint_enabled:
+        restored = load_checkpoint(args.checkpoint, prediction_cache)
+        if restored is not None:
+            bus_windows, cursor, checkpoint_created_at = restored
+            ready_count = sum(window.is_ready() for window in bus_windows.values())
+            print(f"Kontrol noktasından {len(bus_windows)} otobüs yüklendi ({ready_count} tanesi tahmine hazır, "
+                  f"{checkpoint_created_at.isoformat()}).")
+            if cursor is None:
+                bootstrap_since = max(bootstrap_since, checkpoint_created_at - BOOTSTRAP_LOOKBACK)
+
+        def write_checkpoint():
+            if pipeline is not None and pipeline.failed_batch:
+                # Pencereler tekrar denenen grubun bir kısmını içerebilir; önceki kontrol noktası korunur
+                print("Kontrol noktası atlandı: hata veren grup henüz başarıyla işlenmedi.")
+                return
+            try:
+                with metrics.timer("checkpoint"):
+                    # Pipeline modunda yalnızca pencerelere eklenmiş grupların cursor'ı yazılır
+                    checkpoint_cursor = pipeline.committed_cursor if pipeline is not None else cursor
+                    save_checkpoint(bus_windows, checkpoint_cursor, prediction_cache, args.checkpoint)
+            except Exception as e:
+                print(f"Kontrol noktası yazılamadı: {e}")
+        atexit.register(write_checkpoint) # Normal kapanışta son durum da kaydedilir
+    last_checkpoint_at = time.monotonic()
+
+    # Her otobüsün son tahmininin yapıldığı an (monotonic); en bayat tahminin yaşı ölçüm olarak sunulur
+    last_predicted_at = {}
+    metrics.gauge("predictor_oldest_prediction_age_seconds", "En uzun süredir güncellenmeyen otobüs tahmininin yaşı (saniye)").set_function(
+        lambda: time.monotonic() - min(list(last_predicted_at.values())) if last_predicted_at else 0.0)
+    metrics.gauge("predictor_buses_tracked", "Penceresi tutulan otobüs sayısı").set_function(tracked_bus_count)
+    metrics.gauge("predictor_prediction_queue_size", "Gönderim kuyruğunda bekleyen tahmin sayısı").set_function(
+        lambda: pipeline.queue_sizes()[1] if pipeline is not None else prediction_sink.queue.qsize())
+    if args.metrics_port:
+        start_metrics_server(metrics, args.metrics_port, METRICS_HOST, profile_hook, profile_wait_seconds=2 * args.tick_seconds + 5)
+        print(f"Ölçümler http://{METRICS_HOST}:{args.metrics_port}/metrics adresinde (profil: /profile/start, /profile/stop).")
+
+    def process_records(new_records):
+        # Yeni kayıtları pencerelere ekler, skorlar ve gönderilmesi gereken (son gönderilenden farklı) tahmin
+        # kayıtlarını döndürür. Senkron döngü ve pipeline modunun CPU aşaması aynı fonksiyonu kullanır.
+        if sharded_predictor is None:
+            # Model dosyası yenilendiyse gruplar arasında yerine koy (otobüs pencereleri korunur)
+            model_registry.maybe_reload()
+            # Yeni verileri otobüslerin pencerelerine ekle ve hazır olanları skorla
+            updated_buses = merge_new_data(new_records, bus_windows)
+            prediction_records = score_buses(bus_windows, updated_buses, model_registry.get(), prediction_cache, tiered=not args.no_tiered)
+        else:
+            sharded_predictor.replace_dead_workers() # Çöken işçinin otobüsleri halkada yeniden dağıtılır
+            # Kayıtlar sahibi olan işçilere dağıtılır; işçiler kendi pencerelerini günceller ve skorlar
+            with metrics.timer("shard_dispatch"):
+                prediction_records = sharded_predictor.dispatch(new_records)
+
+        observe_predictions(prediction_records, last_predicted_at)
+        records_to_post = []
+        for prediction_record in prediction_records:
+            if prediction_cache.should_post(prediction_record):
+                records_to_post.append(prediction_record)
+            else:
+                predictions_suppressed_total.inc()
+        return records_to_post
+
+    if args.pipeline:
+        pipeline = PipelinedPredictor(process_records, prediction_sink, cursor=cursor, since=bootstrap_since,
+                                      wire_format=args.wire_format, tick_seconds=args.tick_seconds,
+                                      deadline_seconds=args.tick_deadline or args.tick_seconds,
+                                      max_inflight_posts=args.max_inflight_posts,
+                                      checkpoint=write_checkpoint if checkpoint_enabled else None,
+                                      checkpoint_interval=args.checkpoint_interval)
+        metrics.gauge("predictor_pipeline_fetch_queue_size", "Skorlanmayı bekleyen çekilmiş grup sayısı").set_function(
+            lambda: pipeline.queue_sizes()[0])
+        print(f"Pipeline modu: en fazla {args.max_inflight_posts} eşzamanlı gönderim, hedef süre {pipeline.deadline_seconds:.1f} sn.")
+        try:
+            asyncio.run(pipeline.run())
+        except KeyboardInterrupt:
+            pass
+        raise SystemExit(0)
+
     while True:
+        tick_started = time.monotonic()
+        profile_hook.apply() # /profile/start ve /profile/stop talepleri döngü iş parçacığında uygulanır
         try:
-            # Next.js API'sinden en güncel verileri çek
-            # Bu çağrı, API'den her otobüs için en son N adet veriyi çekmelidir (varsayılan 500)
-            response = requests.get(NEXTJS_GET_DATA_URL)
-            response.raise_for_status()
-            all_latest_data = response.json()
+            # Next.js API'sinden yalnızca son döngüden sonra eklenen verileri çek
+            new_records, cursor = fetch_new_data(cursor, since=bootstrap_since, wire_format=args.wire_format)
+            rows_ingested_total.inc(len(new_records))
+            tick_rows_ingested.set(len(new_records))
 
-            if not all_latest_data:
+            if not new_records and not tracked_bus_count():
                 print("Veritabanında henüz veri yok, bekleniyor...")
-                time.sleep(10)
-                continue
 
-            # Verileri otobüs ID'sine göre gruplayalım
-            bus_data_groups = {}
-            for data_point in all_latest_data:
-                bus_id = data_point.get("bus_id")
-                if bus_id not in bus_data_groups:
-                    bus_data_groups[bus_id] = []
-                # Zaman damgasını datetime objesine çevirerek ekle, bu sorting için önemli
-                data_point['timestamp_dt'] = datetime.fromisoformat(data_point['timestamp'].replace('Z', '+00:00'))
-                bus_data_groups[bus_id].append(data_point)
-            
-            # Her otobüs için analiz yap
-            for bus_id, data_points in bus_data_groups.items():
-                # Verileri zaman damgasına göre sırala (en eskiden en yeniye)
-                sorted_data_points = sorted(data_points, key=lambda x: x['timestamp_dt'])
-                
-                # DataFrame'e dönüştür
-                df_bus = pd.DataFrame(sorted_data_points)
-
-                features = create_features(df_bus)
-                if features is not None:
-                    prediction_result = make_prediction(features)
-                    
-                    prediction_record = {
-                        "bus_id": bus_id,
-                        "timestamp_data_end": sorted_data_points[-1]['timestamp'], # Analiz edilen son verinin zamanı
-                        "predicted_at": datetime.now().isoformat(),
-                        "fault_type": prediction_result["fault_type"],
-                        "fault_reason": prediction_result["fault_reason"],
-                        "prob_5min": prediction_result["prob_5min"],
-                        "prob_30min": prediction_result["prob_30min"],
-                        "is_fault_imminent_5min": prediction_result["is_fault_imminent_5min"],
-                        "is_fault_imminent_30min": prediction_result["is_fault_imminent_30min"]
-                    }
-                    post_prediction(prediction_record)
-                else:
-                    print(f"Otobüs {bus_id} için yeterli veri yok veya özellik çıkarılamadı, analiz atlandı.")
+            for prediction_record in process_records(new_records):
+                prediction_sink.submit(prediction_record)
 
+            ticks_total.inc()
         except requests.exceptions.RequestException as e:
+            tick_errors_total.inc()
             print(f"Next.js API'sinden veri çekilirken hata oluştu: {e}")
         except Exception as e:
+            tick_errors_total.inc()
             print(f"Genel bir hata oluştu: {e}")
-            
-        time.sleep(10) # Her 10 saniyede bir analiz yap
\ No newline at end of file
+        if checkpoint_enabled and time.monotonic() - last_checkpoint_at >= args.checkpoint_interval:
+            write_checkpoint()
+            last_checkpoint_at = time.monotonic()
+        metrics.histogram("predictor_tick_seconds", "Bir döngünün toplam süresi (saniye)").observe(time.monotonic() - tick_started)
+
+        # Bir sonraki döngüye kadar bekle (döngü süresi periyottan uzunsa hemen devam et)
+        time.sleep(max(0.0, args.tick_seconds - (time.monotonic() - tick_started)))
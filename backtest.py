@@ -0,0 +1,344 @@
+# backtest.py
+# Kayıtlı filo geçmişi üzerinde çevrimdışı toplu skorlama (backtest). Veri seti dizini (veya API'den geçici bir
+# dizine sayfa sayfa indirilen geçmiş) otobüs otobüs okunur; her otobüsün her zaman damgası için özellikler
+# train_model._engineer_fleet_features ile vektörel hesaplanır ve modeller bellek bütçesine sığan büyük parçalar
+# halinde skorlanır. Çıktılar: otobüs başına tahmin zaman çizelgesi (npy parçaları), gerçek arıza
+# başlangıçlarına (current_fault_type) göre tespit önceliği tablosu ve özet (summary.json).
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import requests
+
+import ai_predictor
+import train_model
+
+BACKTEST_OUTPUT_DIR = "backtest_results"
+MEMORY_BUDGET_MB = 2048 # Model yüklendikten sonra sürecin en yüksek belleği (RSS) bu sınırın altında kalmalı
+# Bir parçanın girdi satırı başına en yüksek çalışma belleği: ham sütunlar, sıralama, kayan istatistikler,
+# float64 özellik tablosu ve skorlama matrisi (tracemalloc ile ~510 bayt ölçüldü; girdi parçaları için 2 kat pay)
+BYTES_PER_ROW = 1000
+MIN_CHUNK_ROWS = 50_000
+SCORE_BATCH_ROWS = 200_000 # predict_proba her iş parçacığında (satır x sınıf) dizi ayırır; tek çağrıdaki satır sınırı
+MAX_LEAD = pd.Timedelta(minutes=30) # Modelin en uzun ufku: arızadan en fazla bu kadar önceki alarm tespit sayılır
+
+TIMELINE_COLUMNS = ["timestamp", "bus_index", "prob_5min", "prob_30min", "predicted_fault_type", "actual_fault_type"]
+ONSET_COLUMNS = ["bus_id", "fault_type", "onset", "fault_end", "detected_at", "lead_seconds", "predicted_fault_type"]
+
+
+def iter_score_chunks(bus_frames, chunk_rows):
+    # Otobüs parçalarını yaklaşık chunk_rows satırlık gruplara toplar; otobüsler hiçbir zaman gruplar arasında
+    # karışmaz. chunk_rows'tan uzun bir otobüs WINDOW_SIZE - 1 satır örtüşen dilimlere bölünür: örtüşen satırların
+    # dilimde penceresi dolmadığından geçersizdirler, böylece her satır tam bir kez skorlanır.
+    overlap = train_model.WINDOW_SIZE - 1
+    pending = []
+    pending_rows = 0
+    for bus_id, bus_df in bus_frames:
+        if not bus_df['timestamp'].is_monotonic_increasing:
+            bus_df = bus_df.sort_values('timestamp', kind='stable', ignore_index=True)
+        if pending and pending_rows + len(bus_df) > chunk_rows:
+            yield pending
+            pending, pending_rows = [], 0
+        if len(bus_df) <= chunk_rows:
+            pending.append(bus_df)
+            pending_rows += len(bus_df)
+            continue
+        for start in range(0, len(bus_df), chunk_rows):
+            yield [bus_df.iloc[max(0, start - overlap):start + chunk_rows]]
+    if pending:
+        yield pending
+
+
+def chunk_features(frames, bundle):
+    # Bir grubun penceresi dolu tüm satırlarının özellik matrisi. Satırlar (otobüs, zaman) sırasıyla döner:
+    # (bus_id dizisi, zaman damgaları (ms), float32 özellik matrisi, gerçek arıza tipi kodları)
+    df = pd.concat(frames, ignore_index=True)
+    features_df, bus_ids, timestamps = train_model._engineer_fleet_features(df, return_groups=True, labeled_only=False)
+    del df
+    X = features_df[bundle.features_cols].to_numpy(dtype=np.float32) # Ağaçlar float32 karşılaştırır
+    actual = features_df['target_fault_type_id'].to_numpy(dtype=np.int8)
+    return np.asarray(bus_ids, dtype=object), timestamps, X, actual
+
+
+def score_features(X, bundle):
+    # Matrisi SCORE_BATCH_ROWS'luk çağrılarla skorlar: (5 dk olasılığı, 30 dk olasılığı, tahmin edilen tip kodu)
+    prob_5min = np.empty(len(X), dtype=np.float32)
+    prob_30min = np.empty(len(X), dtype=np.float32)
+    predicted = np.full(len(X), -1, dtype=np.int8)
+    for start in range(0, len(X), SCORE_BATCH_ROWS):
+        batch = slice(start, start + SCORE_BATCH_ROWS)
+        batch_5min, batch_30min, batch_type = ai_predictor.predict_arrays(X[batch], bundle)
+        prob_5min[batch] = batch_5min
+        prob_30min[batch] = batch_30min
+        if batch_type is not None:
+            predicted[batch] = batch_type
+    return prob_5min, prob_30min, predicted
+
+
+def analyze_bus(bus_id, timestamps, prob_5min, prob_30min, predicted, actual, fault_types, max_lead=MAX_LEAD):
+    # Bir otobüsün tüm zaman çizelgesinden arıza başlangıçlarını (normal -> arıza geçişi) bulur ve her biri için
+    # ilk alarmı arar. Arama, önceki arızanın bitişinden ve başlangıçtan max_lead öncesinden sonra başlar,
+    # arızanın bitişinde biter. lead_seconds > 0: arıza başlamadan önce uyarı; < 0: arıza sırasında geç tespit.
+    # Yanlış alarm: arıza yokken ve sonraki max_lead içinde de arıza başlamıyorken verilen alarm.
+    # (başlangıç kayıtları listesi, sayaçlar) döner.
+    max_lead_ms = int(max_lead / pd.Timedelta(milliseconds=1))
+    alarm = (prob_5min > ai_predictor.FAULT_THRESHOLD) | (prob_30min > ai_predictor.FAULT_THRESHOLD)
+    faulted = actual > 0
+    fault_rows = np.flatnonzero(faulted)
+    onset_rows = np.flatnonzero(faulted[1:] & ~faulted[:-1]) + 1 # İlk satırda süren arızanın başlangıcı görülmedi
+
+    def type_name(code):
+        return fault_types[code] if 0 <= code < len(fault_types) else None
+
+    onsets = []
+    for onset in onset_rows.tolist():
+        cleared = np.flatnonzero(~faulted[onset:])
+        end = onset + int(cleared[0]) if cleared.size else len(faulted)
+        previous_fault = int(fault_rows[np.searchsorted(fault_rows, onset) - 1]) if fault_rows[0] < onset else -1
+        search_start = max(previous_fault + 1, int(np.searchsorted(timestamps, timestamps[onset] - max_lead_ms)))
+        alarm_rows = np.flatnonzero(alarm[search_start:end])
+        detected = search_start + int(alarm_rows[0]) if alarm_rows.size else None
+        type_votes = np.bincount(predicted[onset:end][predicted[onset:end] > 0], minlength=1)
+        onsets.append({
+            "bus_id": bus_id,
+            "fault_type": type_name(int(actual[onset])),
+            "onset": int(timestamps[onset]),
+            "fault_end": int(timestamps[end]) if end < len(timestamps) else None,
+            "detected_at": int(timestamps[detected]) if detected is not None else None,
+            "lead_seconds": (int(timestamps[onset]) - int(timestamps[detected])) / 1000 if detected is not None else None,
+            "predicted_fault_type": type_name(int(np.argmax(type_votes))) if type_votes.any() else None,
+        })
+
+    # Her satır için bir sonraki arızalı satırın zamanı (yoksa sonsuz uzak)
+    next_fault = np.searchsorted(fault_rows, np.arange(len(faulted)))
+    next_fault_time = np.append(timestamps[fault_rows], np.iinfo(np.int64).max)[next_fault]
+    false_alarm = alarm & ~faulted & (next_fault_time - timestamps > max_lead_ms)
+    counts = {
+        "rows": len(timestamps),
+        "normal_rows": int((actual == 0).sum()),
+        "fault_rows": int(faulted.sum()),
+        "alarm_rows": int(alarm.sum()),
+        "false_alarm_rows": int(false_alarm.sum()),
+        "type_correct_rows": int((faulted & (predicted == actual)).sum()),
+    }
+    return onsets, counts
+
+
+class TimelineWriter:
+    # Skorlanan grupları out_dir/timeline altına veri seti parçalarıyla aynı düzende (.npy sütunları) yazar;
+    # metadata.json otobüs ve arıza tipi sözlüklerini tutar. load_timeline ile DataFrame olarak okunur.
+
+    def __init__(self, out_dir, fault_types):
+        self.timeline_dir = os.path.join(out_dir, "timeline")
+        if os.path.isdir(self.timeline_dir):
+            shutil.rmtree(self.timeline_dir) # Önceki çalıştırmanın parçaları yeni metadata ile karışmasın
+        os.makedirs(self.timeline_dir)
+        self.fault_types = list(fault_types)
+        self.bus_codes = {}
+        self.shards = []
+
+    def write(self, bus_ids, timestamps, prob_5min, prob_30min, predicted, actual):
+        unique_ids, inverse = np.unique(bus_ids, return_inverse=True)
+        codes = np.array([self.bus_codes.setdefault(bus_id, len(self.bus_codes)) for bus_id in unique_ids], dtype=np.int32)
+        columns = dict(zip(TIMELINE_COLUMNS, [timestamps, codes[inverse], prob_5min, prob_30min, predicted, actual]))
+        shard_dir = os.path.join(self.timeline_dir, f"shard_{len(self.shards):05d}")
+        os.makedirs(shard_dir, exist_ok=True)
+        for name, values in columns.items():
+            np.save(os.path.join(shard_dir, f"{name}.npy"), values)
+        self.shards.append(os.path.basename(shard_dir))
+
+    def close(self):
+        metadata = {
+            "bus_ids": list(self.bus_codes),
+            "fault_types": self.fault_types,
+            "columns": TIMELINE_COLUMNS,
+            "shards": self.shards,
+        }
+        with open(os.path.join(self.timeline_dir, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+
+
+def load_timeline(out_dir, bus_id=None):
+    # backtest çıktısındaki zaman çizelgesini okur; bus_id verilirse yalnızca o otobüsün satırları döner
+    timeline_dir = os.path.join(out_dir, "timeline")
+    with open(os.path.join(timeline_dir, "metadata.json")) as f:
+        metadata = json.load(f)
+    fault_types = metadata["fault_types"]
+    frames = []
+    for shard in metadata["shards"]:
+        columns = {name: np.load(os.path.join(timeline_dir, shard, f"{name}.npy"), mmap_mode='r') for name in TIMELINE_COLUMNS}
+        rows = slice(None) if bus_id is None else columns["bus_index"] == metadata["bus_ids"].index(bus_id)
+        frames.append(pd.DataFrame({
+            "timestamp": pd.to_datetime(np.asarray(columns["timestamp"][rows]), unit="ms", utc=True),
+            "bus_id": pd.Categorical.from_codes(columns["bus_index"][rows], categories=metadata["bus_ids"]),
+            "prob_5min": columns["prob_5min"][rows],
+            "prob_30min": columns["prob_30min"][rows],
+            # Kod -1 (model yok veya bilinmeyen tip) NaN olur
+            "predicted_fault_type": pd.Categorical.from_codes(columns["predicted_fault_type"][rows], categories=fault_types),
+            "actual_fault_type": pd.Categorical.from_codes(columns["actual_fault_type"][rows], categories=fault_types),
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=TIMELINE_COLUMNS)
+
+
+def summarize(onsets, counts, rows_read, timings, elapsed, chunk_rows, memory_budget_mb, bundle):
+    peak_rss_mb = train_model._peak_rss_mb()
+    lead_seconds = np.array([onset["lead_seconds"] for onset in onsets if onset["lead_seconds"] is not None])
+    rows_scored = counts["rows"]
+    return {
+        "model_version": bundle.version,
+        "rows_read": rows_read,
+        "rows_scored": rows_scored,
+        "buses": counts["buses"],
+        "fault_onsets": len(onsets),
+        "detected_onsets": len(lead_seconds),
+        "detection_rate": len(lead_seconds) / len(onsets) if onsets else None,
+        "early_detection_rate": float((lead_seconds > 0).sum()) / len(onsets) if onsets else None,
+        "lead_seconds": {
+            "median": float(np.median(lead_seconds)),
+            "p10": float(np.percentile(lead_seconds, 10)),
+            "p90": float(np.percentile(lead_seconds, 90)),
+        } if len(lead_seconds) else None,
+        "false_alarm_rate": counts["false_alarm_rows"] / counts["normal_rows"] if counts["normal_rows"] else None,
+        "fault_type_accuracy": counts["type_correct_rows"] / counts["fault_rows"] if counts["fault_rows"] else None,
+        "seconds": {"total": elapsed, **timings},
+        "rows_scored_per_second": rows_scored / elapsed if elapsed > 0 else None,
+        "chunk_rows": chunk_rows,
+        "memory_budget_mb": memory_budget_mb,
+        "peak_rss_mb": peak_rss_mb,
+        "budget_exceeded": peak_rss_mb is not None and peak_rss_mb > memory_budget_mb,
+    }
+
+
+def run_backtest(data_dir, model_path=ai_predictor.MODEL_PATH, out_dir=BACKTEST_OUTPUT_DIR,
+                 memory_budget_mb=MEMORY_BUDGET_MB, n_jobs=-1, max_lead=MAX_LEAD):
+    bundle = ai_predictor.load_model_bundle(model_path)
+    for model in [bundle.model_5min, bundle.model_30min, bundle.model_fault_type, bundle.model_multi]:
+        model = getattr(model, 'fallback', model) # Büyük gruplar FlatForest yerine sklearn modeliyle skorlanır
+        if model is not None:
+            model.set_params(n_jobs=n_jobs)
+
+    # Model ve kütüphaneler yüklendikten sonraki bellek taban kabul edilir; kalan bütçe parça boyutunu belirler
+    baseline_mb = train_model._peak_rss_mb() or 0.0
+    available_bytes = (memory_budget_mb - baseline_mb) * 1024 * 1024
+    chunk_rows = max(MIN_CHUNK_ROWS, int(available_bytes // BYTES_PER_ROW))
+    if available_bytes < MIN_CHUNK_ROWS * BYTES_PER_ROW:
+        print(f"Uyarı: {memory_budget_mb} MB bütçe model yüklendikten sonra ({baseline_mb:.0f} MB) çok küçük; "
+              f"en küçük parça boyutu ({MIN_CHUNK_ROWS} satır) kullanılıyor.")
+    print(f"Model sürümü {bundle.version}; parça boyutu {chunk_rows} satır (bütçe {memory_budget_mb} MB).")
+
+    os.makedirs(out_dir, exist_ok=True)
+    writer = TimelineWriter(out_dir, bundle.fault_type_map_text)
+    onsets = []
+    counts = {"buses": 0, "rows": 0, "normal_rows": 0, "fault_rows": 0, "alarm_rows": 0, "false_alarm_rows": 0, "type_correct_rows": 0}
+    timings = {"features": 0.0, "scoring": 0.0, "analysis": 0.0, "write": 0.0}
+    open_bus = None # Son grubun son otobüsü bir sonraki grupta (dilim olarak) devam edebilir; parçaları burada birikir
+    rows_read = rows_scored = 0
+
+    def finish_bus(bus_id, pieces):
+        columns = [np.concatenate(values) for values in zip(*pieces)]
+        bus_onsets, bus_counts = analyze_bus(bus_id, *columns, bundle.fault_type_map_text, max_lead)
+        onsets.extend(bus_onsets)
+        counts["buses"] += 1
+        for key, value in bus_counts.items():
+            counts[key] += value
+
+    started = time.perf_counter()
+    for frames in iter_score_chunks(train_model.iter_bus_frames(data_dir), chunk_rows):
+        rows_read += sum(len(frame) for frame in frames)
+        stage_started = time.perf_counter()
+        bus_ids, timestamps, X, actual = chunk_features(frames, bundle)
+        del frames
+        timings["features"] += time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        prob_5min, prob_30min, predicted = score_features(X, bundle)
+        del X
+        columns = [timestamps, prob_5min, prob_30min, predicted, actual]
+        timings["scoring"] += time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        writer.write(bus_ids, *columns)
+        timings["write"] += time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        bus_starts = np.flatnonzero(np.r_[True, bus_ids[1:] != bus_ids[:-1]]) if len(bus_ids) else np.array([], dtype=int)
+        for start, end in zip(bus_starts, np.r_[bus_starts[1:], len(bus_ids)]):
+            bus_id = bus_ids[start]
+            piece = [values[start:end] for values in columns]
+            if open_bus is not None and open_bus[0] == bus_id:
+                open_bus[1].append(piece)
+                continue
+            if open_bus is not None:
+                finish_bus(*open_bus)
+            open_bus = (bus_id, [piece])
+        timings["analysis"] += time.perf_counter() - stage_started
+        rows_scored += len(bus_ids)
+        print(f"{rows_read} satır okundu, {rows_scored} satır skorlandı ({time.perf_counter() - started:.1f} sn).")
+    if open_bus is not None:
+        finish_bus(*open_bus)
+    writer.close()
+    elapsed = time.perf_counter() - started
+    timings["read"] = elapsed - sum(timings.values())
+
+    onsets_df = pd.DataFrame(onsets, columns=ONSET_COLUMNS)
+    for column in ["onset", "fault_end", "detected_at"]:
+        onsets_df[column] = pd.to_datetime(onsets_df[column], unit="ms", utc=True) # Boş değerler NaT olur
+    onsets_df.to_csv(os.path.join(out_dir, "onsets.csv"), index=False)
+    summary = summarize(onsets, counts, rows_read, timings, elapsed, chunk_rows, memory_budget_mb, bundle)
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n--- Backtest Özeti ({summary['buses']} otobüs) ---")
+    print(f"Skorlanan satır: {summary['rows_scored']} / {summary['rows_read']} "
+          f"({summary['rows_scored_per_second'] or 0:.0f} satır/sn, toplam {elapsed:.1f} sn)")
+    print("Aşama süreleri: " + ", ".join(f"{stage} {seconds:.1f} sn" for stage, seconds in timings.items()))
+    if onsets:
+        print(f"Arıza başlangıcı: {summary['fault_onsets']}, tespit edilen: {summary['detected_onsets']} "
+              f"(%{100 * summary['detection_rate']:.1f}), arızadan önce: %{100 * summary['early_detection_rate']:.1f}")
+    if summary["lead_seconds"]:
+        lead = summary["lead_seconds"]
+        print(f"Tespit önceliği (sn): medyan {lead['median']:.0f}, p10 {lead['p10']:.0f}, p90 {lead['p90']:.0f}")
+    if summary["false_alarm_rate"] is not None:
+        print(f"Yanlış alarm oranı (normal satırlarda): %{100 * summary['false_alarm_rate']:.2f}")
+    if summary["fault_type_accuracy"] is not None:
+        print(f"Arızalı satırlarda tip doğruluğu: %{100 * summary['fault_type_accuracy']:.1f}")
+    if summary["peak_rss_mb"] is not None:
+        print(f"En yüksek bellek (RSS): {summary['peak_rss_mb']:.0f} MB (bütçe {memory_budget_mb} MB)")
+    if summary["budget_exceeded"]:
+        print(f"Uyarı: bellek bütçesi {summary['peak_rss_mb'] - memory_budget_mb:.0f} MB aşıldı; --memory-mb değerini artırın.")
+    print(f"Sonuçlar '{out_dir}' dizinine yazıldı (timeline/, onsets.csv, summary.json).")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kayıtlı filo geçmişi üzerinde modelleri toplu skorla (backtest)")
+    parser.add_argument("--data-dir", help="Veri seti dizini (can_simulator.py --synthesize veya train_model.py --download çıktısı); verilmezse API'den indirilir")
+    parser.add_argument("--since", help="API'den yalnızca bu ISO zaman damgasından sonraki verileri çek")
+    parser.add_argument("--model", default=ai_predictor.MODEL_PATH, help="Skorlanacak model dosyası")
+    parser.add_argument("--out-dir", default=BACKTEST_OUTPUT_DIR, help="Zaman çizelgesi, arıza başlangıçları ve özetin yazılacağı dizin")
+    parser.add_argument("--memory-mb", type=int, default=MEMORY_BUDGET_MB, help="Sürecin en yüksek bellek bütçesi (MB); parça boyutunu belirler")
+    parser.add_argument("--jobs", type=int, default=-1, help="Skorlamada kullanılacak iş parçacığı sayısı (-1: tümü)")
+    parser.add_argument("--max-lead-minutes", type=float, default=MAX_LEAD / pd.Timedelta(minutes=1),
+                        help="Arıza başlangıcından en fazla bu kadar önceki alarm tespit sayılır")
+    args = parser.parse_args()
+    options = dict(model_path=args.model, out_dir=args.out_dir, memory_budget_mb=args.memory_mb, n_jobs=args.jobs,
+                   max_lead=pd.Timedelta(minutes=args.max_lead_minutes))
+    summary = None
+    if args.data_dir:
+        summary = run_backtest(args.data_dir, **options)
+    else:
+        # API geçmişi önce geçici bir dizine sütunlu parçalar halinde sayfa sayfa indirilir
+        with tempfile.TemporaryDirectory(prefix="can_data_") as download_dir:
+            try:
+                train_model.download_dataset(download_dir, since=args.since)
+            except requests.exceptions.RequestException as e:
+                print(f"Veri çekilirken hata oluştu: {e}")
+            else:
+                summary = run_backtest(download_dir, **options)
+    # Bütçe aşımı sıfırdan farklı çıkış koduyla bildirilir (ör. CI'da veya zamanlanmış görevlerde yakalanması için)
+    if summary is not None and summary["budget_exceeded"]:
+        raise SystemExit(1)
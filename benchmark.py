@@ -0,0 +1,466 @@
+# benchmark.py
+# Telemetri -> özellik -> tahmin sıcak yollarının çevrimdışı performans ölçümü.
+# Tüm veri sentetik üretilir (HTTP/MongoDB gerekmez). Her aşama farklı filo boyutları ve geçmiş uzunluklarında
+# çalıştırılır; sonuçlar JSON olarak yazılır ve kayıtlı bir temel (baseline) ile karşılaştırılarak gerilemeler bulunur.
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import sklearn
+
+import can_frames
+import can_simulator
+import ai_predictor
+import train_model
+
+RESULTS_PATH = "benchmark_results.json"
+BASELINE_PATH = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 0.25 # Temel değerden %25'ten fazla kötüleşme gerileme sayılır
+
+FLEET_SIZES = [10, 100, 1000, 10000]
+HISTORY_LENGTHS = [60, 1000, 10000, 100000]
+MAX_PREPROCESS_ROWS = 2_000_000 # filo x geçmiş bu sınırı aşan ön işleme durumları atlanır
+MAX_FIT_ROWS = 100_000 # Model eğitimi durumları için satır sınırı
+FIT_FLEET_SIZES = [10, 100]
+
+# --quick: geliştirme sırasında birkaç dakikada biten küçük ızgara
+QUICK_FLEET_SIZES = [10, 100, 1000]
+QUICK_HISTORY_LENGTHS = [60, 1000, 10000]
+QUICK_MAX_PREPROCESS_ROWS = 200_000
+QUICK_MAX_FIT_ROWS = 20_000
+
+MIN_REPEATS = 3
+MAX_REPEATS = 20
+CASE_TIME_BUDGET_SECONDS = 2.0 # Bir durum bu süreyi aşınca (en az MIN_REPEATS tekrar sonrası) durulur
+
+STAGES = ["generate_realistic_data", "generate_fleet_data", "json_decode", "frame_decode", "create_features", "bus_feature_window",
+          "make_prediction", "make_predictions_batch", "preprocess_and_label_data", "model_fit"]
+
+
+# --- Sentetik Veri ---
+def make_history_frame(fleet_size, history, rng, step_seconds=5):
+    # fleet_size otobüs x history örnek boyutunda, API verisiyle aynı sütunlara sahip bir DataFrame.
+    # Arızalar otobüs başına 360 örneklik bloklarda ~%25 olasılıkla rastgele tipte enjekte edilir.
+    n_rows = fleet_size * history
+    bus_index = np.repeat(np.arange(fleet_size), history)
+    tick = np.tile(np.arange(history), fleet_size)
+
+    block = train_model.HORIZON_30MIN
+    block_count = -(-history // block)
+    block_faults = np.where(rng.random((fleet_size, block_count)) < 0.25,
+                            rng.integers(1, len(can_simulator.ALL_FAULT_TYPES), size=(fleet_size, block_count)), 0)
+    fault_codes = block_faults[bus_index, tick // block]
+    mode_codes = rng.integers(len(can_simulator.DRIVING_MODES), size=n_rows)
+    battery_soh = 100.0 - tick * (5.0 / max(history, 1)) # Geçmiş boyunca en fazla 5 puan SOH kaybı
+
+    fleet_data = can_simulator.generate_fleet_data(mode_codes, battery_soh, fault_codes, rng)
+    start = pd.Timestamp("2024-01-01", tz="UTC")
+    return pd.DataFrame({
+        "timestamp": start + pd.to_timedelta(tick * step_seconds, unit="s"),
+        "bus_id": pd.Categorical.from_codes(bus_index, categories=[f"BUS-{i:05d}" for i in range(fleet_size)]),
+        "cell_voltage": fleet_data["cell_voltage"],
+        "cell_min_temp": fleet_data["cell_min_temp"],
+        "cell_max_temp": fleet_data["cell_max_temp"],
+        "energy_efficiency": fleet_data["energy_efficiency"],
+        "current_driving_mode": pd.Categorical.from_codes(mode_codes, categories=can_simulator.DRIVING_MODES),
+        "battery_soh": fleet_data["battery_soh"],
+        "current_fault_type": pd.Categorical.from_codes(fault_codes, categories=can_simulator.ALL_FAULT_TYPES),
+    })
+
+
+def build_benchmark_model(model_dir, rng):
+    # Tahmin aşamaları için sentetik veriyle üretim ayarlarında (100 ağaç) küçük bir model eğitir ve
+    # train_model.py ile aynı biçimde kaydeder; ai_predictor bu dosyayı kendi ModelRegistry'si ile yükler.
+    X, y_5min, y_30min, y_fault_type, features_cols = train_model.preprocess_and_label_data(make_history_frame(20, 2000, rng))
+    X = np.ascontiguousarray(X.to_numpy(), dtype=np.float32)
+    artifact = {
+        'artifact_version': train_model.ARTIFACT_SCHEMA_VERSION,
+        'model_version': "benchmark",
+        'multi_output_targets': train_model.MULTI_OUTPUT_TARGETS,
+        'features_cols': features_cols,
+        'fault_type_map_text': train_model.FAULT_TYPES,
+        'compiled_models': {},
+    }
+    for key, y in (('model_5min', y_5min), ('model_30min', y_30min), ('model_fault_type', y_fault_type)):
+        artifact[key] = train_model._fit_forest(X, y.to_numpy(), X[:1], n_jobs=-1)["model"]
+        artifact['compiled_models'][key] = train_model.compile_forest(artifact[key])
+
+    path = os.path.join(model_dir, train_model.MODEL_SAVE_PATH)
+    train_model.save_model_artifact(artifact, path)
+    return ai_predictor.ModelRegistry(path)
+
+
+# --- Ölçüm ---
+def _load_libc():
+    # glibc'nin malloc_trim'i; başka platformlarda None (RSS ölçümü yine yapılır, yalnızca daha gürültülü olur)
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        return libc if hasattr(libc, "malloc_trim") else None
+    except (OSError, TypeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def release_free_memory():
+    # Önceki durumlardan ayırıcıda kalan boş belleği işletim sistemine geri verir; aksi halde ölçülen çağrı bu
+    # sayfaları yeniden kullanır ve RSS artışı gerçek ayırmadan küçük görünür
+    if _libc is not None:
+        _libc.malloc_trim(0)
+
+
+def measure(run_once, items_per_call, min_repeats=MIN_REPEATS, max_repeats=MAX_REPEATS,
+            time_budget=CASE_TIME_BUDGET_SECONDS, track_memory=True):
+    # run_once'ı tekrar tekrar çağırır; her çağrı items_per_call birim iş yapar (ör. filo boyutu kadar tahmin).
+    # Bellek iki şekilde ölçülür: süreç RSS'inin çağrı sırasındaki en yüksek artışı (sklearn'ün Cython ağaç
+    # kurucuları ve pyarrow tamponları gibi yerel ayırmalar dahil) ve tracemalloc'un gördüğü yalnızca Python
+    # ayırmalarının zirvesi. Serbest bırakılan bellek ayırıcıda kaldığından tekrar çağrılar RSS'i artırmaz; RSS
+    # bu yüzden boş bellek geri verildikten sonra ilk (zamanlamaya dahil edilmeyen) çağrıda örneklenir.
+    # tracemalloc ayrı bir son çağrıda açılır.
+    peak_rss_delta_mb = peak_python_memory_mb = None
+    if track_memory:
+        release_free_memory()
+        with train_model._FitMemorySampler() as sampler:
+            run_once()
+        rss = sampler.result()
+        if rss["rss_scope"] == "fit": # /proc olmayan platformlarda yalnızca süreç ömrü zirvesi var; kaydedilmez
+            peak_rss_delta_mb = rss["rss_delta_mb"]
+
+    latencies = []
+    started = time.perf_counter()
+    while len(latencies) < max_repeats:
+        call_started = time.perf_counter()
+        run_once()
+        latencies.append(time.perf_counter() - call_started)
+        if len(latencies) >= min_repeats and time.perf_counter() - started > time_budget:
+            break
+
+    if track_memory:
+        tracemalloc.start()
+        try:
+            run_once()
+            peak_python_memory_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000.0
+    return {
+        "repeats": len(latencies),
+        "items_per_call": items_per_call,
+        "throughput_per_s": items_per_call / float(np.median(latencies)),
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+        },
+        "peak_rss_delta_mb": peak_rss_delta_mb,
+        "peak_python_memory_mb": peak_python_memory_mb,
+    }
+
+
+# --- Aşamalar ---
+# Her aşama (filo boyutu, geçmiş uzunluğu, hazırlık fonksiyonu) üçlüleri üretir; hazırlık fonksiyonu
+# (run_once, items_per_call) döndürür. Veri hazırlığı ölçülen süreye dahil değildir.
+def cases_generate_realistic_data(config, rng):
+    # Eski simülatör döngüsü: her otobüs için bir generate_realistic_data çağrısı (bir zaman adımı)
+    def setup(fleet_size):
+        now = datetime.now(timezone.utc)
+        modes = [can_simulator.DRIVING_MODES[i % len(can_simulator.DRIVING_MODES)] for i in range(fleet_size)]
+        faults = [can_simulator.ALL_FAULT_TYPES[i % len(can_simulator.ALL_FAULT_TYPES)] for i in range(fleet_size)]
+        bus_ids = [f"BUS-{i:05d}" for i in range(fleet_size)]
+
+        def run_once():
+            for bus_id, mode, fault in zip(bus_ids, modes, faults):
+                can_simulator.generate_realistic_data(bus_id, now, mode, 95.0, fault)
+        return run_once, fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, 1, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def cases_generate_fleet_data(config, rng):
+    # Vektörel karşılığı: tüm filo için tek generate_fleet_data çağrısı
+    def setup(fleet_size):
+        mode_codes = np.arange(fleet_size) % len(can_simulator.DRIVING_MODES)
+        fault_codes = np.arange(fleet_size) % len(can_simulator.ALL_FAULT_TYPES)
+        battery_soh = np.full(fleet_size, 95.0)
+        return (lambda: can_simulator.generate_fleet_data(mode_codes, battery_soh, fault_codes, rng)), fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, 1, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def _api_page_records(fleet_size, rng):
+    # can-data API sayfasındaki biçimde bir zaman adımlık filo kaydı (timestamp MongoDB'nin ISO metni)
+    mode_codes = np.arange(fleet_size) % len(can_simulator.DRIVING_MODES)
+    fault_codes = np.arange(fleet_size) % len(can_simulator.ALL_FAULT_TYPES)
+    fleet_data = can_simulator.generate_fleet_data(mode_codes, np.full(fleet_size, 95.0), fault_codes, rng)
+    records = can_simulator.fleet_data_to_records(fleet_data, [f"BUS-{i:05d}" for i in range(fleet_size)],
+                                                  datetime(2024, 1, 1, tzinfo=timezone.utc))
+    for record in records:
+        record["timestamp"] = can_frames.format_timestamp(datetime.fromisoformat(record["timestamp"]))
+    return records
+
+
+def cases_json_decode(config, rng):
+    # JSON sayfa yanıtı: json.loads ve her kaydın ISO zaman damgasının ayrıştırılması (merge_new_data girdisi)
+    def setup(fleet_size):
+        payload = json.dumps({"data": _api_page_records(fleet_size, rng)}).encode("utf-8")
+
+        def run_once():
+            for data_point in json.loads(payload)["data"]:
+                data_point["timestamp_dt"] = ai_predictor.parse_timestamp(data_point["timestamp"])
+        return run_once, fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, 1, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def cases_frame_decode(config, rng):
+    # Aynı sayfanın ikili CAN çerçeveleri (can_frames.py): NumPy'a çözme ve merge_new_data'nın veri noktaları
+    def setup(fleet_size):
+        payload = can_frames.encode_frames(can_frames.TelemetryBatch.from_records(_api_page_records(fleet_size, rng)))
+        return (lambda: can_frames.decode_frames(payload)[0].data_points()), fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, 1, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def cases_create_features(config, rng):
+    # Tek seferlik yol: her otobüs için history uzunluğunda bir DataFrame'den create_features
+    def setup(fleet_size, history):
+        bus_df = make_history_frame(1, history, rng)
+
+        def run_once():
+            for _ in range(fleet_size):
+                ai_predictor.create_features(bus_df)
+        return run_once, fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        for history in config["history_lengths"]:
+            yield fleet_size, history, lambda fleet_size=fleet_size, history=history: setup(fleet_size, history)
+
+
+def cases_bus_feature_window(config, rng):
+    # Sürekli döngü yolu: her otobüsün kalıcı penceresine bir örnek eklenir ve özellik vektörü çıkarılır
+    def setup(fleet_size):
+        history_df = make_history_frame(fleet_size, ai_predictor.WINDOW_SIZE + 1, rng)
+        records = history_df.sort_values("timestamp", kind="stable").to_dict('records') # Zaman adımı sırası
+        windows = {}
+        for record in records[:-fleet_size]:
+            windows.setdefault(record["bus_id"], ai_predictor.BusFeatureWindow()).push(record)
+        new_records = records[-fleet_size:]
+        features_cols = ai_predictor.model_registry.get().features_cols
+
+        def run_once():
+            for record in new_records:
+                window = windows[record["bus_id"]]
+                window.push(record)
+                window.features(features_cols)
+        return run_once, fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, ai_predictor.WINDOW_SIZE, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def _features_matrix(fleet_size, rng):
+    features_cols = ai_predictor.model_registry.get().features_cols
+    X, _, _, _, _ = train_model.preprocess_and_label_data(make_history_frame(1, 2000, rng))
+    rows = rng.integers(len(X), size=fleet_size)
+    return np.ascontiguousarray(X[features_cols].to_numpy()[rows])
+
+
+def cases_make_prediction(config, rng):
+    # Otobüs başına ayrı make_prediction çağrısı
+    def setup(fleet_size):
+        rows = [row.reshape(1, -1) for row in _features_matrix(fleet_size, rng)]
+
+        def run_once():
+            for features in rows:
+                ai_predictor.make_prediction(features)
+        return run_once, fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, 1, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def cases_make_predictions_batch(config, rng):
+    # Tüm filo için tek make_predictions_batch çağrısı
+    def setup(fleet_size):
+        features_matrix = _features_matrix(fleet_size, rng)
+        return (lambda: ai_predictor.make_predictions_batch(features_matrix)), fleet_size
+
+    for fleet_size in config["fleet_sizes"]:
+        yield fleet_size, 1, lambda fleet_size=fleet_size: setup(fleet_size)
+
+
+def cases_preprocess_and_label_data(config, rng):
+    def setup(fleet_size, history):
+        df = make_history_frame(fleet_size, history, rng)
+        return (lambda: train_model.preprocess_and_label_data(df)), fleet_size * history
+
+    for fleet_size in config["fleet_sizes"]:
+        for history in config["history_lengths"]:
+            if fleet_size * history <= config["max_preprocess_rows"]:
+                yield fleet_size, history, lambda fleet_size=fleet_size, history=history: setup(fleet_size, history)
+
+
+def cases_model_fit(config, rng):
+    # Üretimdeki orman ayarlarıyla (train_model._fit_forest) 5 dakika hedefi için tek eğitim
+    def setup(fleet_size, history):
+        X, y_5min, _, _, _ = train_model.preprocess_and_label_data(make_history_frame(fleet_size, history, rng))
+        X = np.ascontiguousarray(X.to_numpy(), dtype=np.float32)
+        y = y_5min.to_numpy()
+        return (lambda: train_model._fit_forest(X, y, X[:1], n_jobs=config["jobs"])), len(X)
+
+    for fleet_size in FIT_FLEET_SIZES:
+        for history in config["history_lengths"]:
+            if train_model.HORIZON_30MIN + train_model.WINDOW_SIZE <= history and fleet_size * history <= config["max_fit_rows"]:
+                yield fleet_size, history, lambda fleet_size=fleet_size, history=history: setup(fleet_size, history)
+
+
+STAGE_CASES = {
+    "generate_realistic_data": cases_generate_realistic_data,
+    "generate_fleet_data": cases_generate_fleet_data,
+    "json_decode": cases_json_decode,
+    "frame_decode": cases_frame_decode,
+    "create_features": cases_create_features,
+    "bus_feature_window": cases_bus_feature_window,
+    "make_prediction": cases_make_prediction,
+    "make_predictions_batch": cases_make_predictions_batch,
+    "preprocess_and_label_data": cases_preprocess_and_label_data,
+    "model_fit": cases_model_fit,
+}
+# Tek çağrısı çok uzun süren aşamalar yalnızca bir kez ölçülür
+SINGLE_SHOT_STAGES = {"model_fit"}
+
+
+def case_key(result):
+    return f"{result['stage']}|fleet={result['fleet_size']}|history={result['history']}"
+
+
+def run_benchmarks(config, stages):
+    rng = np.random.default_rng(config["seed"])
+    original_registry = ai_predictor.model_registry
+    with tempfile.TemporaryDirectory(prefix="benchmark_model_") as model_dir:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()): # Aşamaların kendi uyarı çıktıları ölçümü kirletmesin
+                ai_predictor.model_registry = build_benchmark_model(model_dir, rng)
+                ai_predictor.model_registry.get()
+            return _run_stages(config, stages, rng)
+        finally:
+            # Geçici model dizini silinir; çağıran betikteki tahmin servisi kendi modeline geri döner
+            ai_predictor.model_registry = original_registry
+
+
+def _run_stages(config, stages, rng):
+    results = []
+    for stage in stages:
+        for fleet_size, history, setup in STAGE_CASES[stage](config, rng):
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_once, items_per_call = setup()
+                repeats = 1 if stage in SINGLE_SHOT_STAGES else MIN_REPEATS
+                measurement = measure(run_once, items_per_call, min_repeats=repeats,
+                                      max_repeats=repeats if stage in SINGLE_SHOT_STAGES else MAX_REPEATS,
+                                      time_budget=config["time_budget"], track_memory=config["track_memory"])
+            result = {"stage": stage, "fleet_size": fleet_size, "history": history, **measurement}
+            results.append(result)
+            rss, python_memory = (f"{result[key]:.1f} MB" if result[key] is not None else "-"
+                                  for key in ("peak_rss_delta_mb", "peak_python_memory_mb"))
+            print(f"{case_key(result):<50} p50 {result['latency_ms']['p50']:>10.2f} ms  "
+                  f"{result['throughput_per_s']:>12.0f} /s  bellek +{rss} (Python {python_memory})")
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # p50 gecikmesi, RSS artışı veya Python bellek zirvesi temel değerden threshold oranından fazla artan durumları döndürür
+    baseline_cases = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = baseline_cases.get(case_key(result))
+        if base is None:
+            continue
+        checks = [("latency_p50_ms", base["latency_ms"]["p50"], result["latency_ms"]["p50"])]
+        for metric in ("peak_rss_delta_mb", "peak_python_memory_mb"):
+            if base.get(metric) and result.get(metric) is not None:
+                checks.append((metric, base[metric], result[metric]))
+        for metric, old, new in checks:
+            if old > 0 and new > old * (1 + threshold):
+                regressions.append({"case": case_key(result), "metric": metric, "baseline": old, "current": new,
+                                    "change": new / old - 1})
+    return regressions
+
+
+def environment_info():
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telemetri -> özellik -> tahmin yollarının performans ölçümü")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Çalıştırılacak aşamalar")
+    parser.add_argument("--quick", action="store_true", help="Küçük ızgara ile hızlı çalıştır")
+    parser.add_argument("--output", default=RESULTS_PATH, help="Sonuçların yazılacağı JSON dosyası")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Karşılaştırılacak temel JSON dosyası")
+    parser.add_argument("--save-baseline", action="store_true", help="Sonuçları yeni temel olarak kaydet")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Gerileme eşiği (oran, ör. 0.25)")
+    parser.add_argument("--time-budget", type=float, default=CASE_TIME_BUDGET_SECONDS, help="Durum başına ölçüm süresi (saniye)")
+    parser.add_argument("--jobs", type=int, default=1, help="Model eğitimi aşamasında kullanılacak çekirdek sayısı")
+    parser.add_argument("--no-memory", action="store_true", help="Bellek ölçümünü (RSS ve tracemalloc) atla")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = {
+        "fleet_sizes": QUICK_FLEET_SIZES if args.quick else FLEET_SIZES,
+        "history_lengths": QUICK_HISTORY_LENGTHS if args.quick else HISTORY_LENGTHS,
+        "max_preprocess_rows": QUICK_MAX_PREPROCESS_ROWS if args.quick else MAX_PREPROCESS_ROWS,
+        "max_fit_rows": QUICK_MAX_FIT_ROWS if args.quick else MAX_FIT_ROWS,
+        "time_budget": args.time_budget,
+        "track_memory": not args.no_memory,
+        "jobs": args.jobs,
+        "seed": args.seed,
+    }
+    results = run_benchmarks(config, args.stages)
+    report = {"environment": environment_info(), "config": config, "results": results}
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSonuçlar '{args.output}' dosyasına yazıldı.")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Temel '{args.baseline}' olarak kaydedildi.")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} gerileme bulundu (eşik %{args.threshold * 100:.0f}):")
+            for regression in regressions:
+                print(f"  {regression['case']} {regression['metric']}: {regression['baseline']:.2f} -> "
+                      f"{regression['current']:.2f} (+%{regression['change'] * 100:.0f})")
+            sys.exit(1)
+        print("Temel ile karşılaştırıldı, gerileme yok.")
+    else:
+        print(f"Temel dosyası '{args.baseline}' bulunamadı; karşılaştırma atlandı (--save-baseline ile oluşturun).")
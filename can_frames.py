@@ -0,0 +1,214 @@
+# can_frames.py
+# Simülatör -> can-data API -> ai_predictor trafiği için JSON'a alternatif ikili telemetri biçimi.
+# Gerçek CAN çerçevelerindeki gibi her örnek sabit genişlikli, ölçekli tamsayı alanlardan oluşur:
+# zaman damgası epoch milisaniye, mod ve arıza tipleri tamsayı kodlu, otobüs kimliği çerçevenin otobüs
+# tablosundaki sıra numarasıdır. Kayıtlar uzunluk önekli çerçevelere toplanır; çözme np.frombuffer ile
+# doğrudan NumPy dizisine yapılır. TypeScript karşılığı: src/lib/canFrames.ts (aynı düzen).
+#
+# Yük düzeni (tüm alanlar little-endian):
+#   yük     := çerçeve*
+#   çerçeve := uint32 gövde uzunluğu | gövde
+#   gövde   := başlık | cursor (utf-8) | otobüs tablosu | kayıtlar
+#   başlık  := "CANF" | uint8 sürüm | uint8 bayraklar | uint16 otobüs sayısı | uint32 kayıt sayısı | uint16 cursor uzunluğu
+#   otobüs tablosu := (uint8 uzunluk | utf-8 bus_id)*
+import struct
+from datetime import datetime, timezone
+import numpy as np
+
+CONTENT_TYPE = "application/x-can-frames"
+FRAME_MAGIC = b"CANF"
+FRAME_VERSION = 1
+FLAG_HAS_MORE = 0x01 # Sayfalı okumada sunucuda daha fazla kayıt var
+FRAME_MAX_RECORDS = 4096 # Tek çerçevedeki en fazla kayıt; büyük gruplar birden çok çerçeveye bölünür
+UNKNOWN_CODE = 255 # Tabloda olmayan mod/arıza adı
+
+# can_simulator.DRIVING_MODES ve ALL_FAULT_TYPES sırası ile aynı olmalı (kodlar bu sıradaki indekslerdir)
+MODE_NAMES = ('idle', 'accelerating', 'cruising', 'braking', 'uphill', 'downhill')
+FAULT_NAMES = ("normal", "voltage_drop_fault", "overheat_fault", "efficiency_loss_fault",
+               "cell_imbalance_fault", "capacity_loss_fault")
+MODE_CODES = {name: code for code, name in enumerate(MODE_NAMES)}
+FAULT_CODES = {name: code for code, name in enumerate(FAULT_NAMES)}
+
+FRAME_LENGTH = struct.Struct("<I")
+FRAME_HEADER = struct.Struct("<4sBBHIH")
+
+# Sayısal alanlar: (kayıt alanı, çerçeve alanı, tamsayı tipi, ölçek). Simülatör voltajı 2, sıcaklık ve verimi
+# 1, SOH'u 2 ondalığa yuvarladığı için bu ölçeklerde kodlama kayıpsızdır (n / ölçek, JSON'daki değerle aynı
+# float'a çözülür).
+SCALED_FIELDS = [
+    ("cell_voltage", "voltage_mv", "<u2", 1000), # mV
+    ("cell_min_temp", "min_temp_dc", "<i2", 10), # 0.1 °C
+    ("cell_max_temp", "max_temp_dc", "<i2", 10),
+    ("energy_efficiency", "efficiency_dp", "<u2", 10), # %0.1
+    ("battery_soh", "soh_cp", "<u2", 100), # %0.01
+]
+RECORD_DTYPE = np.dtype(
+    [("timestamp_ms", "<i8"), ("bus_index", "<u2")]
+    + [(wire_field, wire_type) for _, wire_field, wire_type, _ in SCALED_FIELDS]
+    + [("mode", "u1"), ("fault", "u1")]
+) # 22 bayt, hizalama boşluğu yok
+
+_MODE_LOOKUP = np.array(MODE_NAMES + (None,) * (256 - len(MODE_NAMES)), dtype=object)
+_FAULT_LOOKUP = np.array(FAULT_NAMES + (None,) * (256 - len(FAULT_NAMES)), dtype=object)
+
+
+def accepts_can_frames(header_value):
+    # Content-Type veya Accept başlığı ikili çerçeve biçimini içeriyor mu
+    return CONTENT_TYPE in (header_value or "")
+
+
+def format_timestamp(value):
+    # datetime -> MongoDB/JavaScript toISOString biçimi ("2026-01-01T00:00:00.000Z")
+    return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _timestamp_ms(timestamp):
+    # ISO metin veya datetime -> epoch ms. Saat dilimsiz değerler yerel saat kabul edilir
+    # (JSON yolunda Next.js'in new Date(...) davranışı ile aynı).
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    return int(round(timestamp.timestamp() * 1000))
+
+
+class TelemetryBatch:
+    # Çözülmüş telemetri: çerçeve düzenindeki kayıt dizisi (RECORD_DTYPE) ve bus_index'in gösterdiği otobüs tablosu
+
+    def __init__(self, bus_ids, records):
+        self.bus_ids = list(bus_ids)
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_records(cls, records):
+        # JSON biçimindeki sözlüklerden (simülatör çıktısı) kodlar. Ölçeğe sığmayan veya eksik alanlı kayıtlarda
+        # ValueError verilir; gönderen taraf bu durumda JSON'a döner.
+        bus_index = {}
+        encoded = np.zeros(len(records), dtype=RECORD_DTYPE)
+        try:
+            encoded["timestamp_ms"] = [_timestamp_ms(record["timestamp"]) for record in records]
+            encoded["bus_index"] = [bus_index.setdefault(record["bus_id"], len(bus_index)) for record in records]
+            for field, wire_field, wire_type, scale in SCALED_FIELDS:
+                scaled = np.round(np.array([record[field] for record in records], dtype=float) * scale)
+                limits = np.iinfo(np.dtype(wire_type))
+                if not np.all((scaled >= limits.min) & (scaled <= limits.max)):
+                    raise ValueError(f"'{field}' alanı ikili çerçeve aralığının dışında")
+                encoded[wire_field] = scaled
+            encoded["mode"] = [MODE_CODES.get(record.get("current_driving_mode"), UNKNOWN_CODE) for record in records]
+            encoded["fault"] = [FAULT_CODES.get(record.get("current_fault_type"), UNKNOWN_CODE) for record in records]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Kayıt ikili çerçeveye kodlanamadı: {e}")
+        if len(bus_index) > np.iinfo(np.uint16).max + 1:
+            raise ValueError("Bir grupta en fazla 65536 farklı otobüs olabilir")
+        return cls(bus_index, encoded)
+
+    @classmethod
+    def concatenate(cls, batches):
+        # Otobüs tabloları birleştirilir ve bus_index'ler yeni tabloya göre yeniden numaralanır
+        bus_index = {}
+        parts = []
+        for batch in batches:
+            remap = np.array([bus_index.setdefault(bus_id, len(bus_index)) for bus_id in batch.bus_ids] or [0], dtype=np.uint16)
+            part = batch.records.copy()
+            part["bus_index"] = remap[part["bus_index"]]
+            parts.append(part)
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD_DTYPE)
+        return cls(bus_index, records)
+
+    def select(self, mask):
+        # Maskedeki kayıtlarla yeni grup (otobüs tablosu paylaşılır)
+        return TelemetryBatch(self.bus_ids, self.records[mask])
+
+    def columns(self):
+        # Sayısal alanlar ölçeği geri alınmış float64 dizileri olarak
+        return {field: self.records[wire_field] / scale for field, wire_field, _, scale in SCALED_FIELDS}
+
+    def data_points(self):
+        # ai_predictor.merge_new_data'nın beklediği veri noktaları. Zaman damgası doğrudan datetime'a çevrilir
+        # (timestamp_dt), ISO metin ayrıştırması yapılmaz.
+        # Bir filo adımındaki kayıtlar aynı zaman damgasını taşıdığı için her farklı değer bir kez çevrilir.
+        unique_ms, inverse = np.unique(self.records["timestamp_ms"], return_inverse=True)
+        unique_timestamps = np.array([datetime.fromtimestamp(value / 1000.0, timezone.utc) for value in unique_ms.tolist()] or [None],
+                                     dtype=object)
+        timestamps = unique_timestamps[inverse].tolist()
+        bus_ids = np.array(self.bus_ids, dtype=object)[self.records["bus_index"]].tolist()
+        columns = [values.tolist() for values in self.columns().values()]
+        modes = _MODE_LOOKUP[self.records["mode"]].tolist()
+        faults = _FAULT_LOOKUP[self.records["fault"]].tolist()
+        keys = ("timestamp_dt", "bus_id") + tuple(field for field, _, _, _ in SCALED_FIELDS) + (
+            "current_driving_mode", "current_fault_type")
+        return [dict(zip(keys, row)) for row in zip(timestamps, bus_ids, *columns, modes, faults)]
+
+    def to_records(self):
+        # JSON biçimine geri çevirir (timestamp ISO metin olarak)
+        records = self.data_points()
+        for record in records:
+            record["timestamp"] = format_timestamp(record.pop("timestamp_dt"))
+        return records
+
+
+def encode_frames(batch, cursor=None, has_more=False, max_records=FRAME_MAX_RECORDS):
+    # Grubu uzunluk önekli çerçevelere böler. cursor ve has_more sayfalı okuma içindir ve her çerçevede taşınır.
+    cursor_bytes = (cursor or "").encode("utf-8")
+    flags = FLAG_HAS_MORE if has_more else 0
+    chunks = []
+    for start in range(0, max(len(batch), 1), max_records):
+        records = batch.records[start:start + max_records]
+        used = np.unique(records["bus_index"]) # Her çerçeve yalnızca kendi otobüslerini taşır
+        remap = np.zeros(max(len(batch.bus_ids), 1), dtype=np.uint16)
+        remap[used] = np.arange(len(used))
+        records = records.copy()
+        records["bus_index"] = remap[records["bus_index"]]
+        table = b"".join(_encode_bus_id(batch.bus_ids[index]) for index in used.tolist())
+        body = b"".join([
+            FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, len(used), len(records), len(cursor_bytes)),
+            cursor_bytes, table, records.tobytes(),
+        ])
+        chunks.append(FRAME_LENGTH.pack(len(body)))
+        chunks.append(body)
+    return b"".join(chunks)
+
+
+def _encode_bus_id(bus_id):
+    encoded = str(bus_id).encode("utf-8")
+    if len(encoded) > 255:
+        raise ValueError(f"bus_id çok uzun: {bus_id!r}")
+    return bytes([len(encoded)]) + encoded
+
+
+def decode_frames(payload):
+    # Yükteki tüm çerçeveleri tek gruba çözer; (grup, cursor, has_more) döner. Son çerçevenin cursor/bayrağı geçerlidir.
+    view = memoryview(payload)
+    batches = []
+    cursor, has_more = None, False
+    offset = 0
+    while offset < len(view):
+        if offset + FRAME_LENGTH.size > len(view):
+            raise ValueError("Yarım çerçeve uzunluğu")
+        (length,) = FRAME_LENGTH.unpack_from(view, offset)
+        offset += FRAME_LENGTH.size
+        end = offset + length
+        if end > len(view) or length < FRAME_HEADER.size:
+            raise ValueError("Çerçeve uzunluğu yükle uyuşmuyor")
+        magic, version, flags, bus_count, record_count, cursor_length = FRAME_HEADER.unpack_from(view, offset)
+        if magic != FRAME_MAGIC or version != FRAME_VERSION:
+            raise ValueError(f"Desteklenmeyen çerçeve (imza {bytes(magic)!r}, sürüm {version})")
+        position = offset + FRAME_HEADER.size
+        cursor = bytes(view[position:position + cursor_length]).decode("utf-8") or None
+        position += cursor_length
+        bus_ids = []
+        for _ in range(bus_count):
+            id_length = view[position]
+            bus_ids.append(bytes(view[position + 1:position + 1 + id_length]).decode("utf-8"))
+            position += 1 + id_length
+        if position + record_count * RECORD_DTYPE.itemsize != end:
+            raise ValueError("Çerçeve gövdesi kayıt sayısı ile uyuşmuyor")
+        records = np.frombuffer(view, dtype=RECORD_DTYPE, count=record_count, offset=position)
+        if record_count and int(records["bus_index"].max()) >= bus_count:
+            raise ValueError("Kayıt otobüs tablosunun dışını gösteriyor")
+        batches.append(TelemetryBatch(bus_ids, records))
+        has_more = bool(flags & FLAG_HAS_MORE)
+        offset = end
+    batch = batches[0] if len(batches) == 1 else TelemetryBatch.concatenate(batches)
+    return batch, cursor, has_more
@@ -1,11 +1,23 @@
 # can_simulator.py
+import argparse
+import os
+import threading
 import time
 import random
 import requests
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.adapters import HTTPAdapter
 import json # Json importunu ekledik
+import numpy as np
+
+import can_frames
 
 NEXTJS_API_URL = "http://localhost:3000/api/can-data"
+# Gönderim biçimi: "auto" sunucu destekliyorsa ikili CAN çerçevelerini (can_frames.py), desteklemiyorsa JSON kullanır
+WIRE_FORMAT = "auto"
+WIRE_FORMAT_RETRY_SECONDS = 300.0 # JSON'a dönüldükten sonra ikili biçimin yeniden denenme aralığı
 
 # --- Yeni Sabitler ve Modeller ---
 DRIVING_MODES = ['idle', 'accelerating', 'cruising', 'braking', 'uphill', 'downhill']
@@ -63,7 +75,7 @@ def generate_realistic_data(bus_id, current_time, current_mode, battery_soh, cur
         cell_min_temp = round(random.uniform(20.0, 30.0), 1) # Normal aralıkta kalsın ama fark oluşsun
         cell_max_temp = round(random.uniform(35.0, 45.0), 1) # Max temp daha yüksek olsun
         if abs(cell_max_temp - cell_min_temp) < 10: # Farkı garanti et
-            cell_max_temp = cell_min_temp + random.uniform(10, 15)
+            cell_max_temp = round(cell_min_temp + random.uniform(10, 15), 1)
     elif current_fault_type == "capacity_loss_fault":
         energy_efficiency = round(random.uniform(55.0, 65.0), 1)
         cell_voltage = round(random.uniform(3.2, 3.5), 2) # Orta düzeyde düşüş
@@ -90,6 +102,124 @@ def generate_realistic_data(bus_id, current_time, current_mode, battery_soh, cur
         "current_fault_type": current_fault_type # Eğitim için bu bilgiyi kaydediyoruz
     }
 
+# --- Vektörel Filo Verisi Üretimi ---
+# generate_realistic_data ile aynı dağılımlar; bir zaman adımı için N otobüsün verisi tek çağrıda NumPy dizileri olarak üretilir.
+# Modlar DRIVING_MODES, arıza tipleri ALL_FAULT_TYPES indeksleriyle tamsayı kodlu tutulur.
+ALL_FAULT_TYPES = ["normal"] + FAULT_TYPES # train_model.py'deki FAULT_TYPES sırası ile aynı
+FAULT_CODES = {fault_type: i for i, fault_type in enumerate(ALL_FAULT_TYPES)}
+MODE_CODES = {mode: i for i, mode in enumerate(DRIVING_MODES)}
+
+# MODE_PROFILES'ın mod koduna göre indekslenebilen (ortalama, std) tabloları
+MODE_VOLTAGE_PROFILE = np.array([MODE_PROFILES[mode]['voltage'] for mode in DRIVING_MODES])
+MODE_TEMP_PROFILE = np.array([MODE_PROFILES[mode]['temp'] for mode in DRIVING_MODES])
+MODE_EFFICIENCY_PROFILE = np.array([MODE_PROFILES[mode]['efficiency'] for mode in DRIVING_MODES])
+
+
+def generate_fleet_data(mode_codes, battery_soh, fault_codes, rng=None):
+    # mode_codes, battery_soh, fault_codes: otobüs başına bir değer içeren diziler.
+    # Dönen sözlükteki her alan, otobüs sırasıyla hizalı bir dizidir.
+    rng = rng if rng is not None else np.random.default_rng()
+    mode_codes = np.asarray(mode_codes)
+    fault_codes = np.asarray(fault_codes)
+    battery_soh = np.asarray(battery_soh, dtype=float)
+    n = len(mode_codes)
+
+    # Mod profiline göre baz değerleri al
+    base_voltage_mean, base_voltage_std = MODE_VOLTAGE_PROFILE[mode_codes].T
+    base_temp_mean, base_temp_std = MODE_TEMP_PROFILE[mode_codes].T
+    base_efficiency_mean, base_efficiency_std = MODE_EFFICIENCY_PROFILE[mode_codes].T
+
+    # SOH'un değerler üzerindeki etkisi (generate_realistic_data ile aynı katsayılar)
+    soh_loss = (100.0 - battery_soh) / 100.0
+    soh_effect_voltage = soh_loss * 0.3
+    soh_effect_temp = soh_loss * 10.0
+    soh_effect_efficiency = soh_loss * 15.0
+
+    cell_voltage = np.round(rng.normal(base_voltage_mean - soh_effect_voltage, base_voltage_std * (1 + soh_effect_voltage)), 2)
+    temp_diff_base = rng.uniform(1.0, 3.0, n) * (1 + soh_loss * 0.5)
+    temp_std = base_temp_std * (1 + soh_effect_temp / 5)
+    cell_min_temp = np.round(rng.normal(base_temp_mean + soh_effect_temp - temp_diff_base / 2, temp_std), 1)
+    cell_max_temp = np.round(rng.normal(base_temp_mean + soh_effect_temp + temp_diff_base / 2, temp_std), 1)
+    energy_efficiency = np.round(rng.normal(base_efficiency_mean - soh_effect_efficiency, base_efficiency_std * (1 + soh_effect_efficiency / 10)), 1)
+    battery_soh = battery_soh.copy()
+
+    # Arıza enjeksiyonları: her arıza tipi yalnızca ilgili otobüslerin satırlarını günceller
+    mask = fault_codes == FAULT_CODES["voltage_drop_fault"]
+    if mask.any():
+        k = mask.sum()
+        cell_voltage[mask] = np.round(rng.uniform(3.0, 3.3, k), 2) # Kritik düşük voltaj
+        energy_efficiency[mask] = np.round(rng.uniform(70.0, 78.0, k), 1)
+
+    mask = fault_codes == FAULT_CODES["overheat_fault"]
+    if mask.any():
+        k = mask.sum()
+        cell_min_temp[mask] = np.round(rng.uniform(45.0, 55.0, k), 1)
+        cell_max_temp[mask] = np.round(rng.uniform(50.0, 65.0, k), 1)
+
+    mask = fault_codes == FAULT_CODES["efficiency_loss_fault"]
+    if mask.any():
+        k = mask.sum()
+        energy_efficiency[mask] = np.round(rng.uniform(60.0, 75.0, k), 1)
+        cell_voltage[mask] = np.round(rng.uniform(cell_voltage[mask] - 0.2, cell_voltage[mask] - 0.1), 2)
+
+    mask = fault_codes == FAULT_CODES["cell_imbalance_fault"]
+    if mask.any():
+        k = mask.sum()
+        # Hücreler arası farkı artır
+        cell_voltage[mask] = np.round(rng.uniform(cell_voltage[mask] - 0.1, cell_voltage[mask] + 0.1), 2)
+        imbalance_min = np.round(rng.uniform(20.0, 30.0, k), 1)
+        imbalance_max = np.round(rng.uniform(35.0, 45.0, k), 1)
+        small_gap = np.abs(imbalance_max - imbalance_min) < 10 # Farkı garanti et
+        imbalance_max[small_gap] = np.round(imbalance_min[small_gap] + rng.uniform(10, 15, small_gap.sum()), 1)
+        cell_min_temp[mask] = imbalance_min
+        cell_max_temp[mask] = imbalance_max
+
+    mask = fault_codes == FAULT_CODES["capacity_loss_fault"]
+    if mask.any():
+        k = mask.sum()
+        energy_efficiency[mask] = np.round(rng.uniform(55.0, 65.0, k), 1)
+        cell_voltage[mask] = np.round(rng.uniform(3.2, 3.5, k), 2) # Orta düzeyde düşüş
+        battery_soh[mask] = np.round(battery_soh[mask] - rng.uniform(1.0, 2.0, k), 2) # SOH daha hızlı düşsün
+
+    # Voltaj ve sıcaklık için gerçekçi sınırlar (aşırıya kaçmasın)
+    cell_voltage = np.clip(cell_voltage, 2.8, 4.3)
+    cell_min_temp = np.clip(cell_min_temp, -15.0, 65.0)
+    cell_max_temp = np.clip(cell_max_temp, -10.0, 75.0)
+    # Min temp, Max temp'ten büyük olmamalı
+    cell_min_temp, cell_max_temp = np.minimum(cell_min_temp, cell_max_temp), np.maximum(cell_min_temp, cell_max_temp)
+    energy_efficiency = np.clip(energy_efficiency, 40.0, 99.0)
+
+    return {
+        "cell_voltage": cell_voltage,
+        "cell_min_temp": cell_min_temp,
+        "cell_max_temp": cell_max_temp,
+        "energy_efficiency": energy_efficiency,
+        "current_driving_mode": mode_codes,
+        "battery_soh": np.round(battery_soh, 2),
+        "current_fault_type": fault_codes,
+    }
+
+
+def fleet_data_to_records(fleet_data, bus_ids, current_time):
+    # generate_fleet_data çıktısını generate_realistic_data ile aynı biçimdeki sözlüklere çevirir (JSON gönderimi için)
+    timestamp = current_time.isoformat()
+    columns = {key: values.tolist() for key, values in fleet_data.items()}
+    return [
+        {
+            "timestamp": timestamp,
+            "bus_id": bus_id,
+            "cell_voltage": columns["cell_voltage"][i],
+            "cell_min_temp": columns["cell_min_temp"][i],
+            "cell_max_temp": columns["cell_max_temp"][i],
+            "energy_efficiency": columns["energy_efficiency"][i],
+            "current_driving_mode": DRIVING_MODES[columns["current_driving_mode"][i]],
+            "battery_soh": columns["battery_soh"][i],
+            "current_fault_type": ALL_FAULT_TYPES[columns["current_fault_type"][i]]
+        }
+        for i, bus_id in enumerate(bus_ids)
+    ]
+
+
 # --- send_data fonksiyonu ---
 def send_data(data):
     try:
@@ -101,9 +231,337 @@ def send_data(data):
     except requests.exceptions.RequestException as e:
         print(f"Error sending data to Next.js: {e}")
 
+
+# --- Biçim Anlaşmalı Gönderim ---
+class TelemetrySender:
+    # Kayıt gruplarını can-data API'sine gönderir. "auto" modunda ilk gönderimden önce boş bir ikili çerçeve
+    # denenir; sunucu 2xx dönerse gruplar tek istekte ikili çerçeve olarak, aksi halde kayıt kayıt JSON olarak
+    # gönderilir. JSON'a düşüldüyse WIRE_FORMAT_RETRY_SECONDS sonra tekrar denenir (sunucu güncellenmiş olabilir).
+
+    def __init__(self, url=NEXTJS_API_URL, wire_format=WIRE_FORMAT, session=None):
+        self.url = url
+        self.wire_format = wire_format
+        self.session = session or requests.Session()
+        self.use_frames = wire_format == "can"
+        self.probed_at = None
+
+    def negotiate(self):
+        if self.wire_format != "auto":
+            return self.use_frames
+        if self.probed_at is not None and (self.use_frames or time.monotonic() - self.probed_at < WIRE_FORMAT_RETRY_SECONDS):
+            return self.use_frames
+        first_probe = self.probed_at is None
+        self.probed_at = time.monotonic()
+        empty_frame = can_frames.encode_frames(can_frames.TelemetryBatch.from_records([]))
+        try:
+            response = self.session.post(self.url, data=empty_frame, headers={"Content-Type": can_frames.CONTENT_TYPE}, timeout=10)
+            use_frames = response.ok
+        except requests.exceptions.RequestException:
+            use_frames = False
+        if first_probe or use_frames != self.use_frames:
+            print(f"Telemetri biçimi: {'ikili CAN çerçeveleri' if use_frames else 'JSON'} ({self.url})")
+        self.use_frames = use_frames
+        return use_frames
+
+    def encode(self, records):
+        # İkili çerçeve yükü; kayıtlar çerçeveye sığmıyorsa (ör. ölçek dışı değer) None döner ve JSON kullanılır
+        if not self.negotiate():
+            return None
+        try:
+            return can_frames.encode_frames(can_frames.TelemetryBatch.from_records(records))
+        except ValueError:
+            return None
+
+    def send(self, records):
+        try:
+            payload = self.encode(records)
+            if payload is not None:
+                response = self.session.post(self.url, data=payload, headers={"Content-Type": can_frames.CONTENT_TYPE}, timeout=10)
+                response.raise_for_status()
+                return
+            for record in records:
+                response = self.session.post(self.url, json=record, timeout=10)
+                response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Error sending data to Next.js: {e}")
+
+
+# --- Hızlandırılmış Zamanlı Çevrimdışı Veri Seti Üretimi ---
+# Sanal saat ile günler/haftalar süren filo geçmişini HTTP/MongoDB olmadan doğrudan dosyalara yazar.
+# Sürüş modu değişimi, SOH azalması ve arıza senaryoları run_simulation'daki kurallarla aynıdır.
+DATASET_COLUMNS = ["timestamp", "bus_index", "cell_voltage", "cell_min_temp", "cell_max_temp",
+                   "energy_efficiency", "current_driving_mode", "battery_soh", "current_fault_type"]
+
+
+def init_fleet_state(bus_count, now_seconds, rng):
+    # run_simulation'daki bus_states sözlüğünün vektörel karşılığı (zamanlar saniye cinsinden)
+    return {
+        "battery_soh": np.full(bus_count, 100.0), # Başlangıç SOH
+        "current_driving_mode": rng.integers(len(DRIVING_MODES), size=bus_count),
+        "fault_scenario_active": np.zeros(bus_count, dtype=bool),
+        "fault_start_time": np.zeros(bus_count),
+        "current_fault_type": np.zeros(bus_count, dtype=np.int8), # FAULT_CODES
+        "fault_duration": rng.integers(10, 31, size=bus_count) * 60.0,
+        "mode_change_timer": np.full(bus_count, float(now_seconds)),
+    }
+
+
+def step_fleet_state(state, now_seconds, step_seconds, rng):
+    # Tüm filonun durumunu bir zaman adımı ilerletir (run_simulation döngüsünün gövdesi ile aynı kurallar)
+    bus_count = len(state["battery_soh"])
+
+    # --- Sürüş Modu Değişimi ---
+    mode_changed = now_seconds - state["mode_change_timer"] > rng.integers(2, 11, size=bus_count) * 60.0
+    if mode_changed.any():
+        state["current_driving_mode"][mode_changed] = rng.integers(len(DRIVING_MODES), size=mode_changed.sum())
+        state["mode_change_timer"][mode_changed] = now_seconds
+
+    # --- SOH Azalması ---
+    soh_decay = (now_seconds - state["mode_change_timer"]) % (10 * 60) < step_seconds
+    state["battery_soh"][soh_decay] -= 0.005
+    np.maximum(state["battery_soh"], 50.0, out=state["battery_soh"]) # SOH minimum sınırı
+
+    # --- Arıza Senaryosu Tetikleme ---
+    fault_chance = np.full(bus_count, 0.003) # Temel şans
+    fault_chance[state["battery_soh"] < 70.0] += 0.002
+    fault_chance[state["current_driving_mode"] == MODE_CODES['uphill']] += 0.001
+    fault_started = ~state["fault_scenario_active"] & (rng.random(bus_count) < fault_chance)
+    if fault_started.any():
+        k = fault_started.sum()
+        state["fault_scenario_active"][fault_started] = True
+        state["fault_start_time"][fault_started] = now_seconds
+        state["current_fault_type"][fault_started] = rng.integers(1, len(ALL_FAULT_TYPES), size=k)
+        state["fault_duration"][fault_started] = rng.integers(10, 31, size=k) * 60.0
+
+    # Süresi dolan arızalar normale döner
+    fault_ended = state["fault_scenario_active"] & (now_seconds - state["fault_start_time"] > state["fault_duration"])
+    state["fault_scenario_active"][fault_ended] = False
+    state["current_fault_type"][fault_ended] = FAULT_CODES["normal"]
+
+
+def _write_npy_shard(out_dir, shard_index, columns, tick_count, bus_count):
+    # Her sütun ayrı bir .npy dosyasıdır; okuma tarafı np.load(mmap_mode='r') ile bellek eşlemeli açabilir.
+    # Satırlar otobüs-öncelikli sıralanır, bus_offsets.npy her otobüsün satır aralığını verir (train_model.py ile aynı biçim).
+    shard_dir = os.path.join(out_dir, f"shard_{shard_index:05d}")
+    os.makedirs(shard_dir, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(shard_dir, f"{name}.npy"), values.reshape(tick_count, bus_count).T.ravel())
+    np.save(os.path.join(shard_dir, "bus_offsets.npy"), np.arange(bus_count + 1, dtype=np.int64) * tick_count)
+    return os.path.basename(shard_dir)
+
+
+def _write_parquet_shard(out_dir, shard_index, columns, bus_ids):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet çıktısı için 'pyarrow' paketi gerekli (pip install pyarrow) veya --format npy kullanın.")
+
+    # Metin alanları sözlük (dictionary) kodlamalı yazılır; kodlar doğrudan indeks olarak kullanılır
+    table = pa.table({
+        "timestamp": pa.array(columns["timestamp"], type=pa.timestamp("ms", tz="UTC")),
+        "bus_id": pa.DictionaryArray.from_arrays(columns["bus_index"], pa.array(bus_ids)),
+        "cell_voltage": columns["cell_voltage"],
+        "cell_min_temp": columns["cell_min_temp"],
+        "cell_max_temp": columns["cell_max_temp"],
+        "energy_efficiency": columns["energy_efficiency"],
+        "current_driving_mode": pa.DictionaryArray.from_arrays(columns["current_driving_mode"], pa.array(DRIVING_MODES)),
+        "battery_soh": columns["battery_soh"],
+        "current_fault_type": pa.DictionaryArray.from_arrays(columns["current_fault_type"], pa.array(ALL_FAULT_TYPES)),
+    })
+    file_name = f"shard_{shard_index:05d}.parquet"
+    pq.write_table(table, os.path.join(out_dir, file_name))
+    return file_name
+
+
+def synthesize_dataset(out_dir, bus_count, days, step_seconds=5, output_format="npy", shard_hours=24,
+                       start_time=None, seed=None):
+    # Sanal saati step_seconds adımlarla ilerletip filo geçmişini shard_hours'luk parçalar halinde yazar
+    rng = np.random.default_rng(seed)
+    start_time = start_time or (datetime.now(timezone.utc) - timedelta(days=days))
+    start_ms = int(start_time.timestamp() * 1000)
+    total_ticks = int(days * 24 * 3600 / step_seconds)
+    ticks_per_shard = max(1, int(shard_hours * 3600 / step_seconds))
+    bus_ids = [f"BUS{i + 1:05d}" for i in range(bus_count)]
+
+    os.makedirs(out_dir, exist_ok=True)
+    state = init_fleet_state(bus_count, 0.0, rng)
+    shard_files = []
+    started = time.perf_counter()
+
+    for shard_index, first_tick in enumerate(range(0, total_ticks, ticks_per_shard)):
+        tick_count = min(ticks_per_shard, total_ticks - first_tick)
+        modes = np.empty((tick_count, bus_count), dtype=np.int8)
+        soh = np.empty((tick_count, bus_count))
+        faults = np.empty((tick_count, bus_count), dtype=np.int8)
+
+        # Durum makinesi sıralı ilerler; ölçümler ise parçanın tamamı için tek çağrıda üretilir
+        for i in range(tick_count):
+            step_fleet_state(state, (first_tick + i) * step_seconds, step_seconds, rng)
+            modes[i] = state["current_driving_mode"]
+            soh[i] = state["battery_soh"]
+            faults[i] = state["current_fault_type"]
+        fleet_data = generate_fleet_data(modes.ravel(), soh.ravel(), faults.ravel(), rng)
+
+        tick_ms = start_ms + (first_tick + np.arange(tick_count, dtype=np.int64)) * int(step_seconds * 1000)
+        columns = {
+            "timestamp": np.repeat(tick_ms, bus_count),
+            "bus_index": np.tile(np.arange(bus_count, dtype=np.int32), tick_count),
+            "cell_voltage": fleet_data["cell_voltage"].astype(np.float32),
+            "cell_min_temp": fleet_data["cell_min_temp"].astype(np.float32),
+            "cell_max_temp": fleet_data["cell_max_temp"].astype(np.float32),
+            "energy_efficiency": fleet_data["energy_efficiency"].astype(np.float32),
+            "current_driving_mode": fleet_data["current_driving_mode"].astype(np.int8),
+            "battery_soh": fleet_data["battery_soh"].astype(np.float32),
+            "current_fault_type": fleet_data["current_fault_type"].astype(np.int8),
+        }
+        if output_format == "parquet":
+            shard_files.append(_write_parquet_shard(out_dir, shard_index, columns, bus_ids))
+        else:
+            shard_files.append(_write_npy_shard(out_dir, shard_index, columns, tick_count, bus_count))
+
+    metadata = {
+        "format": output_format,
+        "step_seconds": step_seconds,
+        "start_time": start_time.isoformat(),
+        "bus_ids": bus_ids,
+        "driving_modes": DRIVING_MODES,
+        "fault_types": ALL_FAULT_TYPES,
+        "columns": DATASET_COLUMNS,
+        "shards": shard_files,
+    }
+    with open(os.path.join(out_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    elapsed = time.perf_counter() - started
+    print(f"{bus_count} otobüs x {total_ticks} adım = {bus_count * total_ticks} kayıt {elapsed:.1f} sn'de '{out_dir}' dizinine yazıldı.")
+    return metadata
+
+
+# --- Yük Testi (Load Generator) Modu ---
+# Alım (ingest) hattını ölçmek için çok sayıda otobüsü hedef mesaj hızında eşzamanlı olarak gönderir.
+# Her iş parçacığı bağlantı havuzlu kendi requests.Session'ını kullanır.
+_thread_local = threading.local()
+
+
+def _get_thread_session(pool_size):
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+
+class _LocalIngestHandler(BaseHTTPRequestHandler):
+    # /api/can-data yerine geçen basit alıcı: gövdeyi okur ve 201 döner
+    protocol_version = "HTTP/1.1" # Keep-alive bağlantılar için
+    disable_nagle_algorithm = True # Başlık ve gövde ayrı yazıldığında oluşan gecikmeli ACK beklemesini önler
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = b'{"message": "Data stored successfully"}'
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Gürültüyü azaltmak için istek loglarını kapat
+
+
+def start_local_ingest_server(port=0):
+    # Testin internetsiz/MongoDB'siz çalışabilmesi için yerel HTTP alıcısı başlatır; (sunucu, url) döner
+    server = ThreadingHTTPServer(("127.0.0.1", port), _LocalIngestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="local-ingest", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/can-data"
+
+
+def run_load_test(url, bus_count, target_rate, duration_seconds, workers, wire_format="json"):
+    bus_ids = [f"BUS{i + 1:05d}" for i in range(bus_count)]
+    rng = np.random.default_rng()
+    # Mod değişimi, SOH azalması ve arıza senaryoları synthesize_dataset ile aynı durum makinesinden gelir
+    state = init_fleet_state(bus_count, time.time(), rng)
+    last_step = None
+    pending_records = [] # Filonun bir zaman adımı tek seferde vektörel üretilir
+    latencies = []
+    errors = 0
+    last_error = None
+    errors_lock = threading.Lock() # Havuz iş parçacıkları hata sayacını birlikte artırır
+    in_flight = threading.BoundedSemaphore(workers * 2) # Gönderim kuyruğunun sınırsız büyümesini engeller
+    use_frames = TelemetrySender(url, wire_format).negotiate()
+
+    def send_one(data):
+        nonlocal errors, last_error
+        try:
+            started = time.perf_counter()
+            if use_frames:
+                payload = can_frames.encode_frames(can_frames.TelemetryBatch.from_records([data]))
+                response = _get_thread_session(workers).post(url, data=payload, timeout=10,
+                                                             headers={"Content-Type": can_frames.CONTENT_TYPE})
+            else:
+                response = _get_thread_session(workers).post(url, json=data, timeout=10)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        except Exception as e: # Kodlama hataları da gözlenmeyen future içinde kaybolmasın diye sayılır
+            with errors_lock:
+                errors += 1
+                last_error = e
+        finally:
+            in_flight.release()
+
+    print(f"Yük testi: {bus_count} otobüs, hedef {target_rate:.0f} mesaj/sn, {duration_seconds:.0f} sn, {workers} iş parçacığı, "
+          f"{'ikili çerçeve' if use_frames else 'JSON'} -> {url}")
+    sent = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration_seconds:
+                break
+            # Hedef hıza göre şu ana kadar gönderilmiş olması gereken mesaj sayısına yetiş
+            due = int(elapsed * target_rate) + 1
+            if sent >= due:
+                time.sleep(min(0.001, (due - elapsed * target_rate) / target_rate))
+                continue
+            if not pending_records:
+                now_seconds = time.time()
+                step_fleet_state(state, now_seconds, now_seconds - (last_step or now_seconds), rng)
+                last_step = now_seconds
+                fleet_data = generate_fleet_data(state["current_driving_mode"], state["battery_soh"],
+                                                 state["current_fault_type"], rng)
+                pending_records = fleet_data_to_records(fleet_data, bus_ids, datetime.now())[::-1]
+            in_flight.acquire()
+            executor.submit(send_one, pending_records.pop())
+            sent += 1
+    total_seconds = time.perf_counter() - started
+
+    completed = len(latencies)
+    print(f"Gönderilen: {sent}, başarılı: {completed}, hata: {errors}, süre: {total_seconds:.2f} sn")
+    if last_error is not None:
+        print(f"Son hata: {last_error!r}")
+    print(f"Ulaşılan hız: {completed / total_seconds:.1f} mesaj/sn")
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000.0, [50, 95, 99])
+        print(f"İstek gecikmesi (ms): p50={p50:.2f} p95={p95:.2f} p99={p99:.2f}")
+    return {
+        "sent": sent,
+        "completed": completed,
+        "errors": errors,
+        "messages_per_second": completed / total_seconds,
+        "latencies": latencies,
+    }
+
+
 # --- Ana Simülasyon Döngüsü ---
-if __name__ == "__main__":
+def run_simulation(wire_format=WIRE_FORMAT, url=NEXTJS_API_URL):
     bus_ids = ["BUS001", "BUS002"]
+    sender = TelemetrySender(url, wire_format) # Bir zaman adımındaki tüm otobüsler tek grupta gönderilir
     
     # Her otobüs için durum değişkenleri
     bus_states = {}
@@ -122,6 +580,7 @@ if __name__ == "__main__":
 
     print("Gelişmiş Sanal otobüs veri simülasyonu başlatılıyor...")
     while True:
+        tick_records = []
         for bus_id in bus_ids:
             current_sim_time = datetime.now()
             state = bus_states[bus_id]
@@ -163,7 +622,7 @@ if __name__ == "__main__":
                     state["current_fault_type"] = "normal"
                     print(f"\n--- [{bus_id}] için arıza senaryosu sona erdi, normale dönülüyor. ---")
             
-            # Veri üret ve gönder
+            # Veri üret
             data = generate_realistic_data(
                 bus_id, 
                 current_sim_time, 
@@ -171,6 +630,36 @@ if __name__ == "__main__":
                 state["battery_soh"], 
                 state["current_fault_type"]
             )
-            send_data(data)
+            tick_records.append(data)
+        sender.send(tick_records)
+
+        time.sleep(simulation_time_step.total_seconds())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sanal otobüs CAN veri simülatörü")
+    parser.add_argument("--load-test", action="store_true", help="Yük testi modunda çalış")
+    parser.add_argument("--buses", type=int, default=100, help="Yük testinde simüle edilecek otobüs sayısı")
+    parser.add_argument("--rate", type=float, default=200.0, help="Hedef mesaj hızı (mesaj/sn)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Yük testi süresi (sn)")
+    parser.add_argument("--workers", type=int, default=32, help="Eşzamanlı gönderim iş parçacığı sayısı")
+    parser.add_argument("--url", default=NEXTJS_API_URL, help="Verilerin gönderileceği adres")
+    parser.add_argument("--wire-format", choices=["auto", "json", "can"], default=WIRE_FORMAT, help="Telemetri gönderim biçimi (auto: sunucu destekliyorsa ikili CAN çerçeveleri)")
+    parser.add_argument("--local-server", action="store_true", help="Trafiği yerel bir HTTP alıcısına gönder (çevrimdışı test)")
+    parser.add_argument("--synthesize", metavar="OUT_DIR", help="Hızlandırılmış sanal zamanla veri setini bu dizine yaz")
+    parser.add_argument("--days", type=float, default=7.0, help="Üretilecek filo geçmişinin süresi (gün)")
+    parser.add_argument("--format", choices=["npy", "parquet"], default="npy", help="Veri seti dosya biçimi")
+    parser.add_argument("--shard-hours", type=float, default=24.0, help="Her dosya parçasının kapsadığı süre (saat)")
+    parser.add_argument("--seed", type=int, default=None, help="Tekrarlanabilir üretim için rastgelelik tohumu")
+    args = parser.parse_args()
 
-        time.sleep(simulation_time_step.total_seconds())
\ No newline at end of file
+    if args.synthesize:
+        synthesize_dataset(args.synthesize, args.buses, args.days, output_format=args.format,
+                           shard_hours=args.shard_hours, seed=args.seed)
+    elif args.load_test:
+        url = args.url
+        if args.local_server:
+            _, url = start_local_ingest_server()
+        run_load_test(url, args.buses, args.rate, args.duration, args.workers, args.wire_format)
+    else:
+        run_simulation(args.wire_format, args.url)
@@ -0,0 +1,253 @@
+# predictor_metrics.py
+# ai_predictor.py döngüsü için düşük maliyetli ölçüm araçları: sayaçlar, göstergeler, histogramlar ve aşama
+# zamanlayıcıları. Değerler yerel bir HTTP uç noktasından Prometheus metin biçiminde sunulur (/metrics).
+# Aynı sunucu çalışma anında cProfile'ı açıp kapatmaya yarar (/profile/start, /profile/stop).
+import cProfile
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Aşama süreleri için varsayılan histogram sınırları (saniye): 0.1 ms ... 30 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Veri zamanından tahmin zamanına gecikme için sınırlar (saniye)
+LAG_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+PROFILE_OUTPUT_PATH = "predictor_profile.prof"
+PROFILE_TOP_FUNCTIONS = 30
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value not in (float("inf"), float("-inf")) else ("+Inf" if value > 0 else "-Inf")
+
+
+class Counter:
+    # Yalnızca artan değer (ör. işlenen satır sayısı)
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+
+class Gauge:
+    # Anlık değer; set_function verilirse değer her okumada bu fonksiyondan alınır
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = float(value)
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        value = self.function() if self.function is not None else self.value
+        return [(self.name, self.labels, value)]
+
+
+class Histogram:
+    # Sabit sınırlı kova histogramı; observe yalnızca bir ikili arama ve kilitli toplama yapar
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Son kova +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append((f"{self.name}_bucket", self.labels + (("le", _format_value(bound)),), cumulative))
+        samples.append((f"{self.name}_sum", self.labels, total))
+        samples.append((f"{self.name}_count", self.labels, count))
+        return samples
+
+
+class MetricsRegistry:
+    # Ölçümleri (isim, etiketler) anahtarıyla tutar; aynı anahtarla tekrar istenen ölçüm paylaşılır
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = self.metrics[key] = metric_class(name, help_text, key[1], **kwargs)
+        return metric
+
+    def counter(self, name, help_text, **labels):
+        return self._get_or_create(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, **labels):
+        return self._get_or_create(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        return self._get_or_create(Histogram, name, help_text, labels, buckets=buckets)
+
+    @contextmanager
+    def timer(self, stage, name="predictor_stage_seconds", help_text="Tahmin döngüsü aşamalarının süresi (saniye)"):
+        # with metrics.timer("fetch"): ... bloğunun süresini aşama etiketli histograma ekler
+        histogram = self.histogram(name, help_text, stage=stage)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    def drain(self):
+        # Sayaç ve histogramların bu çağrıdan bu yana biriken değerlerini döndürüp sıfırlar. Parçalı modda işçi
+        # süreçler kendi kayıtlarını her yanıtla boşaltır; koordinatör merge() ile kendi kaydına ekler.
+        with self.lock:
+            metrics = list(self.metrics.values())
+        drained = []
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                with metric.lock:
+                    value, metric.value = metric.value, 0.0
+                if value:
+                    drained.append(("counter", metric.name, metric.help_text, metric.labels, value))
+            elif isinstance(metric, Histogram):
+                with metric.lock:
+                    payload = (metric.buckets, metric.counts, metric.sum, metric.count)
+                    metric.counts, metric.sum, metric.count = [0] * len(metric.counts), 0.0, 0
+                if payload[3]:
+                    drained.append(("histogram", metric.name, metric.help_text, metric.labels, payload))
+        return drained
+
+    def merge(self, drained):
+        for kind, name, help_text, labels, value in drained:
+            if kind == "counter":
+                self._get_or_create(Counter, name, help_text, dict(labels)).inc(value)
+                continue
+            buckets, counts, total, count = value
+            histogram = self._get_or_create(Histogram, name, help_text, dict(labels), buckets=buckets)
+            if histogram.buckets != tuple(buckets):
+                continue # Farklı kova sınırlarıyla tanımlanmış ölçüm birleştirilemez
+            with histogram.lock:
+                histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+                histogram.sum += total
+                histogram.count += count
+
+    def render(self):
+        # Prometheus metin biçimi (text/plain; version=0.0.4)
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        described = set()
+        for metric in metrics:
+            if metric.name not in described:
+                metric_type = {Counter: "counter", Gauge: "gauge", Histogram: "histogram"}[type(metric)]
+                lines.append(f"# HELP {metric.name} {metric.help_text}")
+                lines.append(f"# TYPE {metric.name} {metric_type}")
+                described.add(metric.name)
+            for sample_name, labels, value in metric.samples():
+                lines.append(f"{sample_name}{_label_text(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class ProfileHook:
+    # cProfile yalnızca etkinleştirildiği iş parçacığını ölçer. Bu yüzden HTTP isteği yalnızca bir talep bırakır;
+    # ana döngü her tur başında apply() çağırarak profili kendi iş parçacığında açar veya kapatır.
+
+    def __init__(self, output_path=PROFILE_OUTPUT_PATH):
+        self.output_path = output_path
+        self.requested = False
+        self.profiler = None
+        self.last_report = "Henüz profil alınmadı.\n"
+        self.stopped = threading.Event()
+
+    def request(self, enabled):
+        if not enabled:
+            self.stopped.clear()
+        self.requested = enabled
+
+    def wait_for_report(self, timeout):
+        self.stopped.wait(timeout)
+        return self.last_report
+
+    def apply(self):
+        if self.requested and self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif not self.requested and self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.output_path)
+            report = io.StringIO()
+            pstats.Stats(self.profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            self.last_report = f"Profil '{self.output_path}' dosyasına yazıldı.\n{report.getvalue()}"
+            self.profiler = None
+            self.stopped.set()
+
+
+def start_metrics_server(registry, port, host="127.0.0.1", profile_hook=None, profile_wait_seconds=30.0):
+    # /metrics, /profile/start ve /profile/stop yollarını sunan arka plan HTTP sunucusunu başlatır
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._reply(200, registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+            elif self.path == "/profile/start" and profile_hook is not None:
+                profile_hook.request(True)
+                self._reply(200, "Profil bir sonraki döngüde başlayacak.\n")
+            elif self.path == "/profile/stop" and profile_hook is not None:
+                profile_hook.request(False)
+                self._reply(200, profile_hook.wait_for_report(profile_wait_seconds))
+            else:
+                self._reply(404, "Bulunamadı\n")
+
+        def _reply(self, status, body, content_type="text/plain; charset=utf-8"):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass # Her kazıma isteği için konsola yazma
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
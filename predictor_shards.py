@@ -0,0 +1,282 @@
+# predictor_shards.py
+# ai_predictor.py için çok süreçli (parçalı) tahmin modu. Koordinatör otobüsleri bus_id'nin tutarlı özeti
+# (consistent hashing) ile N işçi sürece atar. Her işçi kendi otobüslerinin kayan pencerelerini ve kendi model
+# tutamacını (ModelRegistry) tutar, otobüslerini bağımsız skorlar ve tahmin kayıtlarını koordinatöre döndürür;
+# koordinatör bunları ortak PredictionSink'e verir. İşçi eklenince veya çıkınca yalnızca sahibi değişen
+# otobüslerin pencere durumu eski işçiden yenisine aktarılır.
+import hashlib
+import multiprocessing
+import queue
+import signal
+import time
+from bisect import bisect_right
+from collections import defaultdict
+import numpy as np
+
+from can_frames import TelemetryBatch
+
+VIRTUAL_NODES = 64 # Her işçinin halkadaki sanal düğüm sayısı (dağılımı dengeler)
+SHARD_REPLY_TIMEOUT_SECONDS = 30.0 # Bir işçinin yanıtı için en uzun bekleme
+SHARD_POLL_SECONDS = 0.5 # Yanıt beklerken işçilerin canlılığının kontrol aralığı
+SHARD_JOIN_TIMEOUT_SECONDS = 5.0
+
+
+class HashRing:
+    # Tutarlı özet halkası: bir işçi eklenince/çıkınca otobüslerin yalnızca ~1/N'i yer değiştirir
+
+    def __init__(self, nodes=(), virtual_nodes=VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.ring_keys = []
+        self.ring_nodes = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node):
+        for replica in range(self.virtual_nodes):
+            key = self._hash(f"{node}#{replica}")
+            index = bisect_right(self.ring_keys, key)
+            self.ring_keys.insert(index, key)
+            self.ring_nodes.insert(index, node)
+
+    def remove(self, node):
+        kept = [(key, owner) for key, owner in zip(self.ring_keys, self.ring_nodes) if owner != node]
+        self.ring_keys = [key for key, _ in kept]
+        self.ring_nodes = [owner for _, owner in kept]
+
+    def node_for(self, key):
+        if not self.ring_keys:
+            return None
+        index = bisect_right(self.ring_keys, self._hash(str(key))) % len(self.ring_keys)
+        return self.ring_nodes[index]
+
+
+def _shard_worker(worker_id, model_path, inbox, outbox, tiered=False):
+    # İşçi süreç döngüsü. ai_predictor burada içe aktarılır; koordinatör ai_predictor.py'yi __main__ olarak
+    # çalıştırdığında modülün ikinci bir kopyası (ve ölçüm kayıtları) koordinatörde oluşmasın.
+    import ai_predictor
+
+    # Ctrl-C tüm süreç grubuna gider; işçileri koordinatör kapatır (close), işçi kendi başına sonlanmaz
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    model_registry = ai_predictor.ModelRegistry(model_path)
+    bus_windows = {}
+    while True:
+        message = inbox.get()
+        kind = message[0]
+        if kind == "records":
+            _, seq, records = message
+            predictions = []
+            try:
+                model_registry.maybe_reload()
+                updated_buses = ai_predictor.merge_new_data(records, bus_windows)
+                predictions = ai_predictor.score_buses(bus_windows, updated_buses, model_registry.get(), tiered=tiered)
+            except Exception as e:
+                print(f"İşçi {worker_id}: genel bir hata oluştu: {e}")
+            # Aşama süreleri ve sayaçlar işçinin kendi kaydında birikir; her yanıtla koordinatöre aktarılır
+            outbox.put(("predictions", worker_id, seq, (predictions, ai_predictor.metrics.drain())))
+        elif kind == "export":
+            # Başka işçiye geçen otobüslerin pencereleri gönderilir ve buradan silinir
+            _, seq, bus_ids = message
+            states = {bus_id: bus_windows.pop(bus_id) for bus_id in bus_ids if bus_id in bus_windows}
+            outbox.put(("state", worker_id, seq, states))
+        elif kind == "import":
+            _, seq, states = message
+            bus_windows.update(states)
+            outbox.put(("ack", worker_id, seq, len(states)))
+        elif kind == "stop":
+            break
+
+
+class ShardedPredictor:
+    # Koordinatör: işçi süreçleri başlatır, kayıtları otobüs sahibine göre dağıtır ve yanıtları toplar
+
+    def __init__(self, worker_count, model_path, virtual_nodes=VIRTUAL_NODES, tiered=False, metrics=None):
+        self.worker_count = worker_count
+        self.model_path = model_path
+        self.metrics = metrics # İşçilerin ölçümlerinin ekleneceği MetricsRegistry (None: atılır)
+        self.tiered = tiered # İşçilerde birinci kademe dedektör (ai_predictor.score_buses tiered=True)
+        self.context = multiprocessing.get_context("spawn") # Koordinatörün iş parçacıkları ve soketleri kopyalanmasın
+        self.ring = HashRing(virtual_nodes=virtual_nodes)
+        self.workers = {} # worker_id -> (süreç, gelen kutusu)
+        self.outbox = self.context.Queue()
+        self.assignment = {} # bus_id -> worker_id
+        self.next_worker_id = 0
+        self.next_seq = 0
+        self.overdue = {} # seq -> worker_id: zaman aşımına uğrayan ama işçisi yaşayan istekler
+        self.request_buses = {} # seq -> "records" isteğindeki otobüs sayısı (yanıt kaybolursa düşen tahminler)
+        self.late_replies = [] # Geç gelen tahmin yanıtları; bir sonraki dispatch ile döner
+
+    def start(self):
+        for _ in range(self.worker_count):
+            self.add_worker()
+        return self
+
+    def _spawn_worker(self):
+        worker_id = self.next_worker_id
+        self.next_worker_id += 1
+        inbox = self.context.Queue()
+        process = self.context.Process(target=_shard_worker,
+                                       args=(worker_id, self.model_path, inbox, self.outbox, self.tiered),
+                                       name=f"predictor-shard-{worker_id}", daemon=True)
+        process.start()
+        self.workers[worker_id] = (process, inbox)
+        return worker_id
+
+    def _send(self, worker_id, kind, payload):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.workers[worker_id][1].put((kind, seq, payload))
+        return seq
+
+    def _count(self, name, help_text, amount=1.0):
+        if self.metrics is not None and amount:
+            self.metrics.counter(name, help_text).inc(amount)
+
+    def _drop_dead(self, requests):
+        # İşçisi sonlanmış istekleri çıkarır; "records" yanıtlarındaki tahminler kaybolmuştur
+        dead = [seq for seq, worker_id in requests.items()
+                if worker_id not in self.workers or not self.workers[worker_id][0].is_alive()]
+        for seq in dead:
+            del requests[seq]
+            self._count("predictor_predictions_dropped_total", "Gönderilemeyen veya kuyruktan atılan tahmin sayısı",
+                        self.request_buses.pop(seq, 0))
+
+    def _late_reply(self, kind, seq, data):
+        if self.overdue.pop(seq, None) is None:
+            return
+        self.request_buses.pop(seq, None)
+        if kind == "predictions":
+            self.late_replies.append(data) # İşçi bu otobüsleri pencerelerine eklemiştir; tahminler atılmaz
+        elif kind == "state":
+            print(f"Uyarı: geç gelen {len(data)} otobüs penceresi atıldı; bu otobüsler boş pencereyle devam ediyor.")
+
+    def _collect(self, pending):
+        # pending: {seq: worker_id}. Yanıtlar {seq: veri} olarak döner. Ölen işçilerin yanıtları atlanır (bir
+        # sonraki döngüde replace_dead_workers ile halkadan çıkarılırlar). Zaman aşımına uğrayan canlı işçilerin
+        # istekleri self.overdue'ya alınır; yanıtları sonraki bir _collect'te gelirse tahminleri late_replies'a
+        # eklenir.
+        replies = {}
+        deadline = time.monotonic() + SHARD_REPLY_TIMEOUT_SECONDS
+        while pending and time.monotonic() < deadline:
+            try:
+                kind, worker_id, seq, data = self.outbox.get(timeout=SHARD_POLL_SECONDS)
+            except queue.Empty:
+                self._drop_dead(pending)
+                self._drop_dead(self.overdue)
+                continue
+            if pending.pop(seq, None) is not None:
+                self.request_buses.pop(seq, None)
+                replies[seq] = data
+            else:
+                self._late_reply(kind, seq, data)
+        while self.overdue:
+            # Bu sırada gelmiş geç yanıtlar beklemeden alınır
+            try:
+                kind, worker_id, seq, data = self.outbox.get_nowait()
+            except queue.Empty:
+                break
+            self._late_reply(kind, seq, data)
+        self._drop_dead(pending)
+        if pending:
+            print(f"Uyarı: {len(pending)} işçi yanıtı {SHARD_REPLY_TIMEOUT_SECONDS:.0f} sn içinde alınamadı; "
+                  f"geç gelirse sonraki dağıtımda işlenecek.")
+            self._count("predictor_shard_reply_timeouts_total", "Zaman aşımına uğrayan işçi yanıtı sayısı", len(pending))
+            self.overdue.update(pending)
+        return replies
+
+    def _owner(self, bus_id):
+        owner = self.assignment.get(bus_id)
+        if owner is None:
+            owner = self.assignment[bus_id] = self.ring.node_for(bus_id)
+        return owner
+
+    def dispatch(self, records):
+        # Kayıtları sahip işçilere gönderir, tüm işçiler paralel skorlar; tahmin kayıtlarının listesi döner.
+        # İkili çerçevelerden gelen TelemetryBatch sözlüğe çevrilmeden, sahip maskesiyle bölünerek gönderilir.
+        groups = defaultdict(list)
+        group_buses = {}
+        if isinstance(records, TelemetryBatch):
+            owners = np.array([self._owner(bus_id) for bus_id in records.bus_ids] or [0])[records.records["bus_index"]]
+            for worker_id in np.unique(owners).tolist():
+                mask = owners == worker_id
+                groups[worker_id] = records.select(mask)
+                group_buses[worker_id] = len(np.unique(records.records["bus_index"][mask]))
+        else:
+            for record in records:
+                groups[self._owner(record.get("bus_id"))].append(record)
+            group_buses = {worker_id: len({record.get("bus_id") for record in group}) for worker_id, group in groups.items()}
+        pending = {}
+        for worker_id, group in groups.items():
+            seq = self._send(worker_id, "records", group)
+            pending[seq] = worker_id
+            self.request_buses[seq] = group_buses[worker_id]
+        replies = self._collect(pending)
+        # Önceki dağıtımlardan geç gelen yanıtlar önce gelir (aynı işçinin yanıtları sırayla üretilir)
+        late_replies, self.late_replies = self.late_replies, []
+        predictions = []
+        for worker_predictions, worker_metrics in late_replies + list(replies.values()):
+            predictions.extend(worker_predictions)
+            if self.metrics is not None:
+                self.metrics.merge(worker_metrics)
+        return predictions
+
+    def _rebalance(self):
+        # Halka değiştikten sonra sahibi değişen otobüslerin pencerelerini eski işçiden yenisine taşır.
+        # Eski sahibi artık yaşamıyorsa durum kaybolmuştur; otobüs yeni işçide boş pencereyle başlar.
+        moves = defaultdict(list) # eski sahip -> taşınacak otobüsler
+        for bus_id, old_owner in self.assignment.items():
+            new_owner = self.ring.node_for(bus_id)
+            if new_owner != old_owner:
+                self.assignment[bus_id] = new_owner
+                if old_owner in self.workers and self.workers[old_owner][0].is_alive():
+                    moves[old_owner].append(bus_id)
+
+        pending = {self._send(old_owner, "export", bus_ids): old_owner for old_owner, bus_ids in moves.items()}
+        incoming = defaultdict(dict) # yeni sahip -> {bus_id: pencere}
+        for states in self._collect(pending).values():
+            for bus_id, window in states.items():
+                incoming[self.assignment[bus_id]][bus_id] = window
+        pending = {self._send(new_owner, "import", states): new_owner for new_owner, states in incoming.items()}
+        moved = sum(self._collect(pending).values())
+        if moved:
+            print(f"Parçalar yeniden dengelendi: {moved} otobüsün penceresi taşındı.")
+
+    def add_worker(self):
+        worker_id = self._spawn_worker()
+        self.ring.add(worker_id)
+        self._rebalance()
+        return worker_id
+
+    def remove_worker(self, worker_id):
+        # İşçi halkadan çıkarılır, pencereleri yeni sahiplerine aktarılır ve süreç durdurulur
+        self.ring.remove(worker_id)
+        self._rebalance()
+        process, inbox = self.workers.pop(worker_id)
+        if process.is_alive():
+            inbox.put(("stop", None, None))
+        process.join(SHARD_JOIN_TIMEOUT_SECONDS)
+
+    def replace_dead_workers(self):
+        # Beklenmedik şekilde sonlanan işçileri halkadan çıkarır ve yerlerine yeni işçi başlatır
+        dead = [worker_id for worker_id, (process, _) in self.workers.items() if not process.is_alive()]
+        for worker_id in dead:
+            print(f"Uyarı: işçi {worker_id} sonlanmış (çıkış kodu {self.workers[worker_id][0].exitcode}), yerine yenisi başlatılıyor.")
+            self.ring.remove(worker_id)
+            del self.workers[worker_id]
+        if dead:
+            self._rebalance()
+            for _ in dead:
+                self.add_worker()
+
+    def close(self):
+        for process, inbox in self.workers.values():
+            if process.is_alive():
+                inbox.put(("stop", None, None))
+        for process, _ in self.workers.values():
+            process.join(SHARD_JOIN_TIMEOUT_SECONDS)
+            if process.is_alive():
+                process.terminate()
+        self.workers.clear()
@@ -1,6 +1,8 @@
-import { MongoClient } from 'mongodb';
+import { Document, Filter, MongoClient, ObjectId } from 'mongodb';
 import { NextRequest, NextResponse } from 'next/server';
 
+import { acceptsCanFrames, CAN_FRAME_CONTENT_TYPE, decodeCanFrames, encodeCanFrames } from '@/lib/canFrames';
+
 // MongoDB URI from environment
 const uri = process.env.MONGODB_URI;
 
@@ -34,6 +36,30 @@ export async function POST(req: NextRequest) {
     const database = client.db('predictive_maintenance_sim');
     const collection = database.collection('bus_sensor_data');
 
+    // İkili CAN çerçeveleri (src/lib/canFrames.ts): bir istekte birden çok kayıt, tek insertMany ile yazılır
+    if (acceptsCanFrames(req.headers.get('content-type'))) {
+      let records;
+      try {
+        ({ records } = decodeCanFrames(await req.arrayBuffer()));
+      } catch (error: unknown) {
+        const message = error instanceof Error ? error.message : 'Invalid frame';
+        return NextResponse.json({ error: 'Invalid CAN frame payload', details: message }, { status: 400 });
+      }
+      // Boş çerçeve, gönderenin biçim desteğini yoklamasıdır
+      if (records.length === 0) {
+        return NextResponse.json({ message: 'No data to store', inserted: 0 }, { status: 200 });
+      }
+      const receivedAt = new Date();
+      const result = await collection.insertMany(
+        records.map((record) => ({ ...record, receivedAt })),
+        { ordered: false },
+      );
+      return NextResponse.json(
+        { message: 'Data stored successfully', inserted: result.insertedCount },
+        { status: 201 },
+      );
+    }
+
     const body = await req.json();
     const newData = {
       ...body,
@@ -54,15 +80,76 @@ export async function POST(req: NextRequest) {
   }
 }
 
-export async function GET() {
+// Sayfalı okuma için varsayılan ve en büyük sayfa boyutu
+const DEFAULT_PAGE_SIZE = 1000;
+const MAX_PAGE_SIZE = 5000;
+
+export async function GET(req: NextRequest) {
   try {
     const client = await clientPromise;
     const database = client.db('predictive_maintenance_sim');
     const collection = database.collection('bus_sensor_data');
 
-    const data = await collection.find({}).sort({ timestamp: -1 }).limit(1).toArray();
+    const { searchParams } = req.nextUrl;
+    const since = searchParams.get('since');
+    const afterId = searchParams.get('after_id');
+    const busId = searchParams.get('bus_id');
+
+    // Parametresiz çağrı: panolar için yalnızca en son kayıt
+    if (!since && !afterId && !busId) {
+      const data = await collection.find({}).sort({ timestamp: -1 }).limit(1).toArray();
+      return NextResponse.json(data, { status: 200 });
+    }
+
+    // Sayfalı artımlı okuma: kayıtlar _id sırasıyla (eklenme sırası) döner.
+    // `after_id` bir önceki sayfanın son kaydıdır, `since` ise zaman damgası alt sınırıdır.
+    const filter: Filter<Document> = {};
+    if (since) {
+      const sinceDate = new Date(since);
+      if (Number.isNaN(sinceDate.getTime())) {
+        return NextResponse.json({ message: 'Invalid since parameter' }, { status: 400 });
+      }
+      filter.timestamp = { $gt: sinceDate };
+    }
+    if (afterId) {
+      if (!ObjectId.isValid(afterId)) {
+        return NextResponse.json({ message: 'Invalid after_id parameter' }, { status: 400 });
+      }
+      filter._id = { $gt: new ObjectId(afterId) };
+    }
+    if (busId) {
+      filter.bus_id = busId;
+    }
 
-    return NextResponse.json(data, { status: 200 });
+    const requestedLimit = Number.parseInt(searchParams.get('limit') ?? '', 10);
+    const limit = Number.isNaN(requestedLimit)
+      ? DEFAULT_PAGE_SIZE
+      : Math.min(Math.max(requestedLimit, 1), MAX_PAGE_SIZE);
+
+    const data = await collection.find(filter).sort({ _id: 1 }).limit(limit).toArray();
+    const last = data[data.length - 1];
+    const nextCursor = last ? String(last._id) : afterId;
+    const hasMore = data.length === limit;
+
+    // İstemci ikili çerçeve kabul ediyorsa sayfa çerçevelere kodlanır; biçime sığmayan belge varsa JSON döner
+    if (acceptsCanFrames(req.headers.get('accept'))) {
+      const payload = encodeCanFrames(data, nextCursor, hasMore);
+      if (payload) {
+        return new NextResponse(payload, {
+          status: 200,
+          headers: { 'Content-Type': CAN_FRAME_CONTENT_TYPE, Vary: 'Accept' },
+        });
+      }
+    }
+
+    return NextResponse.json(
+      {
+        data,
+        next_cursor: nextCursor,
+        has_more: hasMore,
+      },
+      { status: 200, headers: { Vary: 'Accept' } },
+    );
   } catch (error: unknown) {
     const message = error instanceof Error ? error.message : 'Unknown error';
     console.error('Error fetching data:', message);
@@ -28,13 +28,25 @@ export async function POST(req) {
     const collection = database.collection('predictions'); // Yeni koleksiyon adı
 
     const body = await req.json();
-    const newPrediction = {
-      ...body,
-      predicted_at: new Date(body.predicted_at), // String'i Date objesine çevir
-      timestamp_data_end: new Date(body.timestamp_data_end), // String'i Date objesine çevir
-    };
+    const toPredictionDocument = (prediction) => ({
+      ...prediction,
+      predicted_at: new Date(prediction.predicted_at), // String'i Date objesine çevir
+      timestamp_data_end: new Date(prediction.timestamp_data_end), // String'i Date objesine çevir
+    });
 
-    const result = await collection.insertOne(newPrediction);
+    // Toplu gönderim: tahmin dizisi tek insertMany ile yazılır
+    if (Array.isArray(body)) {
+      if (body.length === 0) {
+        return NextResponse.json({ message: 'No predictions to store', inserted: 0 }, { status: 200 });
+      }
+      const result = await collection.insertMany(body.map(toPredictionDocument), { ordered: false });
+      return NextResponse.json(
+        { message: 'Predictions received and stored successfully!', inserted: result.insertedCount },
+        { status: 200 },
+      );
+    }
+
+    const result = await collection.insertOne(toPredictionDocument(body));
     // console.log("Prediction inserted:", result.insertedId); // Konsol gürültüsünü azaltmak için kapatıldı
     return NextResponse.json(
       { message: 'Prediction received and stored successfully!', id: result.insertedId },
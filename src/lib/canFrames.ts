@@ -0,0 +1,187 @@
+// lib/canFrames.ts
+// can_frames.py ile aynı ikili telemetri biçimi (simülatör -> /api/can-data -> ai_predictor.py).
+// Her kayıt 22 baytlık sabit genişlikli, ölçekli tamsayı alanlardan oluşur; kayıtlar uzunluk önekli
+// çerçevelere toplanır. Düzen değişirse iki dosya birlikte güncellenmelidir.
+
+export const CAN_FRAME_CONTENT_TYPE = 'application/x-can-frames';
+
+const FRAME_MAGIC = 'CANF';
+const FRAME_VERSION = 1;
+const FLAG_HAS_MORE = 0x01;
+const FRAME_MAX_RECORDS = 4096;
+const UNKNOWN_CODE = 255;
+const HEADER_SIZE = 14; // magic(4) + sürüm(1) + bayraklar(1) + otobüs sayısı(2) + kayıt sayısı(4) + cursor uzunluğu(2)
+const RECORD_SIZE = 22;
+
+// can_simulator.DRIVING_MODES ve ALL_FAULT_TYPES sırası ile aynı olmalı
+const MODE_NAMES = ['idle', 'accelerating', 'cruising', 'braking', 'uphill', 'downhill'];
+const FAULT_NAMES = [
+  'normal',
+  'voltage_drop_fault',
+  'overheat_fault',
+  'efficiency_loss_fault',
+  'cell_imbalance_fault',
+  'capacity_loss_fault',
+];
+
+// [kayıt alanı, kayıttaki bayt konumu, işaretli mi, ölçek]; konumlar timestamp_ms(8) + bus_index(2) sonrasıdır
+const SCALED_FIELDS: [string, number, boolean, number][] = [
+  ['cell_voltage', 10, false, 1000],
+  ['cell_min_temp', 12, true, 10],
+  ['cell_max_temp', 14, true, 10],
+  ['energy_efficiency', 16, false, 10],
+  ['battery_soh', 18, false, 100],
+];
+const MODE_OFFSET = 20;
+const FAULT_OFFSET = 21;
+
+export interface TelemetryRecord {
+  timestamp: Date;
+  bus_id: string;
+  cell_voltage: number;
+  cell_min_temp: number;
+  cell_max_temp: number;
+  energy_efficiency: number;
+  battery_soh: number;
+  current_driving_mode: string | null;
+  current_fault_type: string | null;
+}
+
+export interface DecodedFrames {
+  records: TelemetryRecord[];
+  cursor: string | null;
+  hasMore: boolean;
+}
+
+export const acceptsCanFrames = (headerValue: string | null): boolean =>
+  (headerValue ?? '').includes(CAN_FRAME_CONTENT_TYPE);
+
+export function decodeCanFrames(payload: ArrayBuffer): DecodedFrames {
+  const view = new DataView(payload);
+  const bytes = new Uint8Array(payload);
+  const text = new TextDecoder();
+  const records: TelemetryRecord[] = [];
+  let cursor: string | null = null;
+  let hasMore = false;
+  let offset = 0;
+
+  while (offset < view.byteLength) {
+    if (offset + 4 > view.byteLength) throw new Error('Truncated frame length');
+    const length = view.getUint32(offset, true);
+    offset += 4;
+    const end = offset + length;
+    if (end > view.byteLength || length < HEADER_SIZE) throw new Error('Frame length does not match payload');
+    if (text.decode(bytes.subarray(offset, offset + 4)) !== FRAME_MAGIC || view.getUint8(offset + 4) !== FRAME_VERSION) {
+      throw new Error('Unsupported frame');
+    }
+    const flags = view.getUint8(offset + 5);
+    const busCount = view.getUint16(offset + 6, true);
+    const recordCount = view.getUint32(offset + 8, true);
+    const cursorLength = view.getUint16(offset + 12, true);
+    let position = offset + HEADER_SIZE;
+    cursor = text.decode(bytes.subarray(position, position + cursorLength)) || null;
+    position += cursorLength;
+
+    const busIds: string[] = [];
+    for (let i = 0; i < busCount; i++) {
+      const idLength = view.getUint8(position);
+      busIds.push(text.decode(bytes.subarray(position + 1, position + 1 + idLength)));
+      position += 1 + idLength;
+    }
+    if (position + recordCount * RECORD_SIZE !== end) throw new Error('Frame body does not match record count');
+
+    for (let i = 0; i < recordCount; i++, position += RECORD_SIZE) {
+      const busIndex = view.getUint16(position + 8, true);
+      if (busIndex >= busCount) throw new Error('Record points outside the bus table');
+      const record: Record<string, unknown> = {
+        timestamp: new Date(Number(view.getBigInt64(position, true))),
+        bus_id: busIds[busIndex],
+        current_driving_mode: MODE_NAMES[view.getUint8(position + MODE_OFFSET)] ?? null,
+        current_fault_type: FAULT_NAMES[view.getUint8(position + FAULT_OFFSET)] ?? null,
+      };
+      for (const [field, fieldOffset, signed, scale] of SCALED_FIELDS) {
+        const raw = signed ? view.getInt16(position + fieldOffset, true) : view.getUint16(position + fieldOffset, true);
+        record[field] = raw / scale;
+      }
+      records.push(record as unknown as TelemetryRecord);
+    }
+    hasMore = (flags & FLAG_HAS_MORE) !== 0;
+    offset = end;
+  }
+  return { records, cursor, hasMore };
+}
+
+// MongoDB belgelerini çerçevelere kodlar. Bir belge biçime sığmıyorsa (eksik alan, ölçek dışı değer)
+// null döner; çağıran taraf bu sayfayı JSON olarak göndermelidir.
+export function encodeCanFrames(
+  documents: Record<string, unknown>[],
+  cursor: string | null,
+  hasMore: boolean,
+): Uint8Array | null {
+  const encoder = new TextEncoder();
+  const cursorBytes = encoder.encode(cursor ?? '');
+  const chunks: Uint8Array[] = [];
+
+  for (let start = 0; start < Math.max(documents.length, 1); start += FRAME_MAX_RECORDS) {
+    const page = documents.slice(start, start + FRAME_MAX_RECORDS);
+    const busIndex = new Map<string, number>();
+    const busTable: Uint8Array[] = [];
+    for (const document of page) {
+      const busId = String(document.bus_id ?? '');
+      if (!busIndex.has(busId)) {
+        const encoded = encoder.encode(busId);
+        if (encoded.length > 255 || busIndex.size >= 65536) return null;
+        busIndex.set(busId, busIndex.size);
+        busTable.push(Uint8Array.of(encoded.length), encoded);
+      }
+    }
+    const tableLength = busTable.reduce((total, part) => total + part.length, 0);
+    const length = HEADER_SIZE + cursorBytes.length + tableLength + page.length * RECORD_SIZE;
+    const frame = new Uint8Array(4 + length);
+    const view = new DataView(frame.buffer);
+
+    view.setUint32(0, length, true);
+    frame.set(encoder.encode(FRAME_MAGIC), 4);
+    view.setUint8(8, FRAME_VERSION);
+    view.setUint8(9, hasMore ? FLAG_HAS_MORE : 0);
+    view.setUint16(10, busIndex.size, true);
+    view.setUint32(12, page.length, true);
+    view.setUint16(16, cursorBytes.length, true);
+    let position = 4 + HEADER_SIZE;
+    frame.set(cursorBytes, position);
+    position += cursorBytes.length;
+    for (const part of busTable) {
+      frame.set(part, position);
+      position += part.length;
+    }
+
+    for (const document of page) {
+      const timestamp = new Date(document.timestamp as string | number | Date).getTime();
+      if (Number.isNaN(timestamp)) return null;
+      view.setBigInt64(position, BigInt(timestamp), true);
+      view.setUint16(position + 8, busIndex.get(String(document.bus_id ?? ''))!, true);
+      for (const [field, fieldOffset, signed, scale] of SCALED_FIELDS) {
+        const value = document[field];
+        if (typeof value !== 'number') return null;
+        const scaled = Math.round(value * scale);
+        if (signed ? scaled < -32768 || scaled > 32767 : scaled < 0 || scaled > 65535) return null;
+        if (signed) view.setInt16(position + fieldOffset, scaled, true);
+        else view.setUint16(position + fieldOffset, scaled, true);
+      }
+      const mode = MODE_NAMES.indexOf(document.current_driving_mode as string);
+      const fault = FAULT_NAMES.indexOf(document.current_fault_type as string);
+      view.setUint8(position + MODE_OFFSET, mode < 0 ? UNKNOWN_CODE : mode);
+      view.setUint8(position + FAULT_OFFSET, fault < 0 ? UNKNOWN_CODE : fault);
+      position += RECORD_SIZE;
+    }
+    chunks.push(frame);
+  }
+
+  const payload = new Uint8Array(chunks.reduce((total, chunk) => total + chunk.length, 0));
+  let offset = 0;
+  for (const chunk of chunks) {
+    payload.set(chunk, offset);
+    offset += chunk.length;
+  }
+  return payload;
+}
@@ -1,16 +1,35 @@
 # train_model.py
+import argparse
+import hashlib
+import json
+import os
+import re
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import warnings
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 import joblib
+from joblib import Parallel, delayed
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+try:
+    import resource # Yalnızca Unix; en yüksek bellek kullanımını raporlamak için
+except ImportError:
+    resource = None
 
 # Next.js API'den geçmiş verileri çekmek için URL
 NEXTJS_GET_DATA_URL = "http://localhost:3000/api/can-data"
-MODEL_SAVE_PATH = "battery_fault_predictor_models.pkl" # Çoğul isim verdik, birden fazla model kaydediyoruz
+MODEL_SAVE_PATH = "battery_fault_predictor_model.pkl" # ai_predictor.py'deki MODEL_PATH ile aynı olmalı
+# Model dosyası şema sürümü; ai_predictor.py yalnızca bu sürüme kadar olan dosyaları yükler
+ARTIFACT_SCHEMA_VERSION = 2
 
 # Simülatördeki ve modeldeki arıza tipleri ile aynı olmalı
 # Sıra önemlidir, bu indeksler one-hot encoding ve fault_type_map için kullanılacaktır.
@@ -23,79 +42,315 @@ DRIVING_MODES = ['idle', 'accelerating', 'cruising', 'braking', 'uphill', 'downh
 MODE_COLUMNS = [f'mode_{mode}' for mode in DRIVING_MODES]
 
 
-def fetch_all_data():
-    # API'den tüm geçmiş veriyi çekmek için, API'deki limiti artırmak veya pagination kullanmak gerekebilir.
-    # Varsayılan Next.js API'miz 500 veri çekiyor. Daha fazla veri için App Router route.js'deki limiti değiştirin.
-    try:
-        response = requests.get(NEXTJS_GET_DATA_URL)
+# Sayfalı veri çekme ayarları
+FETCH_PAGE_SIZE = 5000 # can-data API'sinin izin verdiği en büyük sayfa boyutu
+PAGES_PER_SHARD = 20 # Bu kadar sayfa biriktikten sonra diske bir parça (shard) yazılır
+PREPROCESS_CHUNK_ROWS = 2_000_000 # Özellik mühendisliğinin tek seferde işlediği yaklaşık satır sayısı
+
+# --- Artımlı Eğitim Ayarları ---
+# Özellik/etiket matrisleri otobüs ve gün bölümü başına diske yazılır; anahtar, bölümün (pencere ve etiket
+# ufku payı dahil) ham verisinin özeti ile FEATURE_VERSION'dır. Yeniden çalıştırmada yalnızca yeni veya
+# değişen bölümler hesaplanır.
+FEATURE_VERSION = 1 # _engineer_fleet_features'ta özellik veya etiket tanımı değişirse artırılmalı
+FEATURE_CACHE_DIR = "feature_cache"
+FEATURE_PARTITION_MS = 24 * 60 * 60 * 1000 # Bölüm süresi: bir gün (UTC)
+WARM_START_TREES = 20 # --warm-start ile her çalıştırmada yeni bölümlerden eğitilip ormana eklenen ağaç sayısı
+MAX_FOREST_TREES = 300 # Orman bu boyutu aşacaksa sıcak başlatma yerine tüm veriyle yeniden eğitilir
+FIT_RSS_SAMPLE_SECONDS = 0.05 # Eğitim sırasında bellek (RSS) örnekleme aralığı
+
+# Kayan pencere ve etiketleme ufukları (5 saniyede bir veri)
+WINDOW_SIZE = 60 # Son 5 dakikalık veriyi kullanacağız (5s * 60 = 300s = 5dk)
+HORIZON_5MIN = 60 # 5 dakika sonrası
+HORIZON_30MIN = 360 # 30 dakika sonrası
+
+# Veri seti parçalarındaki sütunlar (can_simulator.py --synthesize ile aynı biçim)
+DATASET_COLUMNS = ["timestamp", "bus_index", "cell_voltage", "cell_min_temp", "cell_max_temp",
+                   "energy_efficiency", "current_driving_mode", "battery_soh", "current_fault_type"]
+
+# Modellerin kullandığı özellik sütunları
+FEATURES_COLS = [
+    'battery_soh_val', # SOH'un yeni adı
+    'voltage_mean', 'voltage_std',
+    'max_temp_mean', 'max_temp_std',
+    'min_temp_mean', 'min_temp_std',
+    'temp_diff_mean',
+    'efficiency_mean', 'efficiency_std'
+] + MODE_COLUMNS # One-Hot encoded mod sütunlarını ekle
+TARGET_COLS = ['target_5min_fault', 'target_30min_fault', 'target_fault_type_id']
+
+
+# --- Akışlı (Streaming) Veri Yükleme ---
+def iter_data_pages(since=None, page_size=FETCH_PAGE_SIZE, cursor=None):
+    # can-data koleksiyonunu _id cursor'ı ile sayfa sayfa dolaşır; her seferinde yalnızca bir sayfa bellekte tutulur.
+    # `since` verilirse yalnızca bu zaman damgasından sonraki kayıtlar okunur; `cursor` verilirse o kayıttan
+    # sonrası okunur. (sayfa, sayfadan sonraki cursor) çiftleri üretilir.
+    while True:
+        params = {"limit": page_size}
+        if cursor:
+            params["after_id"] = cursor
+        elif since:
+            params["since"] = since
+        response = requests.get(NEXTJS_GET_DATA_URL, params=params)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Veri çekilirken hata oluştu: {e}")
-        return []
-
-def preprocess_and_label_data(data):
-    df = pd.DataFrame(data)
-    if df.empty:
-        print("Uyarı: İşlenecek veri yok. Simülatörün veri gönderdiğinden emin olun.")
-        return None
-
-    # Zaman damgasını datetime objesine çevir ve bus_id ile zamana göre sırala
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values(by=['bus_id', 'timestamp']).reset_index(drop=True)
-
-    # Özellik mühendisliği için pencere boyutu
-    # Simülatör 5 saniyede bir veri gönderiyor, 5 dakika = 60 veri noktası
-    window_size = 60 # Son 5 dakikalık veriyi kullanacağız (5s * 60 = 300s = 5dk)
-
-    processed_dfs = []
-    for bus_id in df['bus_id'].unique():
-        bus_df = df[df['bus_id'] == bus_id].copy()
-
-        # Yeterli veri noktası yoksa bu otobüsü atla
-        if len(bus_df) < window_size + 360: # En az 30 dk + 5 dk veri (360 + 60)
-            # print(f"Uyarı: Otobüs {bus_id} için yeterli veri yok ({len(bus_df)} < {window_size + 360}), atlanıyor.")
-            continue
-
-        # Özellik Mühendisliği (Rolling Window Features)
-        bus_df['voltage_mean'] = bus_df['cell_voltage'].rolling(window=window_size).mean()
-        bus_df['voltage_std'] = bus_df['cell_voltage'].rolling(window=window_size).std()
-        bus_df['max_temp_mean'] = bus_df['cell_max_temp'].rolling(window=window_size).mean()
-        bus_df['max_temp_std'] = bus_df['cell_max_temp'].rolling(window=window_size).std()
-        bus_df['min_temp_mean'] = bus_df['cell_min_temp'].rolling(window=window_size).mean()
-        bus_df['min_temp_std'] = bus_df['cell_min_temp'].rolling(window=window_size).std()
-        bus_df['temp_diff_mean'] = (bus_df['cell_max_temp'] - bus_df['cell_min_temp']).rolling(window=window_size).mean()
-        bus_df['efficiency_mean'] = bus_df['energy_efficiency'].rolling(window=window_size).mean()
-        bus_df['efficiency_std'] = bus_df['energy_efficiency'].rolling(window=window_size).std()
-        
-        # SOH doğrudan özellik olarak kullanılacak
-        bus_df['battery_soh_val'] = bus_df['battery_soh'] # Çakışmaması için isim değiştirdik
-
-
-        # Kategorik sürüş modunu One-Hot Encoding yap
-        mode_dummies = pd.get_dummies(bus_df['current_driving_mode'], prefix='mode', dummy_na=False)
-        # Olası tüm mod sütunlarının oluştuğundan emin ol (eğitim ve tahmin tutarlılığı için)
-        for col in MODE_COLUMNS:
-            if col not in mode_dummies.columns:
-                mode_dummies[col] = 0
-        mode_dummies = mode_dummies[MODE_COLUMNS] # Sırayı koru
-        bus_df = pd.concat([bus_df, mode_dummies], axis=1)
-
-
-        # Arıza Etiketleme (target_5min_fault, target_30min_fault, target_fault_type_id)
-        # Simülatördeki 'current_fault_type' bilgisini kullanarak kaydırma (shift) yapıyoruz
-        # 5 dakika sonrası (60 adım) ve 30 dakika sonrası (360 adım)
-        bus_df['target_5min_fault'] = bus_df['current_fault_type'].shift(-60).apply(lambda x: 1 if x != "normal" else 0)
-        bus_df['target_30min_fault'] = bus_df['current_fault_type'].shift(-360).apply(lambda x: 1 if x != "normal" else 0)
-        
-        # Anlık arıza tipi için sayısal etiketleme
-        bus_df['target_fault_type_id'] = bus_df['current_fault_type'].map(FAULT_TYPE_MAP)
-
-        # Eksik değerleri temizle (rolling window ve shift sonrası oluşan NaN'lar)
-        bus_df = bus_df.dropna()
-        
-        processed_dfs.append(bus_df)
-    
+        page = response.json()
+        cursor = page.get("next_cursor") or cursor
+        if page["data"]:
+            yield page["data"], cursor
+        if not page.get("has_more"):
+            return
+
+
+def page_to_columns(page, bus_codes):
+    # Bir JSON sayfasını tipli NumPy sütunlarına çevirir. Metin alanları tamsayı koduna dönüştürülür;
+    # yeni görülen otobüsler bus_codes sözlüğüne eklenir. Bilinmeyen mod/arıza tipi -1 olarak kodlanır.
+    mode_codes = {mode: i for i, mode in enumerate(DRIVING_MODES)}
+    bus_index = np.empty(len(page), dtype=np.int32)
+    for i, record in enumerate(page):
+        bus_index[i] = bus_codes.setdefault(record.get("bus_id"), len(bus_codes))
+
+    timestamps = pd.to_datetime([record["timestamp"] for record in page], utc=True, format="ISO8601")
+    return {
+        "timestamp": timestamps.as_unit("ms").asi8,
+        "bus_index": bus_index,
+        "cell_voltage": np.array([record["cell_voltage"] for record in page], dtype=np.float32),
+        "cell_min_temp": np.array([record["cell_min_temp"] for record in page], dtype=np.float32),
+        "cell_max_temp": np.array([record["cell_max_temp"] for record in page], dtype=np.float32),
+        "energy_efficiency": np.array([record["energy_efficiency"] for record in page], dtype=np.float32),
+        "current_driving_mode": np.array([mode_codes.get(record.get("current_driving_mode"), -1) for record in page], dtype=np.int8),
+        "battery_soh": np.array([record["battery_soh"] for record in page], dtype=np.float32),
+        "current_fault_type": np.array([FAULT_TYPE_MAP.get(record.get("current_fault_type"), -1) for record in page], dtype=np.int8),
+    }
+
+
+def write_dataset_shard(out_dir, shard_index, columns, bus_count):
+    # Sütunları otobüs ve zamana göre sıralayıp (otobüs-öncelikli) ayrı .npy dosyaları olarak yazar.
+    # bus_offsets.npy, her otobüsün parçadaki satır aralığını verir: [offsets[b], offsets[b + 1])
+    order = np.lexsort((columns["timestamp"], columns["bus_index"]))
+    shard_dir = os.path.join(out_dir, f"shard_{shard_index:05d}")
+    os.makedirs(shard_dir, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(shard_dir, f"{name}.npy"), values[order])
+    bus_offsets = np.searchsorted(columns["bus_index"][order], np.arange(bus_count + 1))
+    np.save(os.path.join(shard_dir, "bus_offsets.npy"), bus_offsets)
+    return os.path.basename(shard_dir)
+
+
+def download_dataset(out_dir, since=None, page_size=FETCH_PAGE_SIZE, pages_per_shard=PAGES_PER_SHARD):
+    # API'deki geçmişi ham JSON'u hiçbir zaman bütünüyle tutmadan diske sütunlu parçalar olarak indirir.
+    # Çıktı, load_dataset_files/iter_bus_frames ile okunabilen veri seti dizinidir. Dizinde daha önce
+    # indirilmiş bir veri seti varsa kayıtlı cursor'dan devam edilir ve yalnızca yeni kayıtlar yeni parçalara yazılır.
+    os.makedirs(out_dir, exist_ok=True)
+    metadata_path = os.path.join(out_dir, "metadata.json")
+    previous = None
+    if os.path.exists(metadata_path):
+        with open(metadata_path) as f:
+            previous = json.load(f)
+        if previous.get("format") != "npy" or not previous.get("cursor"):
+            raise ValueError(f"'{out_dir}' devam ettirilebilir bir indirme dizini değil (cursor yok).")
+    bus_codes = {bus_id: i for i, bus_id in enumerate(previous["bus_ids"])} if previous else {}
+    shard_files = list(previous["shards"]) if previous else []
+    cursor = previous["cursor"] if previous else None
+    pending = []
+    row_count = 0
+
+    def flush():
+        columns = {name: np.concatenate([page[name] for page in pending]) for name in DATASET_COLUMNS}
+        shard_files.append(write_dataset_shard(out_dir, len(shard_files), columns, len(bus_codes)))
+        pending.clear()
+
+    for page, cursor in iter_data_pages(since, page_size, cursor):
+        pending.append(page_to_columns(page, bus_codes))
+        row_count += len(page)
+        if len(pending) >= pages_per_shard:
+            flush()
+    if pending:
+        flush()
+
+    metadata = {
+        "format": "npy",
+        "bus_ids": list(bus_codes),
+        "driving_modes": DRIVING_MODES,
+        "fault_types": FAULT_TYPES,
+        "columns": DATASET_COLUMNS,
+        "shards": shard_files,
+        "cursor": cursor, # Bir sonraki indirme bu kayıttan sonrasını ister
+    }
+    # Yeni parçalar yazıldıktan sonra metadata yerine konur; yarıda kalan indirme eski veri setini bozmaz
+    with open(f"{metadata_path}.tmp", "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(f"{metadata_path}.tmp", metadata_path)
+    print(f"{row_count} {'yeni ' if previous else ''}kayıt indirildi; '{out_dir}': {len(bus_codes)} otobüs, {len(shard_files)} parça.")
+    return metadata
+
+
+def _read_shard_columns(data_dir, shard, metadata):
+    # Bir parçanın sütunlarını (npy ise bellek eşlemeli) ve otobüs başına satır aralıklarını döndürür
+    shard_path = os.path.join(data_dir, shard)
+    if metadata["format"] == "parquet":
+        frame = pd.read_parquet(shard_path)
+        columns = {
+            "timestamp": frame["timestamp"].dt.tz_convert("UTC").dt.as_unit("ms").astype("int64").to_numpy(),
+            "bus_index": pd.Categorical(frame["bus_id"], categories=metadata["bus_ids"]).codes.astype(np.int32),
+            "current_driving_mode": pd.Categorical(frame["current_driving_mode"], categories=metadata["driving_modes"]).codes,
+            "current_fault_type": pd.Categorical(frame["current_fault_type"], categories=metadata["fault_types"]).codes,
+        }
+        for name in ["cell_voltage", "cell_min_temp", "cell_max_temp", "energy_efficiency", "battery_soh"]:
+            columns[name] = frame[name].to_numpy()
+    else:
+        columns = {name: np.load(os.path.join(shard_path, f"{name}.npy"), mmap_mode='r') for name in DATASET_COLUMNS}
+        offsets_path = os.path.join(shard_path, "bus_offsets.npy")
+        if os.path.exists(offsets_path):
+            return columns, None, np.load(offsets_path)
+
+    # Otobüs-öncelikli sıralı olmayan parçalar için sıralama indeksi bir kez hesaplanır
+    order = np.argsort(columns["bus_index"], kind="stable")
+    bus_offsets = np.searchsorted(columns["bus_index"][order], np.arange(len(metadata["bus_ids"]) + 1))
+    return columns, order, bus_offsets
+
+
+def _columns_to_frame(columns, metadata):
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(columns["timestamp"], unit="ms", utc=True),
+        "bus_id": pd.Categorical.from_codes(columns["bus_index"], categories=metadata["bus_ids"]),
+        "cell_voltage": columns["cell_voltage"],
+        "cell_min_temp": columns["cell_min_temp"],
+        "cell_max_temp": columns["cell_max_temp"],
+        "energy_efficiency": columns["energy_efficiency"],
+        "current_driving_mode": pd.Categorical.from_codes(columns["current_driving_mode"], categories=metadata["driving_modes"]),
+        "battery_soh": columns["battery_soh"],
+        "current_fault_type": pd.Categorical.from_codes(columns["current_fault_type"], categories=metadata["fault_types"]),
+    })
+
+
+def load_dataset_files(data_dir):
+    # Veri seti dizinini (npy veya parquet parçaları) API verisiyle aynı sütunlara sahip tek bir DataFrame olarak okur.
+    # Metin alanları kategorik (kod + sözlük) tutulur. Büyük veri setleri için iter_bus_frames tercih edilmelidir.
+    with open(os.path.join(data_dir, "metadata.json")) as f:
+        metadata = json.load(f)
+
+    frames = []
+    for shard in metadata["shards"]:
+        columns, _, _ = _read_shard_columns(data_dir, shard, metadata)
+        frames.append(_columns_to_frame(columns, metadata))
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_bus_frames(data_dir):
+    # Veri setini otobüs otobüs okur: her adımda yalnızca bir otobüsün tüm parçalardaki satırları birleştirilir.
+    with open(os.path.join(data_dir, "metadata.json")) as f:
+        metadata = json.load(f)
+
+    shards = [_read_shard_columns(data_dir, shard, metadata) for shard in metadata["shards"]]
+    for bus_index, bus_id in enumerate(metadata["bus_ids"]):
+        pieces = []
+        for columns, order, bus_offsets in shards:
+            if bus_index + 1 >= len(bus_offsets):
+                continue # Bu otobüs parça yazıldıktan sonra görülmüş
+            start, end = bus_offsets[bus_index], bus_offsets[bus_index + 1]
+            if start == end:
+                continue
+            if order is None:
+                pieces.append({name: np.asarray(values[start:end]) for name, values in columns.items()})
+            else:
+                rows = order[start:end]
+                pieces.append({name: np.asarray(values)[rows] for name, values in columns.items()})
+        if pieces:
+            bus_columns = {name: np.concatenate([piece[name] for piece in pieces]) for name in DATASET_COLUMNS}
+            yield bus_id, _columns_to_frame(bus_columns, metadata)
+
+
+def _engineer_fleet_features(df, return_groups=False, labeled_only=True):
+    # Tüm filonun verisinden özellik ve etiket sütunlarını tek vektörel geçişte üretir.
+    # Veri bir kez (otobüs, zaman) sırasına dizilir; otobüs sınırları grup başlangıç indeksleriyle bulunur.
+    # Kayan istatistikler tüm dizi üzerinde tek rolling çağrısıyla hesaplanır, penceresi başka bir otobüse
+    # taşan satırlar atılır. Etiketler tamsayı kodlu arıza dizisinin grup içi kaydırılmasıyla bulunur.
+    # return_groups=True ise her çıktı satırının bus_id ve zaman damgası (int64, ms) değerleri de döndürülür.
+    # labeled_only=False ise (backtest.py) etiket ufku beklenmez: penceresi dolu her satır döner; etiket
+    # sütunları ufku grup sonunu aşan satırlarda anlamsızdır, target_fault_type_id ise her satırda o anki arızadır.
+    window_size = WINDOW_SIZE
+
+    bus_codes, bus_ids = pd.factorize(df['bus_id'], sort=True)
+    timestamps = pd.DatetimeIndex(pd.to_datetime(df['timestamp'])).as_unit("ms").asi8 # Sıralama için int64 (ms)
+    order = np.lexsort((timestamps, bus_codes))
+    bus_codes = bus_codes[order]
+
+    # Grup (otobüs) sınırları ve her satırın kendi grubundaki konumu
+    n_rows = len(order)
+    group_starts = np.flatnonzero(np.r_[True, bus_codes[1:] != bus_codes[:-1]])
+    group_lengths = np.diff(np.r_[group_starts, n_rows])
+    row_group_start = np.repeat(group_starts, group_lengths)
+    row_group_length = np.repeat(group_lengths, group_lengths)
+    position = np.arange(n_rows) - row_group_start
+
+    cell_voltage = df['cell_voltage'].to_numpy(dtype=np.float64)[order]
+    cell_max_temp = df['cell_max_temp'].to_numpy(dtype=np.float64)[order]
+    cell_min_temp = df['cell_min_temp'].to_numpy(dtype=np.float64)[order]
+    energy_efficiency = df['energy_efficiency'].to_numpy(dtype=np.float64)[order]
+    channels = pd.DataFrame({
+        'voltage': cell_voltage,
+        'max_temp': cell_max_temp,
+        'min_temp': cell_min_temp,
+        'temp_diff': cell_max_temp - cell_min_temp,
+        'efficiency': energy_efficiency,
+    })
+    rolling = channels.rolling(window=window_size)
+    rolling_mean = rolling.mean()
+    rolling_std = rolling[['voltage', 'max_temp', 'min_temp', 'efficiency']].std()
+
+    # Arıza tipleri ve sürüş modları tamsayı kodlarına çevrilir (bilinmeyen değerler -1)
+    fault_codes = pd.Categorical(df['current_fault_type'], categories=FAULT_TYPES).codes[order]
+    mode_codes = pd.Categorical(df['current_driving_mode'], categories=DRIVING_MODES).codes[order]
+
+    # Arıza Etiketleme: grup içinde 60 ve 360 adım sonraki arıza durumu
+    target_5min = np.zeros(n_rows, dtype=np.int8)
+    target_5min[:-HORIZON_5MIN] = fault_codes[HORIZON_5MIN:] > FAULT_TYPE_MAP["normal"]
+    target_30min = np.zeros(n_rows, dtype=np.int8)
+    target_30min[:-HORIZON_30MIN] = fault_codes[HORIZON_30MIN:] > FAULT_TYPE_MAP["normal"]
+
+    # Geçerli satırlar: yeterli veri olan otobüsler, penceresi dolu, iki ufkun da grup içinde kaldığı,
+    # arıza tipi ve ölçümleri bilinen satırlar
+    valid = (
+        (position >= window_size - 1)
+        & ~rolling_mean.isna().any(axis=1).to_numpy()
+        & ~rolling_std.isna().any(axis=1).to_numpy()
+        & ~np.isnan(df['battery_soh'].to_numpy(dtype=np.float64)[order])
+    )
+    if labeled_only:
+        valid &= (
+            (row_group_length >= window_size + HORIZON_30MIN) # En az 30 dk + 5 dk veri (360 + 60)
+            & (position + HORIZON_30MIN < row_group_length)
+            & (fault_codes >= 0)
+        )
+
+    result = pd.DataFrame({
+        'battery_soh_val': df['battery_soh'].to_numpy(dtype=np.float64)[order],
+        'voltage_mean': rolling_mean['voltage'].to_numpy(),
+        'voltage_std': rolling_std['voltage'].to_numpy(),
+        'max_temp_mean': rolling_mean['max_temp'].to_numpy(),
+        'max_temp_std': rolling_std['max_temp'].to_numpy(),
+        'min_temp_mean': rolling_mean['min_temp'].to_numpy(),
+        'min_temp_std': rolling_std['min_temp'].to_numpy(),
+        'temp_diff_mean': rolling_mean['temp_diff'].to_numpy(),
+        'efficiency_mean': rolling_mean['efficiency'].to_numpy(),
+        'efficiency_std': rolling_std['efficiency'].to_numpy(),
+    })
+    # Kategorik sürüş modunu One-Hot Encoding yap (bilinmeyen mod tüm sütunlarda 0)
+    mode_one_hot = mode_codes[:, None] == np.arange(len(DRIVING_MODES))
+    for i, col in enumerate(MODE_COLUMNS):
+        result[col] = mode_one_hot[:, i].astype(np.float64)
+    result['target_5min_fault'] = target_5min
+    result['target_30min_fault'] = target_30min
+    result['target_fault_type_id'] = fault_codes
+
+    if return_groups:
+        return result[valid].reset_index(drop=True), bus_ids[bus_codes[valid]], timestamps[order][valid]
+    return result[valid].reset_index(drop=True)
+
+
+def _finalize_training_data(processed_dfs):
     if not processed_dfs:
         print("Uyarı: Hiçbir otobüs için yeterli işlenmiş veri bulunamadı.")
         return None
@@ -103,21 +358,14 @@ def preprocess_and_label_data(data):
     final_df = pd.concat(processed_dfs)
 
     # Özellik sütunlarını tanımla
-    features_cols = [
-        'battery_soh_val', # SOH'un yeni adı
-        'voltage_mean', 'voltage_std', 
-        'max_temp_mean', 'max_temp_std', 
-        'min_temp_mean', 'min_temp_std', 
-        'temp_diff_mean', 
-        'efficiency_mean', 'efficiency_std'
-    ] + MODE_COLUMNS # One-Hot encoded mod sütunlarını ekle
-    
+    features_cols = list(FEATURES_COLS)
+
     # Hedef değişkenler için gerekli sütunların varlığını kontrol et
-    required_targets = ['target_5min_fault', 'target_30min_fault', 'target_fault_type_id']
+    required_targets = TARGET_COLS
     if not all(col in final_df.columns for col in required_targets):
         print("Hata: Gerekli hedef sütunları bulunamadı. Etiketleme mantığınızı veya veri miktarını kontrol edin.")
         return None
-    
+
     # Features_cols içinde eksik sütun varsa hata ver veya doldur
     for col in features_cols:
         if col not in final_df.columns:
@@ -125,24 +373,510 @@ def preprocess_and_label_data(data):
             return None
 
     X = final_df[features_cols]
-    y_5min = final_df['target_5min_fault']
-    y_30min = final_df['target_30min_fault']
-    y_fault_type = final_df['target_fault_type_id']
+    y_5min = final_df['target_5min_fault'].astype(int)
+    y_30min = final_df['target_30min_fault'].astype(int)
+    y_fault_type = final_df['target_fault_type_id'].astype(int)
 
     return X, y_5min, y_30min, y_fault_type, features_cols
 
 
-def train_model():
-    print("Model eğitimi için veri çekiliyor...")
-    all_data = fetch_all_data()
-    
-    processed_data = preprocess_and_label_data(all_data)
+def preprocess_and_label_data(data):
+    df = pd.DataFrame(data)
+    if df.empty:
+        print("Uyarı: İşlenecek veri yok. Simülatörün veri gönderdiğinden emin olun.")
+        return None
+
+    processed_df = _engineer_fleet_features(df)
+    return _finalize_training_data([processed_df] if len(processed_df) else [])
+
+
+def preprocess_bus_frames(bus_frames, chunk_rows=PREPROCESS_CHUNK_ROWS):
+    # iter_bus_frames'ten gelen otobüs parçalarını yaklaşık chunk_rows satırlık gruplar halinde
+    # vektörel olarak işler; bellekte yalnızca özellik ve hedef sütunları (float32) birikir.
+    processed_dfs = []
+    pending = []
+    pending_rows = 0
+
+    def flush():
+        processed_df = _engineer_fleet_features(pd.concat(pending, ignore_index=True))
+        if len(processed_df):
+            processed_dfs.append(processed_df.astype(np.float32))
+        pending.clear()
+
+    for bus_id, bus_df in bus_frames:
+        pending.append(bus_df)
+        pending_rows += len(bus_df)
+        if pending_rows >= chunk_rows:
+            flush()
+            pending_rows = 0
+    if pending:
+        flush()
+
+    return _finalize_training_data(processed_dfs)
+
+
+# --- Bölümlenmiş Özellik Önbelleği ---
+# Bir bölümün satırlarının özellikleri, bölümden önceki WINDOW_SIZE - 1 ve sonraki HORIZON_30MIN satıra da
+# bağlıdır (kayan pencere ve etiket ufku). Bu pay satırları bölümle birlikte hem özete girer hem de hesaplamada
+# bölümün önüne/arkasına eklenir. Pay satırları hiçbir zaman geçerli satır olmadığından (önünde pencere,
+# arkasında ufuk yetmez) hesaplanan geçerli satırlar tam olarak bölümün tüm veriyle hesaplanan satırlarıdır.
+# Böylece yeni veri geldiğinde yalnızca son bölüm ve etiketleri değişen bir önceki bölüm yeniden hesaplanır.
+CACHE_COLUMNS = FEATURES_COLS + TARGET_COLS
+FEATURE_CACHE_KEY = json.dumps([FEATURE_VERSION, WINDOW_SIZE, HORIZON_5MIN, HORIZON_30MIN, CACHE_COLUMNS,
+                                DRIVING_MODES, FAULT_TYPES]) # Özete giren tanım bilgisi
+HASHED_VALUE_COLUMNS = ["cell_voltage", "cell_min_temp", "cell_max_temp", "energy_efficiency", "battery_soh"]
+
+
+def _bus_cache_dir(cache_dir, bus_id):
+    # Dosya sistemi için güvenli ve çakışmasız otobüs dizini adı
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", str(bus_id))[:64]
+    return os.path.join(cache_dir, f"{safe_name}-{hashlib.md5(str(bus_id).encode('utf-8')).hexdigest()[:8]}")
+
+
+def _bus_partitions(bus_df):
+    # Zamana göre sıralanmış otobüs verisini gün bölümlerine ayırır ve her bölüm için pay dahil özet üretir.
+    # (gün, bölüm başı, bölüm sonu, pay başı, pay sonu, özet) listesi döner; aralıklar satır indeksleridir.
+    timestamps = pd.DatetimeIndex(bus_df['timestamp']).as_unit("ms").asi8
+    days = timestamps // FEATURE_PARTITION_MS
+    hashed = [timestamps] + [bus_df[name].to_numpy(dtype=np.float64) for name in HASHED_VALUE_COLUMNS] + [
+        pd.Categorical(bus_df['current_driving_mode'], categories=DRIVING_MODES).codes,
+        pd.Categorical(bus_df['current_fault_type'], categories=FAULT_TYPES).codes,
+    ]
+    n_rows = len(bus_df)
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    ends = np.r_[starts[1:], n_rows]
+    partitions = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        halo_start, halo_end = max(0, start - (WINDOW_SIZE - 1)), min(n_rows, end + HORIZON_30MIN)
+        digest = hashlib.blake2b(FEATURE_CACHE_KEY.encode("utf-8"), digest_size=16)
+        for values in hashed:
+            digest.update(np.ascontiguousarray(values[halo_start:halo_end]).tobytes())
+        partitions.append((int(days[start]), start, end, halo_start, halo_end, digest.hexdigest()))
+    return partitions
+
+
+def _save_partition(path, matrix):
+    tmp_path = f"{path}.tmp.npy"
+    np.save(tmp_path, matrix)
+    os.replace(tmp_path, path)
+
+
+def preprocess_bus_frames_cached(bus_frames, cache_dir=FEATURE_CACHE_DIR, chunk_rows=PREPROCESS_CHUNK_ROWS):
+    # preprocess_bus_frames'in önbellekli karşılığı. Önbellekte aynı özetli bölüm varsa diskten okunur, yoksa
+    # bölüm (payıyla) bekleyen gruba eklenir ve gruplar yaklaşık chunk_rows satırda bir vektörel hesaplanıp yazılır.
+    # (preprocess_bus_frames ile aynı çıktı, bu çalıştırmada hesaplanan satırların maskesi) döner.
+    os.makedirs(cache_dir, exist_ok=True)
+    slots = [] # (otobüs, gün) sırasıyla bölüm matrisleri; sıra önbellek durumundan bağımsızdır
+    computed = [] # slots ile hizalı: bölüm bu çalıştırmada mı hesaplandı
+    pending = [] # (slot indeksi, pay dahil bölüm DataFrame'i, hedef dosya, eski dosyalar)
+    pending_rows = 0
+    stats = {"cached": 0, "computed": 0, "stale_removed": 0}
+
+    def flush():
+        segments = pd.concat([segment for _, segment, _, _ in pending], ignore_index=True)
+        processed_df, groups, _ = _engineer_fleet_features(segments, return_groups=True)
+        matrix = processed_df[CACHE_COLUMNS].to_numpy(dtype=np.float32)
+        bounds = np.searchsorted(groups, np.arange(len(pending) + 1)) # Satırlar grup (slot sırası) düzenindedir
+        for k, (slot, _, path, stale_paths) in enumerate(pending):
+            slots[slot] = matrix[bounds[k]:bounds[k + 1]]
+            _save_partition(path, slots[slot])
+            for stale_path in stale_paths:
+                os.remove(stale_path)
+            stats["stale_removed"] += len(stale_paths)
+        stats["computed"] += len(pending)
+        pending.clear()
+
+    for bus_id, bus_df in bus_frames:
+        bus_df = bus_df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        bus_dir = _bus_cache_dir(cache_dir, bus_id)
+        os.makedirs(bus_dir, exist_ok=True)
+        existing = {}
+        for file_name in os.listdir(bus_dir):
+            day, _, _ = file_name.partition("_")
+            existing.setdefault(day, []).append(os.path.join(bus_dir, file_name))
+
+        for day, start, end, halo_start, halo_end, digest in _bus_partitions(bus_df):
+            path = os.path.join(bus_dir, f"{day}_{digest}.npy")
+            slots.append(None)
+            if os.path.exists(path):
+                slots[-1] = np.load(path)
+                computed.append(False)
+                stats["cached"] += 1
+                continue
+            # Pending segment: her bölüm kendi grubu olur (bus_id yerine sıra numarası, sıralama düzenini korur)
+            segment = bus_df.iloc[halo_start:halo_end].assign(bus_id=len(pending))
+            stale_paths = [other for other in existing.get(str(day), []) if other != path]
+            pending.append((len(slots) - 1, segment, path, stale_paths))
+            computed.append(True)
+            pending_rows += len(segment)
+            if pending_rows >= chunk_rows:
+                flush()
+                pending_rows = 0
+    if pending:
+        flush()
+
+    print(f"Özellik önbelleği '{cache_dir}': {stats['cached']} bölüm önbellekten okundu, "
+          f"{stats['computed']} bölüm hesaplandı ({stats['stale_removed']} eski sürüm silindi).")
+    if not slots:
+        return _finalize_training_data([]), np.zeros(0, dtype=bool)
+    matrix = np.concatenate(slots)
+    new_rows = np.repeat(np.array(computed), [len(part) for part in slots])
+    processed_df = pd.DataFrame(matrix, columns=CACHE_COLUMNS)
+    return _finalize_training_data([processed_df] if len(processed_df) else []), new_rows
+
+
+# --- Model Eğitimi ---
+# (model anahtarı, hedef adı, rapor başlığı); aynı özellik matrisi üç hedef için ortak kullanılır
+MODEL_TARGETS = [
+    ('model_5min', 'y_5min', "5 Dakika Sonra Arıza Tahmin Modeli Performansı"),
+    ('model_30min', 'y_30min', "30 Dakika Sonra Arıza Tahmin Modeli Performansı"),
+    ('model_fault_type', 'y_fault_type', "Anlık Arıza Tipi Tahmin Modeli Performansı"),
+]
+# Çok çıktılı modelin çıktı sırası (ai_predictor.py bu sırayı 'multi_output_targets' anahtarından okur)
+MULTI_OUTPUT_TARGETS = ['y_5min', 'y_30min', 'y_fault_type']
+
+
+def _peak_rss_mb():
+    # Sürecin şimdiye kadarki en yüksek bellek kullanımı (MB); resource modülü olmayan platformlarda None
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024 # macOS bayt, Linux KB döner
+
+
+def _proc_status_mb(field):
+    # /proc/self/status'taki VmRSS (anlık) veya VmHWM (en yüksek) değeri (MB); Linux dışında None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class _FitMemorySampler:
+    # Eğitim boyunca anlık RSS'i (VmRSS) arka plan iş parçacığında örnekler; süreç durumuna dokunmaz. loky
+    # işçileri yeniden kullanıldığından ve eğitim ana süreçte de çalışabildiğinden ru_maxrss/VmHWM önceki
+    # işlerin zirvesini içerir. Örnekleme aralığından kısa ani artışlar kaçabilir.
+
+    def __init__(self, interval=FIT_RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.start_rss_mb = None
+        self.peak_rss_mb = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.start_rss_mb = self.peak_rss_mb = _proc_status_mb("VmRSS")
+        if self.start_rss_mb is not None:
+            self.thread = threading.Thread(target=self._sample, name="fit-rss-sampler", daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self._record(_proc_status_mb("VmRSS"))
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            self._record(_proc_status_mb("VmRSS"))
+
+    def _record(self, rss_mb):
+        if rss_mb is not None and self.peak_rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+
+    def result(self):
+        # Bu eğitim sırasındaki en yüksek RSS ve başlangıca göre artış; /proc olmayan platformlarda sürecin
+        # ömrü boyunca en yüksek RSS döner (rss_scope="process").
+        if self.start_rss_mb is not None:
+            return {"peak_rss_mb": self.peak_rss_mb, "rss_delta_mb": self.peak_rss_mb - self.start_rss_mb, "rss_scope": "fit"}
+        return {"peak_rss_mb": _peak_rss_mb(), "rss_delta_mb": None, "rss_scope": "process"}
+
+
+def _fit_forest(X_train, y_train, X_test, n_jobs):
+    # Ayrı bir süreçte çalışır; X_train/X_test salt okunur bellek eşlemeli dizilerdir (süreçlere kopyalanmaz)
+    started = time.perf_counter()
+    model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced', n_jobs=n_jobs)
+    with _FitMemorySampler() as memory:
+        model.fit(X_train, y_train)
+    predictions = model.predict(X_test)
+    model.set_params(n_jobs=None) # Tahmin servisinde tek satırlık çağrılar için iş parçacığı havuzu açılmasın
+    return {
+        "model": model,
+        "predictions": predictions,
+        "seconds": time.perf_counter() - started,
+        **memory.result(),
+    }
+
+
+def _grow_forest(model, X_train, y_train, X_test, n_trees, n_jobs):
+    # Sıcak başlatma: mevcut ağaçlar korunur, yalnızca yeni verilerle n_trees yeni ağaç eğitilip ormana eklenir
+    started = time.perf_counter()
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_trees, n_jobs=n_jobs)
+    with warnings.catch_warnings(), _FitMemorySampler() as memory:
+        # class_weight="balanced" yeni ağaçlarda yalnızca yeni bölümlerin sınıf dağılımına göre hesaplanır; bilerek
+        warnings.filterwarnings("ignore", message="class_weight presets", category=UserWarning)
+        model.fit(X_train, y_train)
+    predictions = model.predict(X_test)
+    model.set_params(warm_start=False, n_jobs=None)
+    return {
+        "model": model,
+        "predictions": predictions,
+        "seconds": time.perf_counter() - started,
+        **memory.result(),
+    }
+
+
+def warm_start_compatible(model, y, n_features, n_trees=WARM_START_TREES):
+    # Yeni ağaçların mevcut ormana eklenebilmesi için sınıf kümeleri (her çıktı için) ve özellik sayısı aynı
+    # olmalıdır; aksi halde ağaçların olasılık dizileri birleştirilemez. Uyumsuzluk nedeni veya None döner.
+    if model is None:
+        return "mevcut model yok"
+    if getattr(model, 'n_features_in_', n_features) != n_features:
+        return "özellik sayısı farklı"
+    if len(model.estimators_) + n_trees > MAX_FOREST_TREES:
+        return f"orman {MAX_FOREST_TREES} ağaç sınırını aşacak"
+    y = np.asarray(y)
+    model_classes = [model.classes_] if model.n_outputs_ == 1 else list(model.classes_)
+    new_classes = [np.unique(y)] if y.ndim == 1 else [np.unique(y[:, k]) for k in range(y.shape[1])]
+    if len(model_classes) != len(new_classes) or not all(
+            np.array_equal(old, new) for old, new in zip(model_classes, new_classes)):
+        return "yeni verideki sınıf kümesi modelinkinden farklı"
+    return None
+
+
+def _target_names(target_key, labels):
+    if target_key == 'y_fault_type':
+        # FAULT_TYPES'ın sayısal indeksleri ile string karşılıklarını eşleştirin
+        return [FAULT_TYPES[int(label)] for label in labels]
+    return ["Normal" if label == 0 else "Arıza" for label in labels]
+
+
+def train_models_parallel(X, targets, n_jobs=-1, test_size=0.2, random_state=42, multi_output=False,
+                          base_models=None, warm_start_trees=WARM_START_TREES):
+    # Üç hedefi aynı eğitim/test ayrımı üzerinde paralel eğitir. multi_output=True ise üç hedefi birlikte
+    # tahmin eden tek bir çok çıktılı orman ('model_multi') da aynı işlerin yanında eğitilir.
+    # base_models verilirse ({model anahtarı: orman}) yalnızca bu modeller eğitilir: her birine X'ten
+    # warm_start_trees yeni ağaç eklenir (uyumluluk warm_start_compatible ile önceden kontrol edilmelidir).
+    # X bir kez float32 olarak geçici bir dosyaya yazılıp bellek eşlemeli açılır; işçi süreçler aynı
+    # sayfaları paylaşır. Her ormanın ağaçları da kendi sürecinde n_jobs iş parçacığıyla kurulur.
+    # targets: {hedef adı: etiket dizisi}; dönüş: {model anahtarı: (model veya None, y_test, tahminler)}
+    total_cores = (os.cpu_count() or 1) if n_jobs in (None, -1) else max(1, n_jobs)
+    X = np.ascontiguousarray(X, dtype=np.float32)
+
+    # Tek ayrım: arıza tipine göre katmanlı (her sınıfta en az 2 örnek varsa), böylece ikili hedefler de dengeli kalır
+    stratify = targets['y_fault_type']
+    class_counts = np.bincount(stratify)
+    if (class_counts[class_counts > 0] < 2).any():
+        stratify = None
+    train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=test_size, random_state=random_state, stratify=stratify)
+
+    trainable = [(key, target_key) for key, target_key, _ in MODEL_TARGETS if np.unique(targets[target_key]).size > 1]
+    if multi_output:
+        targets = dict(targets, y_multi=np.column_stack([targets[target_key] for target_key in MULTI_OUTPUT_TARGETS]))
+        trainable.append(('model_multi', 'y_multi'))
+    if base_models is not None:
+        trainable = [(key, target_key) for key, target_key in trainable if key in base_models]
+    process_count = max(1, min(len(trainable), total_cores))
+    threads_per_model = max(1, total_cores // process_count)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="train_features_") as mmap_dir:
+        X_train_path = os.path.join(mmap_dir, "X_train.npy")
+        X_test_path = os.path.join(mmap_dir, "X_test.npy")
+        np.save(X_train_path, X[train_idx])
+        np.save(X_test_path, X[test_idx])
+        X_train = np.load(X_train_path, mmap_mode='r')
+        X_test = np.load(X_test_path, mmap_mode='r')
+
+        fitted = Parallel(n_jobs=process_count, backend="loky")(
+            delayed(_grow_forest)(base_models[key], X_train, targets[target_key][train_idx], X_test,
+                                  warm_start_trees, threads_per_model)
+            if base_models is not None else
+            delayed(_fit_forest)(X_train, targets[target_key][train_idx], X_test, threads_per_model)
+            for key, target_key in trainable
+        )
+
+    for (key, target_key), result in zip(trainable, fitted):
+        results[key] = result
+        results[key]["y_test"] = targets[target_key][test_idx]
+    print(f"Eğitim {process_count} süreç x {threads_per_model} iş parçacığı ile yapıldı.")
+    return results
+
+
+def compile_forest(model):
+    # RandomForestClassifier'ı bitişik NumPy düğüm dizilerine çevirir; ai_predictor.FlatForest bu diziler
+    # üzerinde çok sayıda satır ve ağacı aynı anda dolaşır. Tüm ağaçların düğümleri tek dizide art arda
+    # durur (roots: her ağacın kök indeksi). Yapraklarda sol/sağ çocuk düğümün kendisidir, böylece
+    # dolaşım yaprağa ulaşınca sabit kalır. value, sklearn'deki gibi normalize edilmiş yaprak olasılıklarıdır.
+    if model is None:
+        return None
+
+    n_outputs = model.n_outputs_
+    classes = [model.classes_] if n_outputs == 1 else list(model.classes_)
+    max_classes = max(len(output_classes) for output_classes in classes)
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    node_offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + node_offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + node_offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+
+        # DecisionTreeClassifier.predict_proba ile aynı normalizasyon (çıktı başına)
+        proba = np.zeros((tree.node_count, n_outputs, max_classes))
+        for k, output_classes in enumerate(classes):
+            output_value = tree.value[:, k, :len(output_classes)]
+            normalizer = output_value.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            proba[:, k, :len(output_classes)] = output_value / normalizer[:, np.newaxis]
+        values.append(proba)
+
+        roots.append(node_offset)
+        node_offset += tree.node_count
+
+    return {
+        "feature": np.concatenate(features).astype(np.intp),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts).astype(np.intp),
+        "right": np.concatenate(rights).astype(np.intp),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.intp),
+        "classes": classes,
+        "n_outputs": n_outputs,
+    }
+
+
+def _inference_latency_us(predict_fns, X_sample, repeats=20):
+    # Verilen tahmin fonksiyonlarının (art arda çağrılır) satır başına ortalama süresi (mikrosaniye)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for predict_fn in predict_fns:
+            predict_fn(X_sample)
+    return (time.perf_counter() - started) / repeats / len(X_sample) * 1e6
+
+
+def report_multi_output_comparison(results, X_sample):
+    # Üç ayrı model ile tek çok çıktılı modeli doğruluk, çıkarım gecikmesi ve boyut açısından yan yana raporlar
+    multi = results['model_multi']
+    separate_models = [results[key]["model"] for key, _, _ in MODEL_TARGETS if key in results]
+
+    summary_lines = []
+    for k, (key, target_key, title) in enumerate(MODEL_TARGETS):
+        y_test = multi["y_test"][:, k]
+        multi_predictions = multi["predictions"][:, k]
+        labels = np.unique(y_test).tolist()
+        print(f"\n--- {title} (çok çıktılı model) ---")
+        print(classification_report(y_test, multi_predictions, labels=labels, target_names=_target_names(target_key, labels), zero_division=0))
+        multi_report = classification_report(y_test, multi_predictions, output_dict=True, zero_division=0)
+        if key in results:
+            separate_report = classification_report(results[key]["y_test"], results[key]["predictions"], output_dict=True, zero_division=0)
+            separate_scores = f"{separate_report['accuracy']:>16.4f}{separate_report['macro avg']['f1-score']:>16.4f}"
+        else:
+            separate_scores = f"{'-':>16}{'-':>16}"
+        summary_lines.append(f"{target_key:<14}{separate_scores}{multi_report['accuracy']:>16.4f}{multi_report['macro avg']['f1-score']:>16.4f}")
+
+    print("\n=== Üç Ayrı Model ve Tek Çok Çıktılı Model Karşılaştırması ===")
+    print(f"{'Hedef':<14}{'Ayrı: doğruluk':>16}{'Ayrı: makro F1':>16}{'Çok: doğruluk':>16}{'Çok: makro F1':>16}")
+    for line in summary_lines:
+        print(line)
+
+    # Tahmin servisindeki gibi: üç modelde her hedef için ayrı çağrı, çok çıktılı modelde tek çağrı
+    separate_size = sum(len(pickle.dumps(model)) for model in separate_models) / 1e6
+    multi_size = len(pickle.dumps(multi["model"])) / 1e6
+    for batch_size in (1, min(256, len(X_sample))):
+        batch = X_sample[:batch_size]
+        separate_latency = _inference_latency_us([model.predict_proba for model in separate_models], batch)
+        multi_latency = _inference_latency_us([multi["model"].predict_proba], batch)
+        print(f"Çıkarım gecikmesi ({batch_size} satır): ayrı modeller {separate_latency:.1f} µs/satır, çok çıktılı {multi_latency:.1f} µs/satır")
+    print(f"Model boyutu: ayrı modeller {separate_size:.1f} MB, çok çıktılı {multi_size:.1f} MB")
+
+
+def save_model_artifact(artifact, path):
+    # Sıkıştırmadan yazılır ki ai_predictor.py dizileri mmap_mode='r' ile bellek eşlemeli açabilsin.
+    # Önce geçici dosyaya yazılıp os.replace ile yerine konur; çalışan tahmin servisi yarım dosya görmez.
+    tmp_path = f"{path}.tmp"
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _warm_start_base_models(targets, new_rows, n_features, multi_output, path=MODEL_SAVE_PATH):
+    # Kayıtlı modeller yeni satırlarla büyütülebiliyorsa {model anahtarı: orman}, aksi halde nedeni yazdırıp None döner
+    keys = ['model_multi'] if multi_output else [key for key, _, _ in MODEL_TARGETS]
+    reason = None
+    if new_rows is None:
+        reason = "özellik önbelleği kapalı, yeni bölümler bilinmiyor"
+    elif not os.path.exists(path):
+        reason = f"'{path}' bulunamadı"
+    if reason is None:
+        artifact = joblib.load(path)
+        if artifact.get('feature_version') != FEATURE_VERSION or artifact.get('features_cols') != FEATURES_COLS:
+            reason = "model dosyası farklı bir özellik tanımıyla eğitilmiş"
+    base_models = {}
+    for key in keys if reason is None else []:
+        if key == 'model_multi':
+            y_new = np.column_stack([targets[target_key][new_rows] for target_key in MULTI_OUTPUT_TARGETS])
+        else:
+            target_key = next(target_key for model_key, target_key, _ in MODEL_TARGETS if model_key == key)
+            y_new = targets[target_key][new_rows]
+        model_reason = warm_start_compatible(artifact.get(key), y_new, n_features)
+        if model_reason:
+            reason = f"{key}: {model_reason}"
+            break
+        base_models[key] = artifact[key]
+    if reason is not None:
+        print(f"Sıcak başlatma yapılamıyor ({reason}); modeller tüm veriyle yeniden eğitiliyor.")
+        return None
+    return base_models
+
+
+def train_model(data_dir=None, since=None, n_jobs=-1, multi_output=False, cache_dir=FEATURE_CACHE_DIR,
+                warm_start=False, sync=False):
+    # cache_dir verilirse özellikler bölümlenmiş önbellekten okunur/yazılır (None: her şey yeniden hesaplanır).
+    # warm_start=True ise mevcut ormanlara yalnızca bu çalıştırmada hesaplanan bölümlerden yeni ağaçlar eklenir.
+    # sync=True ise data_dir önce API'deki yeni kayıtlarla güncellenir (download_dataset kaldığı yerden devam eder).
+    def preprocess(dataset_dir):
+        if cache_dir:
+            return preprocess_bus_frames_cached(iter_bus_frames(dataset_dir), cache_dir)
+        return preprocess_bus_frames(iter_bus_frames(dataset_dir)), None
+
+    if data_dir:
+        if sync:
+            print(f"'{data_dir}' veri seti API'deki yeni kayıtlarla güncelleniyor...")
+            try:
+                download_dataset(data_dir, since=since)
+            except requests.exceptions.RequestException as e:
+                print(f"Veri çekilirken hata oluştu: {e}")
+                return
+        print(f"Model eğitimi için veri seti '{data_dir}' dizininden okunuyor...")
+        processed_data, new_rows = preprocess(data_dir)
+    else:
+        # API verisi önce geçici bir dizine sütunlu parçalar halinde akıtılır, sonra otobüs otobüs işlenir
+        print("Model eğitimi için veri çekiliyor...")
+        with tempfile.TemporaryDirectory(prefix="can_data_") as download_dir:
+            try:
+                download_dataset(download_dir, since=since)
+            except requests.exceptions.RequestException as e:
+                print(f"Veri çekilirken hata oluştu: {e}")
+                return
+            processed_data, new_rows = preprocess(download_dir)
 
     if processed_data is None:
         print("Model eğitimi için yeterli veya uygun veri yok. Lütfen simülatörü çalıştırın ve yeterli veri toplandığından emin olun.")
         return
 
     X, y_5min, y_30min, y_fault_type, features_cols = processed_data
+    if warm_start and new_rows is not None and not new_rows.any():
+        print("Yeni veya değişen bölüm yok; mevcut model korunuyor.")
+        return
     
     print(f"Eğitim için {len(X)} veri noktası ve {len(features_cols)} özellik hazırlandı.")
     print("Özellikler:", features_cols)
@@ -151,66 +885,88 @@ def train_model():
     print("Y_fault_type dağılımı:\n", y_fault_type.value_counts())
 
     # --- Modelleri Eğitme ---
-
-    # 5 dakika sonrası için tahmin modeli
-    # Sınıf dengesizliği kontrolü ve stratify kullanımı
-    if y_5min.nunique() > 1: # Birden fazla sınıf varsa stratify kullan
-        X_train_5min, X_test_5min, y_train_5min, y_test_5min = train_test_split(X, y_5min, test_size=0.2, random_state=42, stratify=y_5min)
-        model_5min = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
-        model_5min.fit(X_train_5min, y_train_5min)
-        predictions_5min = model_5min.predict(X_test_5min)
-        print("\n--- 5 Dakika Sonra Arıza Tahmin Modeli Performansı ---")
-        # Test setindeki benzersiz etiketleri alın ve FAULT_TYPES'dan karşılıklarını bulun
-        labels_in_test_set_5min = np.unique(y_test_5min).tolist()
-        current_target_names_5min = ["Normal" if label == 0 else "Arıza" for label in labels_in_test_set_5min]
-        print(classification_report(y_test_5min, predictions_5min, labels=labels_in_test_set_5min, target_names=current_target_names_5min, zero_division=0))
-    else:
-        model_5min = None
-        print("Y_5min için tek sınıf var, model eğitilmedi.")
-
-
-    # 30 dakika sonrası için tahmin modeli
-    if y_30min.nunique() > 1:
-        X_train_30min, X_test_30min, y_train_30min, y_test_30min = train_test_split(X, y_30min, test_size=0.2, random_state=42, stratify=y_30min)
-        model_30min = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
-        model_30min.fit(X_train_30min, y_train_30min)
-        predictions_30min = model_30min.predict(X_test_30min)
-        print("\n--- 30 Dakika Sonra Arıza Tahmin Modeli Performansı ---")
-        # Test setindeki benzersiz etiketleri alın
-        labels_in_test_set_30min = np.unique(y_test_30min).tolist()
-        current_target_names_30min = ["Normal" if label == 0 else "Arıza" for label in labels_in_test_set_30min]
-        print(classification_report(y_test_30min, predictions_30min, labels=labels_in_test_set_30min, target_names=current_target_names_30min, zero_division=0))
-    else:
-        model_30min = None
-        print("Y_30min için tek sınıf var, model eğitilmedi.")
-
-
-    # Anlık Arıza Tipi Tahmin Modeli
-    if y_fault_type.nunique() > 1:
-        X_train_type, X_test_type, y_train_type, y_test_type = train_test_split(X, y_fault_type, test_size=0.2, random_state=42, stratify=y_fault_type)
-        model_fault_type = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
-        model_fault_type.fit(X_train_type, y_train_type)
-        predictions_fault_type = model_fault_type.predict(X_test_type)
-        print("\n--- Anlık Arıza Tipi Tahmin Modeli Performansı ---")
-        # Test setindeki benzersiz etiketleri alın ve FAULT_TYPES'dan karşılıklarını bulun
-        labels_in_test_set_type = np.unique(y_test_type).tolist()
-        # FAULT_TYPES'ın sayısal indeksleri ile string karşılıklarını eşleştirin
-        current_target_names_type = [FAULT_TYPES[int(label)] for label in labels_in_test_set_type]
-        print(classification_report(y_test_type, predictions_fault_type, labels=labels_in_test_set_type, target_names=current_target_names_type, zero_division=0))
-    else:
-        model_fault_type = None
-        print("Y_fault_type için tek sınıf var, model eğitilmedi.")
+    targets = {
+        'y_5min': y_5min.to_numpy(),
+        'y_30min': y_30min.to_numpy(),
+        'y_fault_type': y_fault_type.to_numpy(),
+    }
+    base_models = _warm_start_base_models(targets, new_rows, X.shape[1], multi_output) if warm_start else None
+    if base_models is not None:
+        # Yalnızca bu çalıştırmada hesaplanan bölümlerin satırları eğitim ve değerlendirmede kullanılır
+        X = X[new_rows]
+        targets = {target_key: values[new_rows] for target_key, values in targets.items()}
+        print(f"Sıcak başlatma: {len(X)} yeni satırdan her modele {WARM_START_TREES} ağaç eklenecek.")
+    results = train_models_parallel(X, targets, n_jobs=n_jobs, multi_output=multi_output, base_models=base_models)
+    if base_models is not None:
+        for key, result in results.items():
+            print(f"{key}: {len(result['model'].estimators_)} ağaç ({result['seconds']:.2f} sn)")
+
+    trained_models = {}
+    for key, target_key, title in MODEL_TARGETS:
+        if key not in results:
+            trained_models[key] = None
+            if base_models is None:
+                print(f"{target_key.capitalize()} için tek sınıf var, model eğitilmedi.")
+            continue
+        result = results[key]
+        trained_models[key] = result["model"]
+        print(f"\n--- {title} ---")
+        # Test setindeki benzersiz etiketleri alın ve karşılık gelen isimleri bulun
+        labels_in_test_set = np.unique(result["y_test"]).tolist()
+        print(classification_report(result["y_test"], result["predictions"], labels=labels_in_test_set, target_names=_target_names(target_key, labels_in_test_set), zero_division=0))
+        if result["peak_rss_mb"] is None:
+            memory = "en yüksek bellek (RSS): ölçülemedi"
+        elif result["rss_scope"] == "fit":
+            memory = f"eğitim sırasında en yüksek bellek (RSS): {result['peak_rss_mb']:.0f} MB (+{result['rss_delta_mb']:.0f} MB)"
+        else:
+            memory = f"eğitim sürecinin ömrü boyunca en yüksek bellek (RSS): {result['peak_rss_mb']:.0f} MB"
+        print(f"Eğitim süresi: {result['seconds']:.2f} sn, {memory}")
+
+    if multi_output:
+        # Karşılaştırmadan sonra yalnızca çok çıktılı model kaydedilir (üç ayrı orman yerine tek orman).
+        # Sıcak başlatmada ayrı modeller eğitilmediği için karşılaştırma yapılmaz.
+        if base_models is None:
+            report_multi_output_comparison(results, np.ascontiguousarray(X.to_numpy()[:256], dtype=np.float32))
+        trained_models = {key: None for key, _, _ in MODEL_TARGETS}
+        trained_models['model_multi'] = results['model_multi']["model"]
+
+    model_5min = trained_models['model_5min']
+    model_30min = trained_models['model_30min']
+    model_fault_type = trained_models['model_fault_type']
 
 
     # Modelleri Kaydetme (tek bir dosya olarak birden fazla modeli ve özellikleri kaydediyoruz)
-    joblib.dump({
+    save_model_artifact({
+        'artifact_version': ARTIFACT_SCHEMA_VERSION,
+        'model_version': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'), # Tahmin kayıtlarında hangi modelin kullanıldığını gösterir
         'model_5min': model_5min,
         'model_30min': model_30min,
         'model_fault_type': model_fault_type,
+        'model_multi': trained_models.get('model_multi'), # --multi-output ile eğitildiyse üç modelin yerine geçer
+        'multi_output_targets': MULTI_OUTPUT_TARGETS,
         'features_cols': features_cols, # Bu liste tahmin yaparken kullanılacak
-        'fault_type_map_text': FAULT_TYPES # Tahminlerde metin karşılıklarını bulmak için
+        'feature_version': FEATURE_VERSION, # Sıcak başlatma yalnızca aynı özellik tanımıyla eğitilmiş modellere yapılır
+        'fault_type_map_text': FAULT_TYPES, # Tahminlerde metin karşılıklarını bulmak için
+        # Küçük tahmin grupları için düz dizi biçiminde derlenmiş ormanlar (ai_predictor.FlatForest)
+        'compiled_models': {key: compile_forest(model) for key, model in trained_models.items()},
     }, MODEL_SAVE_PATH)
     print(f"\nModeller '{MODEL_SAVE_PATH}' adresine kaydedildi.")
 
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Batarya arıza tahmin modellerini eğit")
+    parser.add_argument("--data-dir", help="API yerine veri seti dizinini kullan (can_simulator.py --synthesize veya --download çıktısı)")
+    parser.add_argument("--since", help="API'den yalnızca bu ISO zaman damgasından sonraki verileri çek")
+    parser.add_argument("--download", metavar="OUT_DIR", help="API verisini eğitim yapmadan veri seti dizinine indir")
+    parser.add_argument("--jobs", type=int, default=-1, help="Eğitimde kullanılacak çekirdek sayısı (-1: tümü)")
+    parser.add_argument("--multi-output", action="store_true", help="Üç hedefi tek çok çıktılı modelle eğit, üç ayrı modelle karşılaştır ve onu kaydet")
+    parser.add_argument("--feature-cache", default=FEATURE_CACHE_DIR, help="Otobüs/gün bölümlü özellik önbelleği dizini")
+    parser.add_argument("--no-feature-cache", action="store_true", help="Önbelleği kullanma, tüm özellikleri yeniden hesapla")
+    parser.add_argument("--warm-start", action="store_true", help=f"Mevcut ormanlara yalnızca yeni bölümlerden {WARM_START_TREES} ağaç ekle (sınıf kümeleri uyumsuzsa tam eğitim)")
+    parser.add_argument("--sync", action="store_true", help="Eğitimden önce --data-dir veri setini API'deki yeni kayıtlarla güncelle")
+    args = parser.parse_args()
+    if args.download:
+        download_dataset(args.download, since=args.since)
+    else:
+        train_model(args.data_dir, since=args.since, n_jobs=args.jobs, multi_output=args.multi_output,
+                    cache_dir=None if args.no_feature_cache else args.feature_cache,
+                    warm_start=args.warm_start, sync=args.sync)